@@ -0,0 +1,33 @@
+"""add task title trigram index
+
+Revision ID: 3f1c2a7d9b4e
+Revises: ebf10720f903
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9b4e'
+down_revision: Union[str, None] = 'ebf10720f903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_tasks_title_trgm',
+        'tasks',
+        ['title'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_title_trgm', table_name='tasks')
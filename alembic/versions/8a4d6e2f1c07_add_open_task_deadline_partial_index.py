@@ -0,0 +1,32 @@
+"""add open task deadline partial index
+
+Revision ID: 8a4d6e2f1c07
+Revises: 3f1c2a7d9b4e
+Create Date: 2026-10-19 10:02:17.904551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4d6e2f1c07'
+down_revision: Union[str, None] = '3f1c2a7d9b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_tasks_user_open_deadline',
+        'tasks',
+        ['user_id', 'deadline'],
+        unique=False,
+        postgresql_where=sa.text('is_completed = false')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_user_open_deadline', table_name='tasks')
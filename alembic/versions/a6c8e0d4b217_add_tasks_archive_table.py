@@ -0,0 +1,68 @@
+"""add tasks archive table
+
+Revision ID: a6c8e0d4b217
+Revises: f1e2b8c4a903
+Create Date: 2026-10-19 15:22:47.530162
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.db.partitioning import PARTITIONED_TABLE
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c8e0d4b217'
+down_revision: Union[str, None] = 'f1e2b8c4a903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COMPLETED_CHANGED_AT = "(coalesce(updated_at, created_at)) WHERE is_completed = true"
+
+
+def upgrade() -> None:
+    op.create_table('tasks_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('is_completed', sa.Boolean(), nullable=True),
+        sa.Column('priority', postgresql.ENUM('low', 'medium', 'high', name='prioritylevel', create_type=False), nullable=False),
+        sa.Column('deadline', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tasks_archive_user_id_created_at', 'tasks_archive', ['user_id', 'created_at'], unique=False)
+
+    bind = op.get_bind()
+    # The partitioned copy, if the tasks table has not been swapped for it yet, needs the index too
+    if sa.inspect(bind).has_table(PARTITIONED_TABLE):
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_tasks_completed_changed_at_part "
+            f"ON {PARTITIONED_TABLE} ({COMPLETED_CHANGED_AT})"
+        )
+
+    tasks_partitioned = bind.execute(sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'tasks'::regclass")).scalar()
+    if tasks_partitioned:
+        # CONCURRENTLY is not supported on partitioned tables
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_tasks_completed_changed_at ON tasks ({COMPLETED_CHANGED_AT})")
+    else:
+        with op.get_context().autocommit_block():
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_completed_changed_at ON tasks ({COMPLETED_CHANGED_AT})"
+            )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_tasks_completed_changed_at")
+    op.drop_index('ix_tasks_archive_user_id_created_at', table_name='tasks_archive')
+    op.drop_table('tasks_archive')
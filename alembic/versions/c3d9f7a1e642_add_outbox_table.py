@@ -0,0 +1,39 @@
+"""add outbox table
+
+Revision ID: c3d9f7a1e642
+Revises: a6c8e0d4b217
+Create Date: 2026-10-19 02:21:08.114306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9f7a1e642'
+down_revision: Union[str, None] = 'a6c8e0d4b217'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_pending', 'outbox', ['id'], unique=False, postgresql_where=sa.text('delivered_at IS NULL'))
+    op.create_index('ix_outbox_delivered_at', 'outbox', ['delivered_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_delivered_at', table_name='outbox')
+    op.drop_index('ix_outbox_pending', table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,26 @@
+"""add project updated_at
+
+Revision ID: c52e9f0a7d13
+Revises: 8a4d6e2f1c07
+Create Date: 2026-10-19 11:26:05.117392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52e9f0a7d13'
+down_revision: Union[str, None] = '8a4d6e2f1c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('projects', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('projects', 'updated_at')
@@ -0,0 +1,28 @@
+"""add version columns for optimistic concurrency
+
+Revision ID: d7b3a1e5f286
+Revises: c52e9f0a7d13
+Create Date: 2026-10-19 12:40:53.662018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7b3a1e5f286'
+down_revision: Union[str, None] = 'c52e9f0a7d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('projects', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('projects', 'version')
+    op.drop_column('tasks', 'version')
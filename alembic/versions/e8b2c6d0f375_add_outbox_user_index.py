@@ -0,0 +1,26 @@
+"""add outbox user index
+
+Revision ID: e8b2c6d0f375
+Revises: c3d9f7a1e642
+Create Date: 2026-10-19 02:41:53.208417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2c6d0f375'
+down_revision: Union[str, None] = 'c3d9f7a1e642'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_outbox_user_id_id ON outbox (user_id, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_outbox_user_id_id")
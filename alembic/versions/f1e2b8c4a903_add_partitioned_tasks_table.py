@@ -0,0 +1,43 @@
+"""add hash-partitioned tasks table
+
+Revision ID: f1e2b8c4a903
+Revises: d7b3a1e5f286
+Create Date: 2026-10-19 14:05:31.218804
+
+Creates `tasks_partitioned` next to the live table. Rows are moved and the tables
+swapped online by `python -m app.scripts.partition_tasks`; see that module.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.core.config import settings
+from app.db.partitioning import PARTITIONED_TABLE, create_partitioned_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1e2b8c4a903'
+down_revision: Union[str, None] = 'd7b3a1e5f286'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for statement in create_partitioned_ddl(settings.TASKS_PARTITION_COUNT):
+        op.execute(statement)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tasks_user_id_created_at',
+            'tasks',
+            ['user_id', 'created_at'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    # Only valid before the swap; afterwards `tasks` itself is the partitioned table
+    op.drop_index('ix_tasks_user_id_created_at', table_name='tasks')
+    op.execute(f"DROP TABLE IF EXISTS {PARTITIONED_TABLE}")
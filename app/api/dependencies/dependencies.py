@@ -1,18 +1,34 @@
 import logging
-from typing import Optional
+import secrets
+from typing import Callable, Optional
 
-from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
+from fastapi import Depends, Header, HTTPException, WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from app.core.config import settings
+from app.core.deadlines import set_deadline
+from app.core.events import OutboxRelay
+from app.core.metrics import MetricsSnapshots, REGISTRY
 from app.core.security import verify_jwt_token
+from app.core.backplane import load_backplane
 from app.core.websockets import ConnectionManager
+from app.db.database import engine
 from app.exceptions import TokenError
 from app.services import AuthService, TaskService, ProjectService, UserService
+from app.utils.title_index import TitleIndex
 from app.utils.unitofwork import UnitOfWork
 
 logger = logging.getLogger("app")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-connection_manager = ConnectionManager()
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+connection_manager = ConnectionManager(backplane=load_backplane(settings.WS_BACKPLANE, engine.dialect.name))
+outbox_relay = OutboxRelay(connection_manager)
+# PostgreSQL serves autocomplete from its trigram index; the in-memory index is only a fallback elsewhere
+metrics_snapshots = (
+    MetricsSnapshots(REGISTRY, settings.METRICS_DIR, settings.METRICS_SNAPSHOT_INTERVAL_S)
+    if settings.METRICS_DIR else None
+)
+title_index = TitleIndex(max_age=settings.TITLE_INDEX_MAX_AGE_S) if engine.dialect.name != "postgresql" else None
 
 
 async def get_uow() -> UnitOfWork:
@@ -20,14 +36,33 @@ async def get_uow() -> UnitOfWork:
     return UnitOfWork()
 
 
+def get_uow_factory() -> Callable[[], UnitOfWork]:
+    """Dependency providing fresh UnitOfWork instances, for handlers running several units of work at once."""
+    return UnitOfWork
+
+
 async def get_auth_service(uow: UnitOfWork = Depends(get_uow)) -> AuthService:
     """Dependency that provides a AuthService instance."""
     return AuthService(uow)
 
 
-async def get_task_service(uow: UnitOfWork = Depends(get_uow)) -> TaskService:
+def get_title_index() -> TitleIndex | None:
+    """Dependency to get the singleton TitleIndex instance, None when the database has trigram search."""
+    return title_index
+
+
+def get_outbox_relay() -> OutboxRelay:
+    """Dependency to get the singleton OutboxRelay instance."""
+    return outbox_relay
+
+
+async def get_task_service(
+        uow: UnitOfWork = Depends(get_uow),
+        index: TitleIndex | None = Depends(get_title_index),
+        events: OutboxRelay = Depends(get_outbox_relay)
+) -> TaskService:
     """Dependency that provides a TaskService instance."""
-    return TaskService(uow)
+    return TaskService(uow, index, events)
 
 
 async def get_user_service(uow: UnitOfWork = Depends(get_uow)) -> UserService:
@@ -35,9 +70,12 @@ async def get_user_service(uow: UnitOfWork = Depends(get_uow)) -> UserService:
     return UserService(uow)
 
 
-async def get_project_service(uow: UnitOfWork = Depends(get_uow)) -> ProjectService:
+async def get_project_service(
+        uow: UnitOfWork = Depends(get_uow),
+        events: OutboxRelay = Depends(get_outbox_relay)
+) -> ProjectService:
     """Dependency that provides a ProjectService instance."""
-    return ProjectService(uow)
+    return ProjectService(uow, events)
 
 
 async def get_current_username_http(token: str = Depends(oauth2_scheme)) -> str:
@@ -54,6 +92,14 @@ async def get_current_username_http(token: str = Depends(oauth2_scheme)) -> str:
         )
 
 
+async def get_current_username_event_stream(
+        header_token: Optional[str] = Depends(optional_oauth2_scheme),
+        token: Optional[str] = None
+) -> str:
+    """Like get_current_username_http, also accepting a `token` query parameter since EventSource cannot set headers."""
+    return await get_current_username_http(header_token or token)
+
+
 async def get_current_username_websocket(websocket: WebSocket, token: Optional[str] = None) -> str:
     try:
         token = websocket.query_params.get("token") or token
@@ -66,6 +112,37 @@ async def get_current_username_websocket(websocket: WebSocket, token: Optional[s
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.message)
 
 
+def request_deadline(default_ms: int | None = None):
+    """
+    Dependency factory that sets the request deadline used by UnitOfWork.
+    Clients may lower, but never raise, the route default with an X-Request-Timeout header (ms).
+    """
+    default_ms = default_ms or settings.REQUEST_TIMEOUT_MS
+
+    async def set_request_deadline(x_request_timeout: Optional[int] = Header(None, gt=0)):
+        timeout_ms = min(default_ms, x_request_timeout) if x_request_timeout else default_ms
+        set_deadline(timeout_ms / 1000)
+
+    return set_request_deadline
+
+
 def get_connection_manager() -> ConnectionManager:
     """Dependency to get the singleton ConnectionManager instance."""
     return connection_manager
+
+
+def get_metrics_snapshots() -> MetricsSnapshots | None:
+    """Dependency to get the singleton MetricsSnapshots instance, None when workers do not share metrics."""
+    return metrics_snapshots
+
+
+async def verify_metrics_token(token: Optional[str] = Depends(optional_oauth2_scheme)) -> None:
+    """Require the METRICS_TOKEN bearer token; without one configured, metrics are not served at all."""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if token is None or not secrets.compare_digest(token, settings.METRICS_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
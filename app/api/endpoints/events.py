@@ -0,0 +1,75 @@
+import logging
+
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies.dependencies import (
+    get_connection_manager,
+    get_current_username_event_stream,
+    get_outbox_relay,
+    get_user_service,
+    UserService
+)
+from app.core.config import settings
+from app.core.events import OutboxRelay
+from app.core.sse import EventStream
+from app.core.websockets import ConnectionManager
+from app.exceptions import TooManyConnectionsError
+
+logger = logging.getLogger("app")
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+@router.get(
+    "/stream",
+    response_class=StreamingResponse,
+    summary="Stream events",
+    description="Streams the current user's task and project events as server-sent events."
+)
+async def stream_events(
+        last_event_id: int | None = Header(None, alias="Last-Event-ID", ge=0),
+        username: str = Depends(get_current_username_event_stream),
+        manager: ConnectionManager = Depends(get_connection_manager),
+        relay: OutboxRelay = Depends(get_outbox_relay),
+        user_service: UserService = Depends(get_user_service)
+):
+    """
+    The same events as `/ws/tasks`, one JSON object per `data:` field, with their `seq` as event id.
+    Browsers reconnecting send the last id back as `Last-Event-ID` and first get the events they
+    missed, or a `resync_required` event. Keep-alive comments are sent every heartbeat interval
+    and streams end after SSE_STREAM_LIFETIME_S; EventSource reconnects on its own.
+    """
+    if not manager.has_capacity():
+        raise TooManyConnectionsError()
+    user = await user_service.get_user_by_username(username)
+    if not manager.has_capacity(user.id):
+        logger.warning(f"[SSE] Refused stream of {username}: too many connections")
+        raise TooManyConnectionsError()
+
+    stream = EventStream()
+    connection = manager.register(stream, user.id, start=last_event_id is None, encoding="sse")
+    if last_event_id is not None:
+        try:
+            missed = await relay.missed_events(user.id, last_event_id)
+        except Exception:
+            manager.disconnect(stream, user.id)
+            raise
+        if missed is None:
+            missed = [{"event": "resync_required", "data": {"last_seq": last_event_id}}]
+        manager.replay(connection, missed)
+
+    async def frames():
+        try:
+            async for frame in stream.frames(settings.SSE_STREAM_LIFETIME_S):
+                yield frame
+                # The client accepted the frame; this stands in for the websocket clients' pongs
+                connection.touch()
+        finally:
+            manager.disconnect(stream, user.id)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.api.dependencies.dependencies import get_metrics_snapshots, verify_metrics_token
+from app.core.metrics import MetricsSnapshots, REGISTRY
+
+router = APIRouter(tags=["metrics"], dependencies=[Depends(verify_metrics_token)])
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Prometheus metrics",
+    description=(
+        "Request, database pool and websocket metrics in the Prometheus text format: of every worker of the "
+        "server, labelled by `worker`, when METRICS_DIR is set, otherwise of the worker answering. "
+        "Requires the METRICS_TOKEN bearer token."
+    )
+)
+async def metrics(snapshots: MetricsSnapshots | None = Depends(get_metrics_snapshots)):
+    body = await snapshots.render() if snapshots is not None else REGISTRY.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
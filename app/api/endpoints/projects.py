@@ -1,23 +1,26 @@
+from datetime import datetime
 from typing import List
 
-from fastapi import APIRouter, Depends, status, Security, Query
+from fastapi import APIRouter, Depends, status, Security, Query, Request, Response, Header
 
 from app.api.dependencies.dependencies import (
     get_project_service,
     get_user_service,
     get_current_username_http,
-    get_connection_manager,
+    request_deadline,
     ProjectService,
     UserService
 )
+from app.api.etags import ListETag, entity_etag, etag_matches, not_modified, version_from_if_match
+from app.api.pagination import set_total_count_headers
 from app.api.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
 from app.api.schemas.task import TaskResponse, PriorityLevel
-from app.core.websockets import ConnectionManager
+from app.core.config import settings
 
 router = APIRouter(
     prefix="/projects",
     tags=["projects"],
-    dependencies=[Security(get_current_username_http)]
+    dependencies=[Security(get_current_username_http), Depends(request_deadline())]
 )
 
 
@@ -32,15 +35,11 @@ async def create_project(
         project: ProjectCreate,
         username: str = Depends(get_current_username_http),
         project_service: ProjectService = Depends(get_project_service),
-        user_service: UserService = Depends(get_user_service),
-        manager: ConnectionManager = Depends(get_connection_manager)
+        user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
     project_response = await project_service.create_project(user.id, project)
 
-    message = manager.prepare_message("project_created", project_response)
-    await manager.broadcast(message)
-
     return project_response
 
 
@@ -48,17 +47,38 @@ async def create_project(
     "/",
     response_model=List[ProjectResponse],
     summary="Get all projects",
-    description="Retrieves a list of all projects with optional pagination."
+    description="Retrieves a list of all projects with optional pagination.",
+    dependencies=[Depends(request_deadline(settings.LIST_REQUEST_TIMEOUT_MS))]
 )
 async def read_projects(
+        request: Request,
+        response: Response,
         skip: int = 0,
         limit: int = 100,
+        with_total: bool = Query(False, description="Report the total number of matches in X-Total-Count"),
+        estimate_total: bool = Query(
+            False, description="With with_total, accept a planner estimate for totals above COUNT_ESTIMATE_THRESHOLD"
+        ),
+        if_none_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         project_service: ProjectService = Depends(get_project_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    projects = await project_service.get_projects(user.id, skip=skip, limit=limit)
+
+    etag = ListETag(user.id, request, if_none_match)
+    if with_total:
+        page = await project_service.get_projects_page(
+            user.id, skip=skip, limit=limit, estimate_total=estimate_total, unchanged=etag
+        )
+        projects = page.items if page is not None else None
+    else:
+        projects = await project_service.get_projects(user.id, skip=skip, limit=limit, unchanged=etag)
+    if projects is None:
+        return not_modified(etag.etag)
+    response.headers["ETag"] = etag.etag
+    if with_total:
+        set_total_count_headers(response, page)
     return projects
 
 
@@ -70,12 +90,19 @@ async def read_projects(
 )
 async def read_project(
         project_id: int,
+        response: Response,
+        if_none_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         project_service: ProjectService = Depends(get_project_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
     project = await project_service.get_project(user.id, project_id)
+
+    etag = entity_etag(project)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return project
 
 
@@ -83,31 +110,59 @@ async def read_project(
     "/{project_id}/tasks",
     response_model=List[TaskResponse],
     summary="Get tasks for a project",
-    description="Retrieves tasks for a project."
+    description="Retrieves tasks for a project.",
+    dependencies=[Depends(request_deadline(settings.LIST_REQUEST_TIMEOUT_MS))]
 )
 async def get_tasks(
         project_id: int,
+        request: Request,
+        response: Response,
         completed: bool | None = Query(None),
         priority: PriorityLevel | None = Query(None),
+        due_after: datetime | None = Query(None, description="Only tasks with a deadline at or after this time"),
+        due_before: datetime | None = Query(None, description="Only tasks with a deadline before this time"),
+        overdue: bool = Query(False, description="Only incomplete tasks whose deadline has passed"),
         sort_by: str = Query("created_at"),
         sort_order: str = Query("desc"),
         skip: int = 0,
         limit: int | None = None,
+        include_archived: bool = Query(False, description="Also return tasks moved to the archive"),
+        with_total: bool = Query(False, description="Report the total number of matches in X-Total-Count"),
+        estimate_total: bool = Query(
+            False, description="With with_total, accept a planner estimate for totals above COUNT_ESTIMATE_THRESHOLD"
+        ),
+        if_none_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         project_service: ProjectService = Depends(get_project_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    tasks = await project_service.get_project_tasks(
+
+    query = dict(
         user_id=user.id,
         project_id=project_id,
         completed=completed,
         priority=priority,
+        due_after=due_after,
+        due_before=due_before,
+        overdue=overdue,
         sort_by=sort_by,
         sort_order=sort_order,
         skip=skip,
-        limit=limit
+        limit=limit,
+        include_archived=include_archived
     )
+    etag = ListETag(user.id, request, if_none_match)
+    if with_total:
+        page = await project_service.get_project_tasks_page(**query, estimate_total=estimate_total, unchanged=etag)
+        tasks = page.items if page is not None else None
+    else:
+        tasks = await project_service.get_project_tasks(**query, unchanged=etag)
+    if tasks is None:
+        return not_modified(etag.etag)
+    response.headers["ETag"] = etag.etag
+    if with_total:
+        set_total_count_headers(response, page)
     return tasks
 
 
@@ -115,21 +170,22 @@ async def get_tasks(
     "/{project_id}",
     response_model=ProjectResponse,
     summary="Update project",
-    description="Updates an existing project identified by its ID."
+    description="Updates an existing project identified by its ID. Honours If-Match with the project's ETag."
 )
 async def update_project(
         project_id: int,
         project: ProjectUpdate,
+        response: Response,
+        if_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         project_service: ProjectService = Depends(get_project_service),
-        user_service: UserService = Depends(get_user_service),
-        manager: ConnectionManager = Depends(get_connection_manager)
+        user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    project_response = await project_service.update_project(user.id, project_id, project)
-
-    message = manager.prepare_message("project_updated", project_response)
-    await manager.broadcast(message)
+    project_response = await project_service.update_project(
+        user.id, project_id, project, expected_version=version_from_if_match(if_match)
+    )
+    response.headers["ETag"] = entity_etag(project_response)
 
     return project_response
 
@@ -142,10 +198,11 @@ async def update_project(
 )
 async def delete_project(
         project_id: int,
+        if_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         project_service: ProjectService = Depends(get_project_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    await project_service.delete_project(user.id, project_id)
+    await project_service.delete_project(user.id, project_id, expected_version=version_from_if_match(if_match))
     return None
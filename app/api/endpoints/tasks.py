@@ -1,22 +1,25 @@
+from datetime import datetime
 from typing import List
 
-from fastapi import APIRouter, Depends, status, Security
+from fastapi import APIRouter, Depends, status, Security, Query, Request, Response, Header
 
 from app.api.dependencies.dependencies import (
     get_task_service,
     get_user_service,
     get_current_username_http,
-    get_connection_manager,
+    request_deadline,
     TaskService,
     UserService
 )
-from app.api.schemas.task import TaskCreate, TaskUpdate, TaskResponse
-from app.core.websockets import ConnectionManager
+from app.api.etags import ListETag, entity_etag, etag_matches, not_modified, version_from_if_match
+from app.api.pagination import set_total_count_headers
+from app.api.schemas.task import TaskCreate, TaskUpdate, TaskResponse, TaskTitleSuggestion
+from app.core.config import settings
 
 router = APIRouter(
     prefix="/tasks",
     tags=["tasks"],
-    dependencies=[Security(get_current_username_http)]
+    dependencies=[Security(get_current_username_http), Depends(request_deadline())]
 )
 
 
@@ -31,15 +34,11 @@ async def create_task(
         task: TaskCreate,
         username: str = Depends(get_current_username_http),
         task_service: TaskService = Depends(get_task_service),
-        user_service: UserService = Depends(get_user_service),
-        manager: ConnectionManager = Depends(get_connection_manager)
+        user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
     task_response = await task_service.create_task(user.id, task)
 
-    message = manager.prepare_message("task_created", task_response)
-    await manager.broadcast(message)
-
     return task_response
 
 
@@ -47,20 +46,71 @@ async def create_task(
     "/",
     response_model=List[TaskResponse],
     summary="Get all tasks",
-    description="Retrieves a list of all tasks with optional pagination."
+    description="Retrieves a list of all tasks with optional pagination and deadline filters.",
+    dependencies=[Depends(request_deadline(settings.LIST_REQUEST_TIMEOUT_MS))]
 )
 async def read_tasks(
+        request: Request,
+        response: Response,
         skip: int = 0,
         limit: int = 100,
+        completed: bool | None = Query(None),
+        due_after: datetime | None = Query(None, description="Only tasks with a deadline at or after this time"),
+        due_before: datetime | None = Query(None, description="Only tasks with a deadline before this time"),
+        overdue: bool = Query(False, description="Only incomplete tasks whose deadline has passed"),
+        include_archived: bool = Query(False, description="Also return tasks moved to the archive"),
+        with_total: bool = Query(False, description="Report the total number of matches in X-Total-Count"),
+        estimate_total: bool = Query(
+            False, description="With with_total, accept a planner estimate for totals above COUNT_ESTIMATE_THRESHOLD"
+        ),
+        if_none_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         task_service: TaskService = Depends(get_task_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    tasks = await task_service.get_tasks(user.id, skip=skip, limit=limit)
+
+    query = dict(
+        skip=skip,
+        limit=limit,
+        completed=completed,
+        due_after=due_after,
+        due_before=due_before,
+        overdue=overdue,
+        include_archived=include_archived
+    )
+    etag = ListETag(user.id, request, if_none_match)
+    if with_total:
+        page = await task_service.get_tasks_page(user.id, **query, estimate_total=estimate_total, unchanged=etag)
+        tasks = page.items if page is not None else None
+    else:
+        tasks = await task_service.get_tasks(user.id, **query, unchanged=etag)
+    if tasks is None:
+        return not_modified(etag.etag)
+    response.headers["ETag"] = etag.etag
+    if with_total:
+        set_total_count_headers(response, page)
     return tasks
 
 
+@router.get(
+    "/autocomplete",
+    response_model=List[TaskTitleSuggestion],
+    summary="Autocomplete task titles",
+    description="Suggests the user's task titles matching what has been typed so far.",
+    dependencies=[Depends(request_deadline(settings.LIST_REQUEST_TIMEOUT_MS))]
+)
+async def autocomplete_tasks(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(10, ge=1, le=50),
+        username: str = Depends(get_current_username_http),
+        task_service: TaskService = Depends(get_task_service),
+        user_service: UserService = Depends(get_user_service)
+):
+    user = await user_service.get_user_by_username(username)
+    return await task_service.autocomplete_titles(user.id, q, limit)
+
+
 @router.get(
     "/{task_id}",
     response_model=TaskResponse,
@@ -69,12 +119,19 @@ async def read_tasks(
 )
 async def read_task(
         task_id: int,
+        response: Response,
+        if_none_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         task_service: TaskService = Depends(get_task_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
     task = await task_service.get_task(user.id, task_id)
+
+    etag = entity_etag(task)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return task
 
 
@@ -82,21 +139,42 @@ async def read_task(
     "/{task_id}",
     response_model=TaskResponse,
     summary="Update task",
-    description="Updates an existing task identified by its ID."
+    description="Updates an existing task identified by its ID. Honours If-Match with the task's ETag."
 )
 async def update_task(
         task_id: int,
         task: TaskUpdate,
+        response: Response,
+        if_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         task_service: TaskService = Depends(get_task_service),
-        user_service: UserService = Depends(get_user_service),
-        manager: ConnectionManager = Depends(get_connection_manager)
+        user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    task_response = await task_service.update_task(user.id, task_id, task)
+    task_response = await task_service.update_task(
+        user.id, task_id, task, expected_version=version_from_if_match(if_match)
+    )
+    response.headers["ETag"] = entity_etag(task_response)
+
+    return task_response
+
 
-    message = manager.prepare_message("task_updated", task_response)
-    await manager.broadcast(message)
+@router.post(
+    "/{task_id}/restore",
+    response_model=TaskResponse,
+    summary="Restore archived task",
+    description="Moves an archived task back among the user's active tasks."
+)
+async def restore_task(
+        task_id: int,
+        response: Response,
+        username: str = Depends(get_current_username_http),
+        task_service: TaskService = Depends(get_task_service),
+        user_service: UserService = Depends(get_user_service)
+):
+    user = await user_service.get_user_by_username(username)
+    task_response = await task_service.restore_task(user.id, task_id)
+    response.headers["ETag"] = entity_etag(task_response)
 
     return task_response
 
@@ -109,10 +187,11 @@ async def update_task(
 )
 async def delete_task(
         task_id: int,
+        if_match: str | None = Header(None),
         username: str = Depends(get_current_username_http),
         task_service: TaskService = Depends(get_task_service),
         user_service: UserService = Depends(get_user_service)
 ):
     user = await user_service.get_user_by_username(username)
-    await task_service.delete_task(user.id, task_id)
+    await task_service.delete_task(user.id, task_id, expected_version=version_from_if_match(if_match))
     return None
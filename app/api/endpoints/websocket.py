@@ -1,35 +1,141 @@
+import functools
+import json
 import logging
+from typing import Any, Callable, Dict
 
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, status
 
-from app.api.dependencies.dependencies import get_connection_manager, get_current_username_websocket
-from app.core.websockets import ConnectionManager
+from app.api.dependencies.dependencies import (
+    get_connection_manager,
+    get_current_username_websocket,
+    get_outbox_relay,
+    get_title_index,
+    get_uow_factory,
+    get_user_service,
+    UserService
+)
+from app.api.rpc import RpcContext, RpcRunner, error_response, is_rpc
+from app.core.config import settings
+from app.core.events import OutboxRelay
+from app.core.websockets import Connection, ConnectionManager, negotiate_encoding
+from app.services import ProjectService, TaskService
+from app.utils.rate_limit import TokenBucket
+from app.utils.title_index import TitleIndex
+from app.utils.unitofwork import UnitOfWork
 
 logger = logging.getLogger("app")
 
 router = APIRouter()
 
+
+def _decode(data: str) -> Dict[str, Any] | None:
+    """A client message as a JSON object, or None when the frame is malformed."""
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+def _handle_client_message(connection: Connection, request: Dict[str, Any]) -> dict | None:
+    """Apply a subscribe/unsubscribe request and return its acknowledgement, or None if it is not one."""
+    if not isinstance(request.get("project_id"), int):
+        return None
+
+    action, project_id = request.get("action"), request["project_id"]
+    if action == "subscribe":
+        connection.subscribe(project_id)
+    elif action == "unsubscribe":
+        connection.unsubscribe(project_id)
+    else:
+        return None
+    return {"event": f"{action}d", "data": {"project_id": project_id}}
+
+
 @router.websocket("/ws/tasks")
 async def websocket_endpoint(
     websocket: WebSocket,
-    manager: ConnectionManager = Depends(get_connection_manager)
+    last_seq: int | None = Query(None, ge=0),
+    manager: ConnectionManager = Depends(get_connection_manager),
+    relay: OutboxRelay = Depends(get_outbox_relay),
+    user_service: UserService = Depends(get_user_service),
+    uow_factory: Callable[[], UnitOfWork] = Depends(get_uow_factory),
+    title_index: TitleIndex | None = Depends(get_title_index)
 ):
     """
     WebSocket endpoint for task updates.
-    Clients must provide a valid JWT token as a query parameter.
+    Clients must provide a valid JWT token as a query parameter, and receive events for their own
+    tasks and projects only. Sending {"action": "subscribe", "project_id": <id>} narrows task events
+    to the subscribed projects; "unsubscribe" widens them again.
+    Every event carries a `seq` that grows with each event of the user. A client reconnecting with
+    `last_seq` first gets the events it missed, or a `resync_required` event when they are no
+    longer available and it must reload its tasks and projects.
+    The server sends {"event": "ping"} periodically and drops connections whose client has not sent
+    anything for a heartbeat period; clients that only listen answer pings with {"action": "pong"}.
+    Handshakes beyond the per-worker or per-user connection limits are refused before being accepted.
+    Events are JSON text frames unless the client offers a `msgpack`, `json+deflate` or
+    `msgpack+deflate` subprotocol, which turn them into binary frames; clients send JSON text regardless.
+    Clients may also call task and project operations as the connected user, see `app.api.rpc`.
+    Calls run concurrently with the connection's other messages, up to WS_RPC_MAX_IN_FLIGHT at once.
+    Messages other than pongs count against the per-connection rate limit and are dropped beyond it;
+    RPCs among them, and calls beyond the in-flight limit, get a 429 error.
     """
+    # Cheapest check first, before the token is even verified
+    if not manager.has_capacity():
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
     username = await get_current_username_websocket(websocket)
+    user = await user_service.get_user_by_username(username)
+    if not manager.has_capacity(user.id):
+        logger.warning(f"[WebSocket] Refused connection of {username}: too many connections")
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
 
+    def rpc_context() -> RpcContext:
+        return RpcContext(
+            user.id, TaskService(uow_factory(), title_index, relay), ProjectService(uow_factory(), relay)
+        )
+
+    bucket = TokenBucket(settings.WS_RPC_RATE_PER_S, settings.WS_RPC_BURST)
+    runner: RpcRunner | None = None
     try:
-        await manager.connect(websocket, username)
+        subprotocol = negotiate_encoding(websocket.scope.get("subprotocols", []))
+        connection = await manager.connect(websocket, user.id, start=last_seq is None, subprotocol=subprotocol)
+        runner = RpcRunner(rpc_context, functools.partial(manager.send, connection))
+        if last_seq is not None:
+            missed = await relay.missed_events(user.id, last_seq)
+            if missed is None:
+                missed = [{"event": "resync_required", "data": {"last_seq": last_seq}}]
+            manager.replay(connection, missed)
 
         while True:
             data = await websocket.receive_text()
+            connection.touch()
             logger.debug(f"[WebSocket] Received from {username}: {data}")
+            message = _decode(data)
+            if message is not None and message.get("action") == "pong":
+                continue
+            if not bucket.take():
+                if message is not None and is_rpc(message):
+                    manager.send(connection, error_response(message.get("id"), status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests"))
+                continue
+            if message is None:
+                logger.debug(f"[WebSocket] Ignoring malformed message from {username}")
+                continue
+            if is_rpc(message):
+                runner.submit(message)
+                continue
+            ack = _handle_client_message(connection, message)
+            if ack is not None:
+                manager.send(connection, ack)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, username)
+        manager.disconnect(websocket, user.id)
 
     except Exception as e:
-        manager.disconnect(websocket, username)
+        manager.disconnect(websocket, user.id)
         logger.exception(f"[WebSocket] Unexpected error from {username}: {e}")
+
+    finally:
+        if runner is not None:
+            await runner.close()
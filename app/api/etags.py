@@ -0,0 +1,58 @@
+import hashlib
+from typing import Any, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag derived from the given parts."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+class ListETag:
+    """
+    ETag for a listing, derived from an aggregate fingerprint of the rows it would return.
+    Passed as `unchanged` to a service list method, it is called with the fingerprint before the
+    page loads and tells whether If-None-Match already matches; `etag` holds the tag afterwards.
+    """
+
+    def __init__(self, user_id: int, request: Request, if_none_match: Optional[str]):
+        self.user_id = user_id
+        self.request = request
+        self.if_none_match = if_none_match
+        self.etag: Optional[str] = None
+
+    def __call__(self, fingerprint: Tuple[Any, ...]) -> bool:
+        self.etag = make_etag(self.user_id, self.request.url.path, self.request.url.query, fingerprint)
+        return etag_matches(self.if_none_match, self.etag)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def entity_etag(entity: Any) -> str:
+    """ETag for a single task or project response: its quoted version number."""
+    return f'"{entity.version}"'
+
+
+def version_from_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Version a conditional write must match, or None when the write is unconditional.
+    If-Match uses strong comparison, so weak or foreign tags map to version 0, which no row has.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if not (tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit()):
+        return 0
+    return int(tag[1:-1])
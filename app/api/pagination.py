@@ -0,0 +1,12 @@
+from fastapi import Response
+
+from app.api.schemas.pagination import Page
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+
+def set_total_count_headers(response: Response, page: Page):
+    """Expose a page's total on the response; the second header says whether it is a planner estimate."""
+    response.headers[TOTAL_COUNT_HEADER] = str(page.total)
+    response.headers[TOTAL_COUNT_ESTIMATED_HEADER] = "true" if page.total_is_estimate else "false"
@@ -0,0 +1,226 @@
+"""
+Request/response calls over the `/ws/tasks` websocket, using the identity authenticated at the handshake.
+
+    -> {"v": 1, "id": 7, "method": "tasks.update", "params": {"task_id": 3, "changes": {"is_completed": true}}}
+    <- {"v": 1, "id": 7, "result": {...}}
+    <- {"v": 1, "id": 7, "error": {"code": 412, "message": "..."}}
+
+Error codes follow the HTTP status the same call would get from the REST API.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from pydantic import BaseModel, ConfigDict, ValidationError, validate_call
+from starlette import status
+
+from app.api.schemas.project import ProjectCreate, ProjectUpdate
+from app.api.schemas.task import TaskCreate, TaskUpdate
+from app.core.config import settings
+from app.core.deadlines import clear_deadline, set_deadline
+from app.exceptions import (
+    NotFoundError,
+    AlreadyExistsError,
+    ForbiddenError,
+    PermissionDeniedError,
+    PreconditionFailedError,
+    ConcurrentUpdateError,
+    DeadlineExceededError,
+    ServiceUnavailableError
+)
+from app.services import TaskService, ProjectService
+
+logger = logging.getLogger("app")
+
+RPC_VERSION = 1
+
+ERROR_CODES = (
+    (NotFoundError, status.HTTP_404_NOT_FOUND),
+    (AlreadyExistsError, status.HTTP_409_CONFLICT),
+    (ForbiddenError, status.HTTP_403_FORBIDDEN),
+    (PermissionDeniedError, status.HTTP_403_FORBIDDEN),
+    (PreconditionFailedError, status.HTTP_412_PRECONDITION_FAILED),
+    (ConcurrentUpdateError, status.HTTP_409_CONFLICT),
+    (DeadlineExceededError, status.HTTP_504_GATEWAY_TIMEOUT),
+    (ServiceUnavailableError, status.HTTP_503_SERVICE_UNAVAILABLE),
+)
+
+
+class RpcContext:
+    """
+    What an RPC method runs with: the connected user and their services.
+    Services hold a unit of work that only one call may use at a time, so concurrent calls need their own context.
+    """
+    __slots__ = ("user_id", "tasks", "projects")
+
+    def __init__(self, user_id: int, tasks: TaskService, projects: ProjectService):
+        self.user_id = user_id
+        self.tasks = tasks
+        self.projects = projects
+
+
+Method = Callable[..., Awaitable[Any]]
+METHODS: Dict[str, Method] = {}
+
+
+def rpc_method(name: str):
+    """Register a coroutine taking the RpcContext and keyword params, which are validated from their annotations."""
+    def register(method: Method) -> Method:
+        METHODS[name] = validate_call(method, config=ConfigDict(arbitrary_types_allowed=True))
+        return method
+    return register
+
+
+@rpc_method("tasks.list")
+async def list_tasks(
+        ctx: RpcContext,
+        skip: int = 0,
+        limit: int = 100,
+        completed: bool | None = None,
+        include_archived: bool = False
+):
+    return await ctx.tasks.get_tasks(
+        ctx.user_id, skip=skip, limit=limit, completed=completed, include_archived=include_archived
+    )
+
+
+@rpc_method("tasks.get")
+async def get_task(ctx: RpcContext, task_id: int):
+    return await ctx.tasks.get_task(ctx.user_id, task_id)
+
+
+@rpc_method("tasks.create")
+async def create_task(ctx: RpcContext, task: TaskCreate):
+    return await ctx.tasks.create_task(ctx.user_id, task)
+
+
+@rpc_method("tasks.update")
+async def update_task(ctx: RpcContext, task_id: int, changes: TaskUpdate, expected_version: int | None = None):
+    return await ctx.tasks.update_task(ctx.user_id, task_id, changes, expected_version=expected_version)
+
+
+@rpc_method("tasks.delete")
+async def delete_task(ctx: RpcContext, task_id: int, expected_version: int | None = None):
+    await ctx.tasks.delete_task(ctx.user_id, task_id, expected_version=expected_version)
+
+
+@rpc_method("tasks.restore")
+async def restore_task(ctx: RpcContext, task_id: int):
+    return await ctx.tasks.restore_task(ctx.user_id, task_id)
+
+
+@rpc_method("projects.list")
+async def list_projects(ctx: RpcContext, skip: int = 0, limit: int = 100):
+    return await ctx.projects.get_projects(ctx.user_id, skip, limit)
+
+
+@rpc_method("projects.get")
+async def get_project(ctx: RpcContext, project_id: int):
+    return await ctx.projects.get_project(ctx.user_id, project_id)
+
+
+@rpc_method("projects.create")
+async def create_project(ctx: RpcContext, project: ProjectCreate):
+    return await ctx.projects.create_project(ctx.user_id, project)
+
+
+@rpc_method("projects.update")
+async def update_project(
+        ctx: RpcContext,
+        project_id: int,
+        changes: ProjectUpdate,
+        expected_version: int | None = None
+):
+    return await ctx.projects.update_project(ctx.user_id, project_id, changes, expected_version=expected_version)
+
+
+@rpc_method("projects.delete")
+async def delete_project(ctx: RpcContext, project_id: int, expected_version: int | None = None):
+    await ctx.projects.delete_project(ctx.user_id, project_id, expected_version=expected_version)
+
+
+def is_rpc(message: Dict[str, Any]) -> bool:
+    """Whether a decoded websocket message is an RPC request."""
+    return isinstance(message.get("method"), str)
+
+
+def error_response(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"v": RPC_VERSION, "id": request_id, "error": {"code": code, "message": message}}
+
+
+def _dump(result: Any) -> Any:
+    if isinstance(result, BaseModel):
+        return result.model_dump(mode="json")
+    if isinstance(result, list):
+        return [_dump(item) for item in result]
+    return result
+
+
+async def handle_rpc(ctx: RpcContext, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one RPC request and build its response. Never raises."""
+    request_id = request.get("id")
+    if request.get("v") != RPC_VERSION:
+        return error_response(request_id, status.HTTP_400_BAD_REQUEST, f"Unsupported protocol version, use {RPC_VERSION}")
+    method = METHODS.get(request["method"])
+    if method is None:
+        return error_response(request_id, status.HTTP_404_NOT_FOUND, f"Unknown method {request['method']!r}")
+    params = request.get("params") or {}
+    if not isinstance(params, dict):
+        return error_response(request_id, status.HTTP_400_BAD_REQUEST, "params must be an object")
+
+    set_deadline(settings.REQUEST_TIMEOUT_MS / 1000)
+    try:
+        result = await method(ctx, **params)
+    except ValidationError as e:
+        return error_response(request_id, status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    except Exception as e:
+        for exc_type, code in ERROR_CODES:
+            if isinstance(e, exc_type):
+                logger.warning(f"[RPC] {request['method']} failed: {e}")
+                return error_response(request_id, code, str(e))
+        logger.exception(f"[RPC] {request['method']} failed unexpectedly")
+        return error_response(request_id, status.HTTP_500_INTERNAL_SERVER_ERROR, "An unexpected error occurred")
+    finally:
+        clear_deadline()
+    return {"v": RPC_VERSION, "id": request_id, "result": _dump(result)}
+
+
+class RpcRunner:
+    """
+    Runs a connection's calls as tasks of their own, so a slow call holds up neither the connection's
+    other messages nor its other calls. At most `limit` run at once; further calls get a 429 error.
+    Each call gets a fresh context from `new_context` and its response is passed to `reply` when ready,
+    so responses may arrive out of order and are matched to calls by id.
+    """
+    def __init__(
+            self,
+            new_context: Callable[[], RpcContext],
+            reply: Callable[[Dict[str, Any]], None],
+            limit: int = settings.WS_RPC_MAX_IN_FLIGHT
+    ):
+        self.new_context = new_context
+        self.reply = reply
+        self.limit = limit
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, request: Dict[str, Any]) -> None:
+        if len(self._tasks) >= self.limit:
+            self.reply(error_response(request.get("id"), status.HTTP_429_TOO_MANY_REQUESTS, "Too many calls in progress"))
+            return
+        task = asyncio.create_task(self._run(request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, request: Dict[str, Any]):
+        self.reply(await handle_rpc(self.new_context(), request))
+
+    async def close(self):
+        """Cancel the calls still running. Called when the connection ends."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
@@ -0,0 +1,12 @@
+from typing import Generic, List, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """A page of results together with the total number of matches."""
+    items: List[T]
+    total: int
+    total_is_estimate: bool = False
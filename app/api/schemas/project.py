@@ -22,5 +22,7 @@ class ProjectResponse(ProjectBase):
     id: int
     owner_id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 1
 
     model_config = ConfigDict(from_attributes=True)
@@ -2,7 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class PriorityLevel(str, Enum):
@@ -38,5 +38,18 @@ class TaskResponse(TaskBase):
     user_id: int
     created_at: datetime
     updated_at: Optional[datetime]
+    version: int = 1
+    is_archived: bool = False
 
     model_config = ConfigDict(from_attributes=True)
+
+    @field_validator("is_archived", mode="before")
+    @classmethod
+    def _unset_means_hot(cls, value):
+        # Only reads spanning the archive set this; everything else comes from the hot table
+        return bool(value)
+
+
+class TaskTitleSuggestion(BaseModel):
+    id: int
+    title: str
@@ -0,0 +1,135 @@
+"""
+Pub/sub between the workers that hold websocket connections.
+
+Every worker, in every container, publishes its events on the backplane and delivers
+what it receives to its own sockets only, so an event reaches a user's sockets
+wherever they are connected.
+"""
+import asyncio
+import importlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+import asyncpg
+
+from app.core.config import settings
+
+logger = logging.getLogger("app")
+
+Deliver = Callable[[str], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """Carries serialized events to every worker, including the one that published them."""
+    # Largest payload `publish` accepts, in bytes; None when there is no limit
+    MAX_PAYLOAD: int | None = None
+
+    def __init__(self):
+        self.deliver: Deliver | None = None
+
+    def bind(self, deliver: Deliver):
+        """Set the callback handing received payloads to the local sockets."""
+        self.deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, payload: str):
+        ...
+
+
+class InProcessBackplane(Backplane):
+    """Delivers straight to this worker. Enough for a single worker."""
+    async def publish(self, payload: str):
+        if self.deliver is not None:
+            await self.deliver(payload)
+
+
+class PostgresBackplane(Backplane):
+    """
+    LISTEN/NOTIFY on the primary database. Each worker keeps one listening connection,
+    re-established with backoff when it drops; events published meanwhile are missed.
+    NOTIFY payloads are limited to 8000 bytes and larger ones are refused; the connection
+    manager publishes references to outbox events that would not fit.
+    """
+    MAX_PAYLOAD = 7999
+
+    def __init__(self, dsn: str | None = None, channel: str = settings.WS_BACKPLANE_CHANNEL):
+        super().__init__()
+        self.dsn = dsn or settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.channel = channel
+        self._listener = None
+        self._publisher = None
+        self._supervisor: asyncio.Task | None = None
+        self._deliveries: set[asyncio.Task] = set()
+        self._publish_lock = asyncio.Lock()
+
+    async def start(self):
+        self._supervisor = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+        for connection in (self._listener, self._publisher):
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+
+    async def _listen(self):
+        delay = 0.1
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._listener = await asyncpg.connect(self.dsn)
+                self._listener.add_termination_listener(lambda _: lost.set())
+                await self._listener.add_listener(self.channel, self._on_notify)
+                logger.info("Listening for websocket events", extra={"channel": self.channel})
+                delay = 0.1
+                await lost.wait()
+                logger.warning("Websocket backplane connection lost")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("Websocket backplane unavailable", extra={"error": repr(e)})
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def _on_notify(self, _connection, _pid, _channel, payload: str):
+        if self.deliver is not None:
+            task = asyncio.create_task(self.deliver(payload))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def publish(self, payload: str):
+        if len(payload.encode()) > self.MAX_PAYLOAD:
+            raise ValueError(f"Websocket event of {len(payload.encode())} bytes is too large for NOTIFY")
+
+        async with self._publish_lock:
+            try:
+                if self._publisher is None or self._publisher.is_closed():
+                    self._publisher = await asyncpg.connect(self.dsn)
+                await self._publisher.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("Failed to publish websocket event, delivering locally only", extra={"error": repr(e)})
+                await self._deliver_locally(payload)
+
+    async def _deliver_locally(self, payload: str):
+        if self.deliver is not None:
+            await self.deliver(payload)
+
+
+def load_backplane(path: str, dialect: str) -> Backplane:
+    """
+    Instantiate the Backplane subclass named by a dotted path such as 'app.core.backplane.PostgresBackplane'.
+    Without a path, workers on PostgreSQL share events through it and others only deliver locally.
+    """
+    if not path:
+        return PostgresBackplane() if dialect == "postgresql" else InProcessBackplane()
+    module_name, _, class_name = path.rpartition(".")
+    backplane_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(backplane_class, type) and issubclass(backplane_class, Backplane)):
+        raise ValueError(f"{path} is not a Backplane")
+    return backplane_class()
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -15,6 +17,74 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Default per-request deadlines; clients may lower them with an X-Request-Timeout header (ms)
+    REQUEST_TIMEOUT_MS: int = 10_000
+    LIST_REQUEST_TIMEOUT_MS: int = 5_000
+
+    # Listings asking for an estimated total and expected to match more rows than this report the planner estimate
+    COUNT_ESTIMATE_THRESHOLD: int = 10_000
+
+    # Without trigram search, a user's in-memory title index is rebuilt once it is this old
+    TITLE_INDEX_MAX_AGE_S: int = 60
+
+    # Hash partitions of the tasks table; fixed once the partitioned table exists
+    TASKS_PARTITION_COUNT: int = 16
+
+    # Completed tasks untouched for this long are moved to the archive tier
+    TASK_ARCHIVE_AFTER_DAYS: int = 90
+
+    # Further databases that users' tasks and projects are sharded across; the primary is shard 0
+    DB_SHARD_URLS: List[str] = []
+    SHARD_MAP: str = "app.db.sharding.JumpHashShardMap"
+    # Users pinned to a shard other than the one SHARD_MAP would pick (user id -> shard index)
+    SHARD_OVERRIDES: Dict[int, int] = {}
+    # Upper bound on the number of shards; id sequences are interleaved with this stride
+    SHARD_ID_STRIDE: int = 64
+
+    # Retries of units of work failing on deadlocks, serialization conflicts or lost connections
+    DB_RETRY_ATTEMPTS: int = 3
+    DB_RETRY_BASE_DELAY_MS: int = 20
+    DB_RETRY_MAX_DELAY_MS: int = 1_000
+
+    # A websocket send taking longer than this evicts the connection
+    WS_SEND_TIMEOUT_MS: int = 1_000
+    # Events queued per websocket before WS_OVERFLOW_POLICY applies: drop_oldest, coalesce or disconnect
+    WS_QUEUE_SIZE: int = 64
+    WS_OVERFLOW_POLICY: str = "drop_oldest"
+    # Updates to an entity queued within this window are merged into one frame; 0 disables
+    WS_COALESCE_WINDOW_MS: int = 5
+    # Clients are pinged every interval and dropped after a further timeout without sending anything
+    WS_HEARTBEAT_INTERVAL_MS: int = 25_000
+    WS_HEARTBEAT_TIMEOUT_MS: int = 10_000
+    # Handshakes beyond these are refused before being accepted
+    WS_MAX_CONNECTIONS: int = 10_000
+    WS_MAX_CONNECTIONS_PER_USER: int = 20
+    # Carries events between workers; PostgresBackplane on PostgreSQL unless another Backplane class is named
+    WS_BACKPLANE: str = ""
+    WS_BACKPLANE_CHANNEL: str = "ws_events"
+    # Relay of the transactional outbox to websocket clients; delivered events are kept for a while
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_MS: int = 1_000
+    OUTBOX_RETENTION_HOURS: int = 24
+    # Reconnecting websocket clients missing more events than this must resync
+    WS_REPLAY_LIMIT: int = 500
+    # zlib level of the json+deflate and msgpack+deflate websocket encodings
+    WS_DEFLATE_LEVEL: int = 6
+    # Messages a websocket client may send per second, in bursts of up to WS_RPC_BURST
+    WS_RPC_RATE_PER_S: float = 20
+    WS_RPC_BURST: int = 40
+    # Calls a websocket client may have running at once; further calls get a 429 error
+    WS_RPC_MAX_IN_FLIGHT: int = 8
+    # Event streams end after this long and clients reconnect with Last-Event-ID, which also bounds graceful shutdown
+    SSE_STREAM_LIFETIME_S: int = 300
+    # Log records waiting to be written; further records are dropped and counted while it is full
+    LOG_QUEUE_SIZE: int = 10_000
+    # Bearer token required by /metrics, which is disabled without one
+    METRICS_TOKEN: str = ""
+    # Directory the workers of one server share their metrics through; each then serves them all
+    METRICS_DIR: str = ""
+    METRICS_SNAPSHOT_INTERVAL_S: int = 5
+
     @property
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
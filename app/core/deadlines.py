@@ -0,0 +1,23 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# Absolute time.monotonic() value by which the current request must finish
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(timeout: float):
+    """Give the current request `timeout` seconds from now to finish."""
+    _request_deadline.set(time.monotonic() + timeout)
+
+
+def clear_deadline():
+    _request_deadline.set(None)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
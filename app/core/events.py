@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, List
+
+from app.core.config import settings
+from app.core.websockets import ConnectionManager
+from app.db.models import OutboxEvent
+from app.utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger("app")
+
+
+class OutboxRelay:
+    """
+    Per-worker relay from the `outbox` table to the websocket fan-out.
+    Services record events in the transaction of the change they report and wake the relay
+    after committing; it also polls, so events committed by a process that crashed before
+    waking anyone still go out. Each batch is marked delivered in the transaction that
+    claimed it, only after it was published on the connection manager's backplane, so
+    publishing is at least once; "delivered" does not mean a socket received it, clients
+    that were disconnected catch up with `missed_events`. Workers relay concurrently on
+    PostgreSQL, each claiming all pending events of the users it picks, so a user's events
+    are published in order.
+    An event's outbox id is its sequence number: it increases with every event of a user,
+    which lets reconnecting clients ask for what they missed (see `missed_events`).
+    """
+    COMPACT_EVERY = timedelta(hours=1)
+
+    def __init__(
+            self,
+            manager: ConnectionManager,
+            uow_factory: Callable[[], UnitOfWork] = UnitOfWork,
+            batch_size: int = settings.OUTBOX_BATCH_SIZE,
+            poll_interval: float = settings.OUTBOX_POLL_INTERVAL_MS / 1000,
+            retention: timedelta = timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    ):
+        self.manager = manager
+        self.uow_factory = uow_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._wakeup = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._compacted_at: datetime | None = None
+        manager.fetch_event = self.event
+
+    def wake(self):
+        """Relay soon rather than at the next poll. Called after committing events."""
+        self._wakeup.set()
+
+    def start(self):
+        """Start relaying in the background. Called on startup."""
+        self._runner = asyncio.create_task(self._supervise())
+
+    async def _supervise(self):
+        while True:
+            try:
+                await self._run()
+            except Exception:
+                logger.exception("Outbox relay crashed, restarting")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.relay()
+            await self._compact_periodically()
+
+    async def relay(self) -> int:
+        """Deliver every pending event on every shard. Returns the number delivered."""
+        delivered = 0
+        uow = self.uow_factory()
+        for shard in range(uow.shard_count):
+            while True:
+                async with uow.on_shard(shard):
+                    events = await uow.outbox.claim_pending(self.batch_size)
+                    if not events:
+                        break
+                    for event in events:
+                        await self.manager.send_personal_message(
+                            self.message(event), event.user_id, project_id=event.project_id
+                        )
+                    await uow.outbox.mark_delivered([event.id for event in events])
+                    await uow.commit()
+                delivered += len(events)
+                if len(events) < self.batch_size:
+                    break
+        return delivered
+
+    @staticmethod
+    def message(event: OutboxEvent) -> Dict[str, Any]:
+        return {"event": event.event, "seq": event.id, "data": json.loads(event.payload)}
+
+    async def event(self, user_id: int, seq: int) -> Dict[str, Any] | None:
+        """One of a user's events by its sequence number, for workers handed a reference to it."""
+        uow = self.uow_factory()
+        async with uow(user_id):
+            event = await uow.outbox.find_one(id=seq, user_id=user_id)
+            return None if event is None else self.message(event)
+
+    async def missed_events(
+            self,
+            user_id: int,
+            last_seq: int,
+            limit: int = settings.WS_REPLAY_LIMIT
+    ) -> List[Dict[str, Any]] | None:
+        """
+        A user's events after `last_seq`, oldest first, or None when the client must resync:
+        the event it last saw has been compacted away (or never was its own),
+        or it missed more than `limit` events.
+        """
+        uow = self.uow_factory()
+        async with uow(user_id):
+            if not await uow.outbox.exists(user_id, last_seq):
+                return None
+            events = await uow.outbox.since(user_id, last_seq, limit + 1)
+            if len(events) > limit:
+                return None
+            return [self.message(event) for event in events]
+
+    async def _compact_periodically(self):
+        now = datetime.now(UTC)
+        if self._compacted_at is not None and now - self._compacted_at < self.COMPACT_EVERY:
+            return
+        self._compacted_at = now
+        removed = await self.compact(now - self.retention)
+        if removed:
+            logger.info(f"Compacted {removed} delivered outbox events")
+
+    async def compact(self, delivered_before: datetime) -> int:
+        """Delete events delivered before `delivered_before` on every shard."""
+        removed = 0
+        uow = self.uow_factory()
+        for shard in range(uow.shard_count):
+            async with uow.on_shard(shard):
+                removed += await uow.outbox.compact(delivered_before)
+                await uow.commit()
+        return removed
+
+    async def close(self):
+        """Relay what is pending, then stop. Called on shutdown."""
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        try:
+            await self.relay()
+        except Exception:
+            logger.exception("Failed to relay outbox events at shutdown; they will go out after restart")
@@ -1,9 +1,15 @@
+import atexit
+import copy
 import json
 import logging
+import queue
+import sys
 from datetime import datetime, UTC
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 
 from app.core.config import settings
+from app.core.metrics import REGISTRY, Counter
 
 
 if settings.DEBUG:  # development
@@ -18,10 +24,15 @@ else:  # production
     LOG_LEVEL_ROOT = "WARNING"
 
 
+LOG_RECORDS_DROPPED = REGISTRY.register(Counter(
+    "log_records_dropped", "Log records dropped because the log queue was full"
+))
+
+
 class JsonFormatter(logging.Formatter):
     def format(self, record):
         log_record = {
-            "timestamp": datetime.now(UTC).isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, UTC).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "module": record.module,
@@ -35,40 +46,89 @@ class JsonFormatter(logging.Formatter):
         return json.dumps(log_record)
 
 
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the logging thread without blocking the caller.
+    When the queue is full the record is dropped and counted rather than waited for,
+    so a slow log collector cannot stall the event loop.
+    """
+    def __init__(self, queue: queue.Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the logging thread; only arguments that may change meanwhile are resolved here
+        if record.args:
+            record = copy.copy(record)
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail to stop when the queue is full
+        self.queue.put(self._sentinel)
+
+
+# Records waiting for the logging thread, which formats them and writes them to stdout
+log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+_listener: QueueListener | None = None
+
+
 log_config = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "json": {
-            "()": JsonFormatter
-        }
-    },
     "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
+        "queue": {
+            "()": DroppingQueueHandler,
             "level": LOG_LEVEL_HANDLER,
-            "formatter": "json",
-            "stream": "ext://sys.stdout",
+            "queue": "ext://app.core.logger.log_queue",
         }
     },
     "loggers": {
         "app": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": LOG_LEVEL_APP,
             "propagate": False
         },
         "sqlalchemy.engine": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": LOG_LEVEL_SQLALCHEMY,
             "propagate": False
         }
     },
     "root": {
-        "handlers": ["console"],
+        "handlers": ["queue"],
         "level": LOG_LEVEL_ROOT
     }
 }
 
 
 def setup_logging():
+    """Configure logging and start the thread that formats and writes records."""
+    global _listener
+    shutdown_logging()
     dictConfig(log_config)
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(LOG_LEVEL_HANDLER)
+    console.setFormatter(JsonFormatter())
+    _listener = _Listener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(shutdown_logging)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out the records still queued and stop the logging thread. Called on shutdown and at exit."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
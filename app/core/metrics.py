@@ -0,0 +1,327 @@
+"""
+In-process metrics exposed in the Prometheus text format at `/metrics`.
+
+Metrics are plain attribute updates on children cached per label values, so recording one
+costs a dict lookup and an addition. They are per worker process and meant to be updated
+from the event loop. Workers of one server share them through `MetricsSnapshots`, so any
+worker can answer a scrape for all of them.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger("app")
+
+Sample = Tuple[str, Tuple[str, ...], float]
+# Samples of every metric by metric name, as recorded by one worker
+Snapshot = Dict[str, List[Sample]]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Value:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from `function` at scrape time, e.g. from an object that keeps its own count."""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # The last count is for values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self.labels().set_function(function)
+
+    def samples(self) -> Iterable[Sample]:
+        for values, child in list(self._children.items()):
+            yield "_total", values, child.get()
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for values, child in list(self._children.items()):
+            yield "", values, child.get()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _Histogram:
+        return _Histogram(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                yield "_bucket", (*values, _format_value(bound)), cumulative
+            yield "_count", values, cumulative
+            yield "_sum", values, child.sum
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Snapshot:
+        """The current samples of every metric."""
+        return {metric.name: list(metric.samples()) for metric in self.metrics}
+
+    def render(self, workers: Dict[str, Snapshot] | None = None) -> str:
+        """
+        All metrics in the Prometheus text exposition format: this process's, or the snapshots
+        of several workers with each sample labelled by its `worker`.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            if workers is None:
+                sources = [((), (), metric.samples())]
+            else:
+                sources = [(("worker",), (worker,), snapshot.get(metric.name, ())) for worker, snapshot in workers.items()]
+            for extra_names, extra_values, samples in sources:
+                for suffix, values, value in samples:
+                    names = metric.labelnames + ("le",) if suffix == "_bucket" else metric.labelnames
+                    labels = ",".join(
+                        f'{name}="{_escape(label)}"'
+                        for name, label in zip((*extra_names, *names), (*extra_values, *values))
+                    )
+                    lines.append(f"{metric.name}{suffix}{{{labels}}} {_format_value(value)}" if labels
+                                 else f"{metric.name}{suffix} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsSnapshots:
+    """
+    Shares the metrics of the workers of one server through a directory: each worker writes a
+    snapshot of its registry there every `interval` seconds, and the worker answering a scrape
+    renders all of them, labelled by process id. Snapshots not rewritten for three intervals
+    belong to workers that are gone and are removed.
+    """
+    def __init__(self, registry: "Registry", directory: str, interval: float = 5.0):
+        self.registry = registry
+        self.directory = Path(directory)
+        self.interval = interval
+        self.worker = str(os.getpid())
+        self._writer: asyncio.Task | None = None
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"{self.worker}.json"
+
+    def write(self):
+        """Replace this worker's snapshot, atomically so readers never see a partial one."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.registry.snapshot()))
+        os.replace(temporary, self.path)
+
+    def collect(self) -> Dict[str, Snapshot]:
+        """Every live worker's snapshot by process id, this worker's taken now."""
+        workers = {self.worker: self.registry.snapshot()}
+        stale_before = time.time() - 3 * self.interval
+        for path in self.directory.glob("*.json"):
+            worker = path.stem
+            if worker == self.worker:
+                continue
+            try:
+                if path.stat().st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+                    continue
+                workers[worker] = {
+                    name: [(suffix, tuple(values), value) for suffix, values, value in samples]
+                    for name, samples in json.loads(path.read_text()).items()
+                }
+            except (OSError, ValueError):
+                # Removed or replaced while being read; its worker is left out of this scrape
+                continue
+        return workers
+
+    async def render(self) -> str:
+        return self.registry.render(await asyncio.to_thread(self.collect))
+
+    def start(self):
+        """Write snapshots in the background. Called on startup."""
+        self._writer = asyncio.create_task(self._write_periodically())
+
+    async def _write_periodically(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.write)
+            except OSError:
+                logger.exception("Failed to write metrics snapshot")
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        """Stop writing and remove this worker's snapshot. Called on shutdown."""
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        self.path.unlink(missing_ok=True)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests", "HTTP requests by route template, method and status", ("method", "route", "status")
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, method and status",
+    ("method", "route", "status")
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being served"
+))
+DB_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "db_pool_connections", "Database pool connections by shard and state (checked_out, idle, overflow)",
+    ("shard", "state")
+))
+DB_POOL_SIZE = REGISTRY.register(Gauge(
+    "db_pool_size", "Configured database pool size by shard", ("shard",)
+))
+WS_CONNECTIONS = REGISTRY.register(Gauge(
+    "ws_connections", "Open websocket and event stream connections"
+))
+WS_EVENTS_DROPPED = REGISTRY.register(Counter(
+    "ws_events_dropped", "Events dropped from full connection queues"
+))
+WS_EVENTS_COALESCED = REGISTRY.register(Counter(
+    "ws_events_coalesced", "Events merged into an event already queued for the same entity"
+))
+WS_FAILED_SENDS = REGISTRY.register(Counter(
+    "ws_failed_sends", "Sends that failed or timed out and evicted their connection"
+))
+WS_REAPED_CONNECTIONS = REGISTRY.register(Counter(
+    "ws_reaped_connections", "Connections evicted for missing heartbeats"
+))
+WS_EVENT_DELIVERY = REGISTRY.register(Histogram(
+    "ws_event_delivery_seconds", "Time from an event reaching this worker to it being written to a connection",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+))
+
+
+def instrument_pools(engines: Sequence) -> None:
+    """Report the pool usage of each shard's engine, shard 0 being the primary database."""
+    for shard, engine in enumerate(engines):
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        shard = str(shard)
+        DB_POOL_SIZE.labels(shard).set_function(pool.size)
+        DB_POOL_CONNECTIONS.labels(shard, "checked_out").set_function(pool.checkedout)
+        DB_POOL_CONNECTIONS.labels(shard, "idle").set_function(pool.checkedin)
+        DB_POOL_CONNECTIONS.labels(shard, "overflow").set_function(lambda pool=pool: max(pool.overflow(), 0))
+
+
+def instrument_connections(manager) -> None:
+    """Report the connection counts a ConnectionManager keeps."""
+    WS_CONNECTIONS.set_function(lambda: manager.connection_count)
+    WS_EVENTS_DROPPED.set_function(lambda: manager.dropped_messages)
+    WS_EVENTS_COALESCED.set_function(lambda: manager.coalesced_messages)
+    WS_FAILED_SENDS.set_function(lambda: manager.failed_sends)
+    WS_REAPED_CONNECTIONS.set_function(lambda: manager.reaped_connections)
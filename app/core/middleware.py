@@ -1,24 +1,83 @@
 import logging
 import time
 
-from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
 
 logger = logging.getLogger("app")
 
 
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
+def route_template(scope: Scope) -> str:
+    """The path template of the matched route, e.g. /tasks/{task_id}, so that metrics are not labelled per id."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestLoggingMiddleware:
+    """
+    Logs and measures every request as a plain ASGI middleware: it only watches the messages
+    the app sends, so responses, streamed ones included, pass through untouched.
+    HTTP requests are timed until the app returns, that is until the last body chunk was sent.
+    Websocket sessions are logged when they end and counted as 101 when accepted, 403 when refused.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send):
+        start = time.perf_counter_ns()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+            labels = (scope["method"], route_template(scope), str(status_code))
+            HTTP_REQUESTS.labels(*labels).inc()
+            HTTP_REQUEST_DURATION.labels(*labels).observe(elapsed)
+            self._log(scope, status_code, elapsed)
 
-    response = await call_next(request)
+    async def _websocket(self, scope: Scope, receive: Receive, send: Send):
+        start = time.perf_counter_ns()
+        status_code = 403
 
-    process_time = round(time.time() - start_time, 4)
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "websocket.accept":
+                status_code = 101
+            await send(message)
 
-    logger.info({
-        "method": request.method,
-        "path": request.url.path,
-        "status_code": response.status_code,
-        "process_time": f"{process_time}s",
-        "client": request.client.host,
-    })
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS.labels("GET", route_template(scope), str(status_code)).inc()
+            self._log(scope, status_code, (time.perf_counter_ns() - start) / 1e9)
 
-    return response
+    @staticmethod
+    def _log(scope: Scope, status_code: int, elapsed: float):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        client = scope.get("client")
+        logger.info({
+            "method": scope.get("method", "GET"),
+            "path": scope["path"],
+            "status_code": status_code,
+            "process_time": f"{round(elapsed, 4)}s",
+            "client": client[0] if client else None,
+        })
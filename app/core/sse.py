@@ -0,0 +1,35 @@
+import asyncio
+import time
+from typing import AsyncIterator
+
+
+class EventStream:
+    """
+    Takes the place of a websocket in ConnectionManager for a text/event-stream response,
+    so event streams share the websockets' fan-out, queues, coalescing and heartbeats.
+    Frames are handed to the response one at a time: a client that stops reading stalls
+    `send_text` and is evicted after the manager's send timeout, like a stalled websocket.
+    """
+    def __init__(self):
+        self._frames: asyncio.Queue[str | None] = asyncio.Queue(maxsize=1)
+
+    async def send_text(self, frame: str):
+        await self._frames.put(frame)
+
+    async def close(self):
+        """End the stream. Called by the manager when it evicts the connection."""
+        while not self._frames.empty():
+            self._frames.get_nowait()
+        self._frames.put_nowait(None)
+
+    async def frames(self, lifetime: float) -> AsyncIterator[str]:
+        """Frames sent to the stream until it is closed or `lifetime` seconds have passed."""
+        deadline = time.monotonic() + lifetime
+        while True:
+            try:
+                frame = await asyncio.wait_for(self._frames.get(), deadline - time.monotonic())
+            except TimeoutError:
+                return
+            if frame is None:
+                return
+            yield frame
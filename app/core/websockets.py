@@ -1,60 +1,455 @@
+import asyncio
+import itertools
 import logging
 import json
-from typing import Dict, List, Any
+import time
+import zlib
+from collections import OrderedDict
+from enum import Enum
+from typing import Awaitable, Callable, Dict, List, Set, Any, Hashable, Sequence
 
+import msgpack
 from fastapi import WebSocket
 from pydantic import BaseModel
 
+from app.core.backplane import Backplane, InProcessBackplane
+from app.core.config import settings
+from app.core.metrics import WS_EVENT_DELIVERY
+
 logger = logging.getLogger("app")
 
 
+class OverflowPolicy(str, Enum):
+    """What a connection does with a new event when its outbound queue is full."""
+    DROP_OLDEST = "drop_oldest"
+    # Merge into a queued event for the same entity, dropping the oldest if there is none
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
+class OutboundMessage:
+    """
+    An event on its way to one or more connections. It is encoded lazily and at most once
+    per wire format, however many connections it is queued on.
+    """
+    __slots__ = ("message", "_encoded", "received_at")
+
+    def __init__(self, message: Dict[str, Any], received_at: float | None = None):
+        self.message = message
+        self._encoded: Dict[str, str | bytes] = {}
+        # When the event reached this worker, for events fanned out from the backplane
+        self.received_at = received_at
+
+    def encode(self, encoding: str) -> str | bytes:
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            encoded = self._encoded[encoding] = ENCODERS[encoding](self)
+        return encoded
+
+
+def _sse_frame(message: OutboundMessage) -> str:
+    """A text/event-stream frame: the JSON event as data, its seq as the event id. Pings become comments."""
+    if message.message.get("event") == "ping":
+        return ": ping\n\n"
+    seq = message.message.get("seq")
+    event_id = f"id: {seq}\n" if seq is not None else ""
+    return f"{event_id}data: {message.encode('json')}\n\n"
+
+
+def _deflated(encoding: str) -> Callable[[OutboundMessage], bytes]:
+    def encode(message: OutboundMessage) -> bytes:
+        encoded = message.encode(encoding)
+        return zlib.compress(encoded.encode() if isinstance(encoded, str) else encoded, settings.WS_DEFLATE_LEVEL)
+    return encode
+
+
+# Text encodings go out as text frames, the others as binary frames
+ENCODERS: Dict[str, Callable[[OutboundMessage], str | bytes]] = {
+    "json": lambda message: json.dumps(message.message),
+    "msgpack": lambda message: msgpack.packb(message.message),
+    "json+deflate": _deflated("json"),
+    "msgpack+deflate": _deflated("msgpack"),
+    "sse": _sse_frame,
+}
+# Encodings websocket clients may ask for as a subprotocol
+WEBSOCKET_ENCODINGS = ("json", "msgpack", "json+deflate", "msgpack+deflate")
+
+
+def negotiate_encoding(subprotocols: Sequence[str]) -> str | None:
+    """The first of the subprotocols offered by a websocket client that names an encoding we support."""
+    return next((protocol for protocol in subprotocols if protocol in WEBSOCKET_ENCODINGS), None)
+
+
+class Connection:
+    """
+    One websocket with its project subscriptions and a bounded outbound queue.
+    The queue is drained by the connection's own writer task, so producers never wait on the socket.
+    Queued events are keyed by event type and entity id so that updates can be merged in place.
+    Events are written in the connection's `encoding`, one of ENCODERS.
+    """
+    __slots__ = ("websocket", "user_id", "projects", "pending", "wakeup", "idle", "writer", "last_seen", "encoding")
+
+    def __init__(self, websocket: WebSocket, user_id: int, encoding: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        self.projects: Set[int] = set()
+        self.pending: OrderedDict[Hashable, OutboundMessage] = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.writer: asyncio.Task | None = None
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        """Record that the client was heard from."""
+        self.last_seen = time.monotonic()
+
+    def subscribe(self, project_id: int):
+        """Narrow the connection's project-scoped events to the projects it subscribed to."""
+        self.projects.add(project_id)
+
+    def unsubscribe(self, project_id: int):
+        self.projects.discard(project_id)
+
+    def wants(self, project_id: int | None) -> bool:
+        return project_id is None or not self.projects or project_id in self.projects
+
+
 class ConnectionManager:
     """
-    Manages WebSocket connections and broadcasting messages.
+    Manages WebSocket connections per user and routes messages to them.
+    A connection may subscribe to projects; it then only receives project-scoped
+    events for those projects. Connections without subscriptions receive every
+    event of their user.
+    Sending only enqueues the event on each target connection; a writer task per connection
+    delivers it, each send bounded by `send_timeout` seconds. A socket whose send fails or
+    times out is evicted, so a stalled or vanished client never holds up the others
+    or fails the request that produced the event.
+    A writer waking up waits `coalesce_window` seconds before sending, and further events for an
+    entity still queued are merged into the queued one, so a burst of edits goes out as one frame.
+    Events go out through the `backplane`, which hands them to the manager of every worker;
+    each worker then delivers them to its own sockets only.
+    Every `heartbeat_interval` seconds each connection is sent a ping event; one whose client
+    has not sent anything for another `heartbeat_timeout` seconds is reaped, so half-open
+    connections do not pile up. A write going through proves nothing, as it only fills the
+    kernel buffer, so listen-only clients stay connected by answering pings with a pong.
     """
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, username: str):
-        """Accept and add a new WebSocket connection."""
-        await websocket.accept()
-        if username not in self.active_connections:
-            self.active_connections[username] = []
-        self.active_connections[username].append(websocket)
+    PING = {"event": "ping"}
+
+    def __init__(
+            self,
+            send_timeout: float = settings.WS_SEND_TIMEOUT_MS / 1000,
+            queue_size: int = settings.WS_QUEUE_SIZE,
+            overflow_policy: OverflowPolicy = OverflowPolicy(settings.WS_OVERFLOW_POLICY),
+            backplane: Backplane | None = None,
+            coalesce_window: float = settings.WS_COALESCE_WINDOW_MS / 1000,
+            heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL_MS / 1000,
+            heartbeat_timeout: float = settings.WS_HEARTBEAT_TIMEOUT_MS / 1000,
+            max_connections: int = settings.WS_MAX_CONNECTIONS,
+            max_connections_per_user: int = settings.WS_MAX_CONNECTIONS_PER_USER
+    ):
+        self.active_connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        self.send_timeout = send_timeout
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.failed_sends = 0
+        self.dropped_messages = 0
+        self.coalesced_messages = 0
+        self.coalesce_window = coalesce_window
+        self._unkeyed = itertools.count()
+        self._closing: Set[asyncio.Task] = set()
+        self.backplane = backplane or InProcessBackplane()
+        self.backplane.bind(self.deliver)
+        # Looks up an outbox event by user and seq when the backplane carried only a reference to it
+        self.fetch_event: Callable[[int, int], Awaitable[Dict[str, Any] | None]] | None = None
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_user = max_connections_per_user
+        self.connection_count = 0
+        self.reaped_connections = 0
+        self._heartbeat: asyncio.Task | None = None
+
+    async def start(self):
+        await self.backplane.start()
+        self._heartbeat = asyncio.create_task(self._beat())
+
+    def has_capacity(self, user_id: int | None = None) -> bool:
+        """
+        Whether another connection (of `user_id`, if given) may be accepted. Checked before the
+        handshake is accepted; concurrent handshakes may overshoot the limits by a few.
+        """
+        if self.connection_count >= self.max_connections:
+            return False
+        return user_id is None or len(self.active_connections.get(user_id, ())) < self.max_connections_per_user
+
+    def register(self, websocket: WebSocket, user_id: int, start: bool = True, encoding: str = "json") -> Connection:
+        """
+        Track an accepted websocket and start its writer.
+        With `start=False` events are queued but not sent until `replay` or `start_writer`.
+        Anything with the `send_text` and `close` coroutines of a websocket can be registered,
+        see `app.core.sse.EventStream`.
+        """
+        connection = Connection(websocket, user_id, encoding)
+        if start:
+            self.start_writer(connection)
+        self.active_connections.setdefault(user_id, {})[websocket] = connection
+        self.connection_count += 1
+        return connection
+
+    def start_writer(self, connection: Connection):
+        if connection.writer is None:
+            connection.writer = asyncio.create_task(self._write(connection))
+
+    async def connect(
+            self,
+            websocket: WebSocket,
+            user_id: int,
+            start: bool = True,
+            subprotocol: str | None = None
+    ) -> Connection:
+        """Accept and add a new WebSocket connection, encoding its events as the negotiated subprotocol, JSON by default."""
+        await websocket.accept(subprotocol=subprotocol)
+        connection = self.register(websocket, user_id, start, encoding=subprotocol or "json")
         logger.info(
             "WebSocket connected",
-            extra={"username": username, "total_connections": len(self.active_connections[username])}
+            extra={"user_id": user_id, "total_connections": len(self.active_connections[user_id])}
+        )
+        return connection
+
+    def disconnect(self, websocket: WebSocket, user_id: int):
+        """Remove a disconnected WebSocket connection and stop its writer."""
+        connection = self._remove(websocket, user_id)
+        if connection is not None and connection.writer not in (None, asyncio.current_task()):
+            connection.writer.cancel()
+
+    def _remove(self, websocket: WebSocket, user_id: int) -> Connection | None:
+        connections = self.active_connections.get(user_id)
+        connection = connections.pop(websocket, None) if connections else None
+        if connection is None:
+            return None
+        self.connection_count -= 1
+        logger.info(
+            "WebSocket disconnected",
+            extra={"user_id": user_id, "remaining_connections": len(connections)}
         )
+        if not connections:
+            del self.active_connections[user_id]
+            logger.info("No active connections for user", extra={"user_id": user_id})
+        return connection
 
-    def disconnect(self, websocket: WebSocket, username: str):
-        """Remove a disconnected WebSocket connection."""
-        connections = self.active_connections.get(username)
-        if connections and websocket in connections:
-            connections.remove(websocket)
-            logger.info(
-                "WebSocket disconnected",
-                extra={"username": username, "remaining_connections": len(connections)}
-            )
-            if not connections:
-                del self.active_connections[username]
-                logger.info("No active connections for user", extra={"username": username})
-
-    async def send_personal_message(self, message: Dict[str, Any], username: str):
-        """Send a personal message."""
-        if username in self.active_connections:
-            message_json = json.dumps(message)
-            for ws in self.active_connections[username]:
-                await ws.send_text(message_json)
-            logger.debug("Sent personal message", extra={"username": username, "message": message})
+    async def send_personal_message(self, message: Dict[str, Any], user_id: int, project_id: int | None = None):
+        """
+        Send a message to a user's connections only, on whichever worker they are.
+        With `project_id`, connections subscribed to other projects are skipped.
+        Outbox events too large for the backplane are published as a reference, by `seq`,
+        that each worker with sockets for the user resolves through `fetch_event`.
+        """
+        payload = json.dumps({"user_id": user_id, "project_id": project_id, "message": message})
+        limit = self.backplane.MAX_PAYLOAD
+        oversized = limit is not None and len(payload.encode()) > limit
+        if oversized and "seq" in message and self.fetch_event is not None:
+            payload = json.dumps({"user_id": user_id, "project_id": project_id, "seq": message["seq"]})
+        await self.backplane.publish(payload)
+        logger.debug("Sent personal message", extra={"user_id": user_id, "message": message})
 
     async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast a message to all active connections."""
-        message_json = json.dumps(message)
-        for user_sockets in self.active_connections.values():
-            for ws in user_sockets:
-                await ws.send_text(message_json)
+        """Send a message to all active connections. Only for messages meant for every user."""
+        await self.backplane.publish(json.dumps({"user_id": None, "project_id": None, "message": message}))
         logger.debug("Broadcasted message", extra={"message": message})
 
+    async def deliver(self, payload: str):
+        """Queue an event received from the backplane on the matching local connections."""
+        envelope = json.loads(payload)
+        user_id, project_id = envelope["user_id"], envelope["project_id"]
+        if user_id is None:
+            targets = [connection for connections in self.active_connections.values() for connection in connections.values()]
+        else:
+            targets = [
+                connection for connection in self.active_connections.get(user_id, {}).values()
+                if connection.wants(project_id)
+            ]
+        if not targets:
+            return
+
+        message = envelope.get("message")
+        if message is None:
+            message = await self.fetch_event(user_id, envelope["seq"])
+            if message is None:
+                logger.warning("Referenced outbox event is gone", extra={"user_id": user_id, "seq": envelope["seq"]})
+                return
+        key, outbound = self._coalesce_key(message), OutboundMessage(message, time.perf_counter())
+        for connection in targets:
+            self._enqueue(connection, key, outbound)
+
+    def send(self, connection: Connection, message: Dict[str, Any]):
+        """Queue a message for one connection, e.g. a reply to something its client sent."""
+        self._enqueue(connection, None, OutboundMessage(message))
+
+    def replay(self, connection: Connection, messages: List[Dict[str, Any]]):
+        """
+        Put messages for a reconnecting client ahead of the events queued since it connected,
+        dropping queued events it is about to get from the replay, then start sending.
+        """
+        pending = connection.pending
+        seqs = [message["seq"] for message in messages if "seq" in message]
+        if seqs:
+            last_seq = max(seqs)
+            for key, queued in list(pending.items()):
+                if queued.message.get("seq", last_seq + 1) <= last_seq:
+                    del pending[key]
+        for message in reversed(messages):
+            key = ("seq", message["seq"]) if "seq" in message else next(self._unkeyed)
+            pending[key] = OutboundMessage(message)
+            pending.move_to_end(key, last=False)
+        if messages:
+            connection.idle.clear()
+            connection.wakeup.set()
+        self.start_writer(connection)
+
+    @staticmethod
+    def _coalesce_key(message: Dict[str, Any]) -> Hashable | None:
+        data = message.get("data")
+        if isinstance(data, dict) and data.get("id") is not None:
+            return message.get("event"), data["id"]
+        return None
+
+    @staticmethod
+    def _merge(queued: OutboundMessage, outbound: OutboundMessage) -> OutboundMessage:
+        """The newer event, carrying the fields of the queued one it does not set itself, e.g. of an earlier delta."""
+        older, newer = queued.message, outbound.message
+        if isinstance(older.get("data"), dict) and isinstance(newer.get("data"), dict):
+            return OutboundMessage({**newer, "data": {**older["data"], **newer["data"]}}, queued.received_at)
+        return outbound
+
+    def _enqueue(self, connection: Connection, key: Hashable | None, outbound: OutboundMessage):
+        pending = connection.pending
+        if key is None:
+            key = next(self._unkeyed)
+        if key in pending and (self.coalesce_window or self.overflow_policy is OverflowPolicy.COALESCE):
+            # The merged event takes the newer seq, so it moves behind the events queued in between
+            # to keep seqs ascending for clients that resume from the last one they saw
+            pending[key] = self._merge(pending.pop(key), outbound)
+            self.coalesced_messages += 1
+            return
+
+        if len(pending) >= self.queue_size:
+            self.dropped_messages += 1
+            if self.overflow_policy is OverflowPolicy.DISCONNECT:
+                logger.warning("WebSocket consumer too slow, evicting connection", extra={"user_id": connection.user_id})
+                self.disconnect(connection.websocket, connection.user_id)
+                self._close_later(connection.websocket)
+                return
+            pending.popitem(last=False)
+
+        pending[key] = outbound
+        connection.idle.clear()
+        connection.wakeup.set()
+
+    async def _write(self, connection: Connection):
+        pending = connection.pending
+        while True:
+            if not pending:
+                connection.idle.set()
+                connection.wakeup.clear()
+                await connection.wakeup.wait()
+                if self.coalesce_window:
+                    await asyncio.sleep(self.coalesce_window)
+                continue
+
+            _, outbound = pending.popitem(last=False)
+            encoded = outbound.encode(connection.encoding)
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    if isinstance(encoded, bytes):
+                        await connection.websocket.send_bytes(encoded)
+                    else:
+                        await connection.websocket.send_text(encoded)
+            except Exception as e:
+                self.failed_sends += 1
+                logger.warning(
+                    "WebSocket send failed, evicting connection",
+                    extra={"user_id": connection.user_id, "error": repr(e)}
+                )
+                self._remove(connection.websocket, connection.user_id)
+                pending.clear()
+                connection.idle.set()
+                await self._close(connection.websocket)
+                return
+            if outbound.received_at is not None:
+                WS_EVENT_DELIVERY.observe(time.perf_counter() - outbound.received_at)
+
+    def _close_later(self, websocket: WebSocket):
+        task = asyncio.create_task(self._close(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            async with asyncio.timeout(self.send_timeout):
+                await websocket.close()
+        except Exception:
+            # Already gone; the endpoint's receive loop ends on its own
+            pass
+
+    async def flush(self, timeout: float | None = None):
+        """Wait until every queued message has been sent or dropped."""
+        waits = [
+            connection.idle.wait()
+            for connections in list(self.active_connections.values())
+            for connection in connections.values()
+            if connection.writer is not None
+        ]
+        if waits:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout)
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("WebSocket heartbeat failed")
+
+    def reap(self, now: float | None = None) -> int:
+        """Evict connections silent for longer than a heartbeat period and ping the rest. Returns the number evicted."""
+        now = time.monotonic() if now is None else now
+        deadline = now - self.heartbeat_interval - self.heartbeat_timeout
+        ping = OutboundMessage(self.PING)
+        reaped = 0
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections.values()):
+                if connection.last_seen < deadline:
+                    logger.info("Reaping unresponsive WebSocket", extra={"user_id": connection.user_id})
+                    self.disconnect(connection.websocket, connection.user_id)
+                    self._close_later(connection.websocket)
+                    reaped += 1
+                else:
+                    self._enqueue(connection, "ping", ping)
+        self.reaped_connections += reaped
+        return reaped
+
+    async def close(self, timeout: float | None = None):
+        """Deliver what is queued, then stop every writer. Called on shutdown."""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        await self.backplane.stop()
+        try:
+            await self.flush(timeout)
+        except TimeoutError:
+            logger.warning("WebSocket queues not drained before shutdown")
+        writers = [
+            connection.writer
+            for connections in self.active_connections.values()
+            for connection in connections.values()
+            if connection.writer is not None
+        ]
+        for writer in writers:
+            writer.cancel()
+        await asyncio.gather(*writers, return_exceptions=True)
+
     @staticmethod
     def prepare_message(event_type: str, data: BaseModel) -> Dict[str, Any]:
         """Prepare a message suitable for broadcasting."""
@@ -1,9 +1,15 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from app.core.config import settings
+from app.db.sharding import load_shard_map
 
 DATABASE_URL = settings.DATABASE_URL
 DATABASE_PARAMS = {}
 
 engine = create_async_engine(url=DATABASE_URL, **DATABASE_PARAMS)
 async_session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+# Shards 1..N; shard 0 is the primary database above
+shard_engines = [create_async_engine(url=url, **DATABASE_PARAMS) for url in settings.DB_SHARD_URLS]
+shard_session_makers = [async_sessionmaker(bind=shard, expire_on_commit=False) for shard in shard_engines]
+shard_map = load_shard_map(settings.SHARD_MAP, 1 + len(shard_engines), settings.SHARD_OVERRIDES)
@@ -2,8 +2,8 @@ import enum
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, Text, Enum, func
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Integer, Text, Enum, Index, func, text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, query_expression
 
 
 class Base(DeclarativeBase):
@@ -36,6 +36,8 @@ class Project(Base):
     name: Mapped[str] = mapped_column(String(100), index=True, nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
 
@@ -46,6 +48,30 @@ class Project(Base):
 class Task(Base):
     """SQLAlchemy model for a task."""
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Trigram index for title autocomplete; requires the pg_trgm extension
+        Index(
+            "ix_tasks_title_trgm", "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        # Keeps "what's due" range scans small however many completed tasks pile up
+        Index(
+            "ix_tasks_user_open_deadline", "user_id", "deadline",
+            postgresql_where=text("is_completed = false"),
+            sqlite_where=text("is_completed = 0")
+        ),
+        Index("ix_tasks_user_id_created_at", "user_id", "created_at"),
+        # Lets the archival job find completed tasks by age without scanning open ones
+        Index(
+            "ix_tasks_completed_changed_at", text("coalesce(updated_at, created_at)"),
+            postgresql_where=text("is_completed = true"),
+            sqlite_where=text("is_completed = 1")
+        ),
+        # Hash-partitioned by owner on PostgreSQL (see app.db.partitioning); repositories refuse
+        # queries that do not filter on this column, since they would scan every partition
+        {"info": {"partition_key": "user_id"}},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(100), index=True, nullable=False)
@@ -55,9 +81,64 @@ class Task(Base):
     deadline: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     project_id: Mapped[Optional[int]] = mapped_column(ForeignKey("projects.id"))
 
     owner: Mapped["User"] = relationship(back_populates="tasks")
     project: Mapped[Optional["Project"]] = relationship(back_populates="tasks")
+
+    # Only populated by reads spanning both tiers (see TaskRepository.including_archived)
+    is_archived: Mapped[Optional[bool]] = query_expression()
+
+
+class TaskArchive(Base):
+    """SQLAlchemy model for a task moved to the cold archive tier. Mirrors the columns of Task."""
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_user_id_created_at", "user_id", "created_at"),
+        {"info": {"partition_key": "user_id"}},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(100), nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(Text)
+    is_completed: Mapped[bool] = mapped_column(Boolean, default=False)
+    priority: Mapped[PriorityLevel] = mapped_column(Enum(PriorityLevel), default=PriorityLevel.medium)
+    deadline: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    project_id: Mapped[Optional[int]] = mapped_column(ForeignKey("projects.id", ondelete="SET NULL"))
+
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class OutboxEvent(Base):
+    """
+    SQLAlchemy model for an event written in the same transaction as the change it reports.
+    Rows are relayed to websocket clients and marked delivered, then compacted away.
+    """
+    __tablename__ = "outbox"
+    __table_args__ = (
+        # Only undelivered rows are indexed, so the relay's scan stays small however large the table grows
+        Index(
+            "ix_outbox_pending", "id",
+            postgresql_where=text("delivered_at IS NULL"),
+            sqlite_where=text("delivered_at IS NULL")
+        ),
+        Index("ix_outbox_delivered_at", "delivered_at"),
+        # Replay of a user's missed events on reconnect
+        Index("ix_outbox_user_id_id", "user_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    event: Mapped[str] = mapped_column(String(50), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    project_id: Mapped[Optional[int]] = mapped_column(Integer)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,114 @@
+"""
+DDL for hash-partitioning `tasks` by owner on PostgreSQL.
+
+The partitioned table is built next to the live one as `tasks_partitioned`, filled online
+by `app.scripts.partition_tasks`, then swapped in under the `tasks` name. Every query the
+repositories issue filters on `user_id`, so the planner prunes it to a single partition.
+"""
+from typing import List, Sequence
+
+TASKS_TABLE = "tasks"
+PARTITIONED_TABLE = "tasks_partitioned"
+UNPARTITIONED_TABLE = "tasks_unpartitioned"
+PARTITION_KEY = "user_id"
+MIRROR_TRIGGER = "tasks_partition_mirror"
+
+# Indexes declared on the partitioned parent; PostgreSQL creates a matching one on every partition.
+# They are built with a "_part" suffix and take these names at the swap.
+INDEXES = (
+    ("ix_tasks_id", "(id)"),
+    ("ix_tasks_title", "(title)"),
+    ("ix_tasks_title_trgm", "USING gin (title gin_trgm_ops)"),
+    ("ix_tasks_user_open_deadline", "(user_id, deadline) WHERE is_completed = false"),
+    ("ix_tasks_user_id_created_at", "(user_id, created_at)"),
+    ("ix_tasks_completed_changed_at", "((coalesce(updated_at, created_at))) WHERE is_completed = true"),
+)
+
+
+def partition_name(remainder: int) -> str:
+    return f"{TASKS_TABLE}_p{remainder}"
+
+
+def create_partitioned_ddl(partitions: int) -> List[str]:
+    """Statements creating `tasks_partitioned` with `partitions` hash partitions on `user_id`."""
+    if partitions < 1:
+        raise ValueError("At least one partition is required")
+
+    statements = [
+        # The primary key of a partitioned table must include the partition key
+        f"CREATE TABLE {PARTITIONED_TABLE} ("
+        f"LIKE {TASKS_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+        f"CONSTRAINT {PARTITIONED_TABLE}_pkey PRIMARY KEY (id, {PARTITION_KEY})"
+        f") PARTITION BY HASH ({PARTITION_KEY})",
+        f"ALTER TABLE {PARTITIONED_TABLE} ADD CONSTRAINT tasks_user_id_fkey "
+        f"FOREIGN KEY (user_id) REFERENCES users (id)",
+        f"ALTER TABLE {PARTITIONED_TABLE} ADD CONSTRAINT tasks_project_id_fkey "
+        f"FOREIGN KEY (project_id) REFERENCES projects (id)",
+    ]
+    statements.extend(
+        f"CREATE TABLE {partition_name(remainder)} PARTITION OF {PARTITIONED_TABLE} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    )
+    statements.extend(
+        f"CREATE INDEX {name}_part ON {PARTITIONED_TABLE} {definition}"
+        for name, definition in INDEXES
+    )
+    return statements
+
+
+def mirror_trigger_ddl(columns: Sequence[str]) -> List[str]:
+    """
+    Statements installing a trigger that copies every write on `tasks` into `tasks_partitioned`
+    while the backfill runs. `columns` are the column names of `tasks` in table order.
+    """
+    assignments = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in columns if column not in ("id", PARTITION_KEY)
+    )
+    return [
+        f"""CREATE OR REPLACE FUNCTION {MIRROR_TRIGGER}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.{PARTITION_KEY} <> NEW.{PARTITION_KEY}) THEN
+        DELETE FROM {PARTITIONED_TABLE} WHERE id = OLD.id AND {PARTITION_KEY} = OLD.{PARTITION_KEY};
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO {PARTITIONED_TABLE} SELECT NEW.*
+        ON CONFLICT (id, {PARTITION_KEY}) DO UPDATE SET {assignments};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql""",
+        f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {TASKS_TABLE}",
+        f"CREATE TRIGGER {MIRROR_TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {TASKS_TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {MIRROR_TRIGGER}()",
+    ]
+
+
+# Copies one id range. FOR SHARE makes concurrent updates and deletes of those rows wait until
+# the batch commits, after which the mirror trigger applies them to the copy.
+BACKFILL_BATCH = (
+    f"INSERT INTO {PARTITIONED_TABLE} "
+    f"SELECT * FROM {TASKS_TABLE} WHERE id > :after AND id <= :upto FOR SHARE "
+    f"ON CONFLICT DO NOTHING"
+)
+
+
+def swap_ddl() -> List[str]:
+    """Statements, run in one transaction, that put `tasks_partitioned` in place of `tasks`."""
+    statements = [
+        f"LOCK TABLE {TASKS_TABLE}, {PARTITIONED_TABLE} IN ACCESS EXCLUSIVE MODE",
+        f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {TASKS_TABLE}",
+        f"DROP FUNCTION IF EXISTS {MIRROR_TRIGGER}()",
+        f"ALTER TABLE {TASKS_TABLE} RENAME TO {UNPARTITIONED_TABLE}",
+        f"ALTER TABLE {UNPARTITIONED_TABLE} RENAME CONSTRAINT tasks_pkey TO {UNPARTITIONED_TABLE}_pkey",
+    ]
+    statements.extend(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_unpartitioned" for name, _ in INDEXES)
+    statements.extend([
+        f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO {TASKS_TABLE}",
+        f"ALTER TABLE {TASKS_TABLE} RENAME CONSTRAINT {PARTITIONED_TABLE}_pkey TO tasks_pkey",
+        # Keep the id sequence alive when the old table is eventually dropped
+        f"ALTER SEQUENCE tasks_id_seq OWNED BY {TASKS_TABLE}.id",
+    ])
+    statements.extend(f"ALTER INDEX {name}_part RENAME TO {name}" for name, _ in INDEXES)
+    return statements
@@ -0,0 +1,102 @@
+"""
+Placement of users' data across database shards.
+
+Every task and project lives on the shard of its owner, so each service call touches
+exactly one database. Shard 0 is the primary database and also holds the user directory
+(the `users` table used for logins); each other shard keeps a copy of the rows of the
+users placed on it.
+"""
+import importlib
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Mapping
+
+# Tables whose ids are allocated on every shard; user ids are only ever allocated by the directory on shard 0
+SEQUENCED_TABLES = ("projects", "tasks", "outbox")
+
+
+class ShardMap(ABC):
+    """
+    Maps a user id to a shard index in [0, shard_count).
+    `overrides` pins individual users to a shard, e.g. after moving them with
+    `app.scripts.reshard_user`; everyone else is placed by `place`.
+    """
+    def __init__(self, shard_count: int, overrides: Mapping[int, int] | None = None):
+        if shard_count < 1:
+            raise ValueError("At least one shard is required")
+        self.shard_count = shard_count
+        self.overrides: Dict[int, int] = {int(user_id): shard for user_id, shard in (overrides or {}).items()}
+        for user_id, shard in self.overrides.items():
+            if not 0 <= shard < shard_count:
+                raise ValueError(f"User {user_id} is pinned to shard {shard}, but there are only {shard_count}")
+
+    def shard_for(self, user_id: int) -> int:
+        shard = self.overrides.get(user_id)
+        if shard is not None:
+            return shard
+        return self.place(user_id)
+
+    @abstractmethod
+    def place(self, user_id: int) -> int:
+        """Default shard of a user. Must be deterministic across processes."""
+        ...
+
+
+class ModuloShardMap(ShardMap):
+    """Round-robin by id. Simple, but adding a shard moves almost every user."""
+    def place(self, user_id: int) -> int:
+        return user_id % self.shard_count
+
+
+class JumpHashShardMap(ShardMap):
+    """
+    Jump consistent hash (Lamping & Veach). Going from N to N+1 shards moves only
+    about 1/(N+1) of users, all of them onto the new shard.
+    """
+    def place(self, user_id: int) -> int:
+        key = user_id & 0xFFFFFFFFFFFFFFFF
+        bucket, candidate = -1, 0
+        while candidate < self.shard_count:
+            bucket = candidate
+            key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+            candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+        return bucket
+
+
+def load_shard_map(path: str, shard_count: int, overrides: Mapping[int, int] | None = None) -> ShardMap:
+    """Instantiate the ShardMap subclass named by a dotted path such as 'app.db.sharding.JumpHashShardMap'."""
+    module_name, _, class_name = path.rpartition(".")
+    shard_map_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(shard_map_class, type) and issubclass(shard_map_class, ShardMap)):
+        raise ValueError(f"{path} is not a ShardMap")
+    return shard_map_class(shard_count, overrides)
+
+
+def id_sequence_ddl(shard: int, stride: int, tables: Iterable[str] = SEQUENCED_TABLES) -> list[str]:
+    """
+    Statements making a shard's id sequences hand out ids congruent to `shard` modulo `stride`,
+    so ids stay unique across shards and a user's rows can be moved without renumbering.
+    `stride` must be at least the largest number of shards ever expected.
+    """
+    if not 0 <= shard < stride:
+        raise ValueError("Shard index must be below the id stride")
+    statements = []
+    for table in tables:
+        sequence = f"{table}_id_seq"
+        statements.append(
+            f"SELECT setval('{sequence}', "
+            f"(SELECT (coalesce(max(id), 0) / {stride} + 1) * {stride} + {shard} FROM {table}), false)"
+        )
+        statements.append(f"ALTER SEQUENCE {sequence} INCREMENT BY {stride}")
+    return statements
+
+
+def advance_sequence_sql(table: str, shard: int, stride: int, above: int) -> str:
+    """
+    Statement moving a shard's interleaved id sequence for `table` past `above` unless it already is,
+    e.g. after moving in a user's outbox events, whose ids must keep growing on the new shard.
+    """
+    next_id = (above // stride + 1) * stride + shard
+    return (
+        f"SELECT setval('{table}_id_seq', {next_id}, false) "
+        f"WHERE (SELECT last_value FROM {table}_id_seq) < {next_id}"
+    )
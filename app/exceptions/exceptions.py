@@ -38,6 +38,44 @@ class PermissionDeniedError(Exception):
     def __init__(self, message: str = "Permission denied"):
         super().__init__(message)
 
+class PreconditionFailedError(Exception):
+    """Base exception for when a conditional write no longer matches the stored version"""
+    def __init__(self, resource: str, identifier: str | int):
+        self.resource = resource
+        self.identifier = identifier
+        super().__init__(f"{resource} with id '{identifier}' has been modified")
+
+class ConcurrentUpdateError(Exception):
+    """Base exception for when an unconditional write keeps losing to concurrent writers"""
+    def __init__(self, resource: str, identifier: str | int):
+        self.resource = resource
+        self.identifier = identifier
+        super().__init__(f"{resource} with id '{identifier}' is being modified concurrently, please retry")
+
+class DeadlineExceededError(Exception):
+    """Base exception for when a request runs past its deadline"""
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+class ServiceUnavailableError(Exception):
+    """Base exception for when a dependency is temporarily unavailable"""
+    def __init__(self, message: str = "Service temporarily unavailable"):
+        super().__init__(message)
+
+
+# Database
+class DatabaseUnavailableError(ServiceUnavailableError):
+    """Raised when a unit of work keeps failing on transient database errors"""
+    def __init__(self):
+        super().__init__("Database temporarily unavailable, please retry")
+
+
+# Connections
+class TooManyConnectionsError(ServiceUnavailableError):
+    """Raised when an event stream is refused for lack of connection capacity"""
+    def __init__(self):
+        super().__init__("Too many connections, please retry")
+
 
 # User
 class UserNotFoundError(NotFoundError):
@@ -64,6 +102,11 @@ class ProjectAlreadyExistsError(AlreadyExistsError):
         super().__init__("Project", project_id)
         self.project_id = project_id
 
+class ProjectVersionConflictError(PreconditionFailedError):
+    """Raised when a project write is conditional on a stale version"""
+    def __init__(self, identifier: str | int):
+        super().__init__("Project", identifier)
+
 
 # Task
 class TaskNotFoundError(NotFoundError):
@@ -77,6 +120,16 @@ class TaskAlreadyExistsError(AlreadyExistsError):
         super().__init__("Task", task_id)
         self.project_id = task_id
 
+class TaskVersionConflictError(PreconditionFailedError):
+    """Raised when a task write is conditional on a stale version"""
+    def __init__(self, identifier: str | int):
+        super().__init__("Task", identifier)
+
+class TaskUpdateConflictError(ConcurrentUpdateError):
+    """Raised when a task update keeps losing to concurrent writers"""
+    def __init__(self, identifier: str | int):
+        super().__init__("Task", identifier)
+
 
 # Auth
 class InvalidCredentialsError(UnauthorizedError):
@@ -10,7 +10,11 @@ from app.exceptions import (
     AlreadyExistsError,
     UnauthorizedError,
     ForbiddenError,
-    PermissionDeniedError
+    PermissionDeniedError,
+    PreconditionFailedError,
+    ConcurrentUpdateError,
+    DeadlineExceededError,
+    ServiceUnavailableError
 )
 
 logger = logging.getLogger("app")
@@ -67,6 +71,39 @@ def register_exception_handlers(app: FastAPI):
             content={"detail": str(exc)},
         )
 
+    @app.exception_handler(PreconditionFailedError)
+    async def precondition_failed_exception_handler(_: Request, exc: PreconditionFailedError):
+        logger.warning(f"PreconditionFailedError: {str(exc)}")
+        return JSONResponse(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            content={"detail": str(exc)},
+        )
+
+    @app.exception_handler(ConcurrentUpdateError)
+    async def concurrent_update_exception_handler(_: Request, exc: ConcurrentUpdateError):
+        logger.warning(f"ConcurrentUpdateError: {str(exc)}")
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"detail": str(exc)},
+        )
+
+    @app.exception_handler(DeadlineExceededError)
+    async def deadline_exceeded_exception_handler(_: Request, exc: DeadlineExceededError):
+        logger.warning(f"DeadlineExceededError: {str(exc)}")
+        return JSONResponse(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            content={"detail": str(exc)},
+        )
+
+    @app.exception_handler(ServiceUnavailableError)
+    async def service_unavailable_exception_handler(_: Request, exc: ServiceUnavailableError):
+        logger.warning(f"ServiceUnavailableError: {str(exc)}")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": str(exc)},
+            headers={"Retry-After": "1"},
+        )
+
     @app.exception_handler(Exception)
     async def generic_exception_handler(_: Request, _exc: Exception):
         logger.exception("Unhandled exception occurred")
@@ -4,11 +4,13 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from sqlalchemy import text
 
-from app.api.endpoints import auth, tasks, projects, websocket
-from app.core.middleware import log_requests
+from app.api.dependencies.dependencies import connection_manager, metrics_snapshots, outbox_relay
+from app.api.endpoints import auth, tasks, projects, websocket, events, metrics
+from app.core.middleware import RequestLoggingMiddleware
 from app.core.config import settings
-from app.core.logger import setup_logging
-from app.db.database import async_session_maker
+from app.core.logger import setup_logging, shutdown_logging
+from app.core.metrics import instrument_connections, instrument_pools
+from app.db.database import async_session_maker, engine, shard_engines
 from app.exceptions.handlers import register_exception_handlers
 
 
@@ -27,9 +29,19 @@ async def lifespan(_: FastAPI):
         logger.exception("Failed to connect to the database.")
         raise e
 
+    await connection_manager.start()
+    outbox_relay.start()
+    if metrics_snapshots is not None:
+        metrics_snapshots.start()
+
     yield
 
+    if metrics_snapshots is not None:
+        await metrics_snapshots.close()
+    await outbox_relay.close()
+    await connection_manager.close(timeout=settings.WS_SEND_TIMEOUT_MS / 1000)
     logger.info("Application shutdown.")
+    shutdown_logging()
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -38,12 +50,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-app.middleware("http")(log_requests)
+app.add_middleware(RequestLoggingMiddleware)
 
 app.include_router(auth.router)
 app.include_router(tasks.router)
 app.include_router(projects.router)
 app.include_router(websocket.router)
+app.include_router(events.router)
+app.include_router(metrics.router)
+
+instrument_pools([engine, *shard_engines])
+instrument_connections(connection_manager)
 
 register_exception_handlers(app)
 
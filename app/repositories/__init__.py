@@ -1,4 +1,6 @@
 from .base_repository import SQLAlchemyRepository
 from .task_repository import TaskRepository
+from .task_archive_repository import TaskArchiveRepository
 from .user_repository import UserRepository
 from .project_repository import ProjectRepository
+from .outbox_repository import OutboxRepository
@@ -1,13 +1,29 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Generic, TypeVar, Optional, cast
+from typing import Any, Dict, List, Generic, TypeVar, Optional, Sequence, Tuple, cast
 
-from sqlalchemy import insert, select, delete
+from sqlalchemy import insert, select, update, delete, func, ColumnElement, Select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 ModelType = TypeVar("ModelType", bound=DeclarativeBase)
 
 
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) wrapper for a select statement."""
+    inherit_cache = False
+
+    def __init__(self, stmt: Select):
+        self.statement = stmt
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
 class AbstractRepository(ABC, Generic[ModelType]):
     """Abstract base class defining the repository interface."""
 
@@ -46,14 +62,28 @@ class SQLAlchemyRepository(AbstractRepository[ModelType], Generic[ModelType]):
         if self.model is None:
             raise NotImplementedError("Repository must have a 'model' class attribute defined.")
 
-    async def find_all(
+    @property
+    def dialect_name(self) -> str:
+        """Name of the SQL dialect the session is bound to, e.g. 'postgresql' or 'sqlite'."""
+        return self.session.bind.dialect.name
+
+    def _check_partition_key(self, filter_by: Dict[str, Any]):
+        """
+        Refuse statements that do not pin the table's partition key (declared in `__table__.info`),
+        since on a partitioned table they would have to visit every partition.
+        """
+        key = self.model.__table__.info.get("partition_key")
+        if key is not None and filter_by.get(key) is None:
+            raise ValueError(f"Queries on {self.model.__tablename__} must filter on '{key}'")
+
+    def _select(
             self,
-            skip: int = 0,
-            limit: int | None = None,
             order_by: Dict[str, str] | None = None,
+            where: Sequence[ColumnElement[bool]] = (),
             **filter_by: Any
-    ) -> List[ModelType]:
-        stmt = select(self.model).filter_by(**filter_by)
+    ) -> Select:
+        self._check_partition_key(filter_by)
+        stmt = select(self.model).filter_by(**filter_by).where(*where)
 
         if order_by:
             for column, direction in order_by.items():
@@ -62,16 +92,100 @@ class SQLAlchemyRepository(AbstractRepository[ModelType], Generic[ModelType]):
                     stmt = stmt.order_by(sort_column.desc())
                 else:
                     stmt = stmt.order_by(sort_column.asc())
+        return stmt
 
+    @staticmethod
+    def _paginate(stmt: Select, skip: int = 0, limit: int | None = None) -> Select:
         if limit is not None and limit > 0:
             stmt = stmt.limit(limit)
             if skip > 0:
                 stmt = stmt.offset(skip)
+        return stmt
 
+    async def find_all(
+            self,
+            skip: int = 0,
+            limit: int | None = None,
+            order_by: Dict[str, str] | None = None,
+            where: Sequence[ColumnElement[bool]] = (),
+            **filter_by: Any
+    ) -> List[ModelType]:
+        stmt = self._paginate(self._select(order_by, where, **filter_by), skip, limit)
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def find_page(
+            self,
+            skip: int = 0,
+            limit: int | None = None,
+            order_by: Dict[str, str] | None = None,
+            where: Sequence[ColumnElement[bool]] = (),
+            estimate_threshold: int | None = None,
+            **filter_by: Any
+    ) -> Tuple[List[ModelType], int, bool]:
+        """
+        Retrieve a page of records together with the total number of matches.
+        The total comes from a `count(*) OVER ()` column on the page query itself, so it costs
+        no extra round-trip. Callers that accept an estimate pass `estimate_threshold`: on PostgreSQL
+        the query is then planned first, at the cost of an EXPLAIN round-trip, and when the planner
+        expects more rows than that the exact count is skipped and its estimate returned instead.
+        Returns (records, total, total_is_estimate).
+        """
+        stmt = self._select(order_by, where, **filter_by)
+
+        if estimate_threshold is not None and self.dialect_name == "postgresql":
+            estimate = await self.estimate_count(stmt)
+            if estimate > estimate_threshold:
+                result = await self.session.execute(self._paginate(stmt, skip, limit))
+                return list(result.scalars().all()), estimate, True
+
+        stmt = self._paginate(stmt.add_columns(func.count().over().label("total")), skip, limit)
+        rows = (await self.session.execute(stmt)).all()
+        if rows:
+            return [row[0] for row in rows], rows[0].total, False
+        if skip > 0:
+            # The window is empty past the last page, so fall back to a plain count
+            return [], await self.count(where, **filter_by), False
+        return [], 0, False
+
+    async def count(self, where: Sequence[ColumnElement[bool]] = (), **filter_by: Any) -> int:
+        self._check_partition_key(filter_by)
+        stmt = select(func.count()).select_from(self.model).filter_by(**filter_by).where(*where)
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    async def fingerprint(
+            self,
+            order_by: Dict[str, str] | None = None,
+            where: Sequence[ColumnElement[bool]] = (),
+            **filter_by: Any
+    ) -> Tuple[Any, ...]:
+        """
+        Cheap change marker for a result set: (row count, max id, version sum, latest change time).
+        Any insert, update or delete touching the set changes at least one of them, and computing it
+        never loads the rows themselves. `order_by` is ignored, so a find query can be passed as is.
+        """
+        self._check_partition_key(filter_by)
+        changed_at = func.coalesce(self.model.updated_at, self.model.created_at)
+        stmt = (
+            select(func.count(), func.max(self.model.id), func.sum(self.model.version), func.max(changed_at))
+            .select_from(self.model)
+            .filter_by(**filter_by)
+            .where(*where)
+        )
+        result = await self.session.execute(stmt)
+        return tuple(result.one())
+
+    async def estimate_count(self, stmt: Select) -> int:
+        """Row count the PostgreSQL planner expects for `stmt`, read from EXPLAIN without running it."""
+        result = await self.session.execute(_Explain(stmt))
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     async def find_one(self, **filter_by: Any) -> Optional[ModelType]:
+        self._check_partition_key(filter_by)
         stmt = select(self.model).filter_by(**filter_by)
         result = await self.session.execute(stmt)
         return result.scalars().first()
@@ -91,7 +205,32 @@ class SQLAlchemyRepository(AbstractRepository[ModelType], Generic[ModelType]):
                 setattr(obj, field, value)
         return obj
 
+    async def update_versioned(
+            self,
+            data: Dict[str, Any],
+            version: int | None,
+            **filter_by: Any
+    ) -> Optional[ModelType]:
+        """
+        Apply `data` only if the row is still at `version` (any version when None), bumping the version
+        in the same statement. Returns None when no row matched, i.e. it is missing or another writer got there first.
+        """
+        self._check_partition_key(filter_by)
+        values = {field: value for field, value in data.items() if hasattr(self.model, field)}
+        stmt = update(self.model).filter_by(**filter_by)
+        if version is not None:
+            stmt = stmt.where(self.model.version == version)
+        stmt = (
+            stmt
+            .values(**values, version=self.model.version + 1)
+            .returning(self.model)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
     async def delete(self, **filter_by: Any) -> bool:
+        self._check_partition_key(filter_by)
         stmt = delete(self.model).filter_by(**filter_by)
         result = await self.session.execute(stmt)
         rowcount = cast(int, result.rowcount)  # IDE thinks `rowcount` is method for some reason
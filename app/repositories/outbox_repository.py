@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import List, Sequence
+
+from sqlalchemy import select, insert, update, delete, func
+
+from app.db.models import OutboxEvent as DBOutboxEvent
+from app.repositories.base_repository import SQLAlchemyRepository
+
+# First key of the advisory locks relays hold on the users whose events they are relaying
+CLAIM_LOCK_SPACE = 0x6F7574
+
+
+class OutboxRepository(SQLAlchemyRepository[DBOutboxEvent]):
+    """Repository class for events awaiting relay to websocket clients."""
+    model = DBOutboxEvent
+
+    async def record(self, event: str, user_id: int, payload: str, project_id: int | None = None) -> None:
+        """Queue an event; it is only relayed if the surrounding transaction commits."""
+        await self.session.execute(
+            insert(self.model).values(event=event, user_id=user_id, project_id=project_id, payload=payload)
+        )
+
+    async def claim_pending(self, limit: int) -> List[DBOutboxEvent]:
+        """
+        Oldest undelivered events, claimed until the transaction ends.
+        On PostgreSQL concurrent relays claim whole users: each takes a transaction-level advisory
+        lock per user and skips users locked by another relay, so a user's events are never
+        relayed by two workers at once and go out in order.
+        """
+        stmt = select(self.model).where(self.model.delivered_at.is_(None)).order_by(self.model.id).limit(limit)
+        if self.dialect_name == "postgresql":
+            users = (
+                select(self.model.user_id)
+                .where(self.model.delivered_at.is_(None))
+                .group_by(self.model.user_id)
+                .order_by(func.min(self.model.id))
+                .limit(limit)
+                .subquery()
+            )
+            # The LIMIT keeps the lock attempts to the users selected, it is not pushed into the subquery
+            claimed = select(users.c.user_id).where(func.pg_try_advisory_xact_lock(CLAIM_LOCK_SPACE, users.c.user_id))
+            user_ids = list((await self.session.execute(claimed)).scalars().all())
+            if not user_ids:
+                return []
+            stmt = stmt.where(self.model.user_id.in_(user_ids))
+        return list((await self.session.execute(stmt)).scalars().all())
+
+    async def mark_delivered(self, ids: Sequence[int]) -> None:
+        await self.session.execute(
+            update(self.model).where(self.model.id.in_(ids)).values(delivered_at=func.now())
+        )
+
+    async def since(self, user_id: int, after_id: int, limit: int) -> List[DBOutboxEvent]:
+        """A user's events after `after_id`, delivered or not, oldest first."""
+        stmt = (
+            select(self.model)
+            .where(self.model.user_id == user_id, self.model.id > after_id)
+            .order_by(self.model.id)
+            .limit(limit)
+        )
+        return list((await self.session.execute(stmt)).scalars().all())
+
+    async def exists(self, user_id: int, event_id: int) -> bool:
+        stmt = select(self.model.id).where(self.model.id == event_id, self.model.user_id == user_id)
+        return (await self.session.execute(stmt)).first() is not None
+
+    async def compact(self, delivered_before: datetime) -> int:
+        """Delete events delivered before `delivered_before`. Returns the number of rows removed."""
+        result = await self.session.execute(
+            delete(self.model).where(self.model.delivered_at < delivered_before)
+        )
+        return result.rowcount
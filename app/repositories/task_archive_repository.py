@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, insert, delete, func, tuple_
+
+from app.db.models import Task as DBTask, TaskArchive as DBTaskArchive
+from app.repositories.base_repository import SQLAlchemyRepository
+
+
+def _copy_columns(source, target):
+    """Columns of `source` to insert into `target`, bumping the version so readers see the move."""
+    names = [column.name for column in target.__table__.columns if column.name in source.__table__.columns]
+    values = [source.version + 1 if name == "version" else source.__table__.c[name] for name in names]
+    return names, values
+
+
+class TaskArchiveRepository(SQLAlchemyRepository[DBTaskArchive]):
+    """
+    Repository class for the cold task archive.
+    Rows keep their task id, so a task is in exactly one tier at a time.
+    """
+    model = DBTaskArchive
+
+    async def archive_completed(self, cutoff: datetime, limit: int) -> List[Tuple[int, int]]:
+        """
+        Move up to `limit` tasks completed and last changed before `cutoff` into the archive.
+        Returns the (id, user_id) pairs moved. Concurrent runs skip each other's rows on PostgreSQL.
+        """
+        changed_at = func.coalesce(DBTask.updated_at, DBTask.created_at)
+        pick = (
+            select(DBTask.id, DBTask.user_id)
+            .where(DBTask.is_completed == True, changed_at < cutoff)  # noqa: E712
+            .limit(limit)
+        )
+        if self.dialect_name == "postgresql":
+            pick = pick.with_for_update(skip_locked=True)
+        keys = [tuple(row) for row in (await self.session.execute(pick)).all()]
+        if not keys:
+            return []
+
+        moved = tuple_(DBTask.id, DBTask.user_id).in_(keys)
+        names, values = _copy_columns(DBTask, self.model)
+        await self.session.execute(insert(self.model).from_select(names, select(*values).where(moved)))
+        await self.session.execute(delete(DBTask).where(moved))
+        return keys
+
+    async def restore(self, user_id: int, task_id: int) -> Optional[DBTask]:
+        """Move an archived task back into the hot table. Returns None if the user has no such archived task."""
+        archived = (self.model.id == task_id) & (self.model.user_id == user_id)
+        names, values = _copy_columns(self.model, DBTask)
+        stmt = insert(DBTask).from_select(names, select(*values).where(archived)).returning(DBTask)
+        task = (await self.session.execute(stmt)).scalars().first()
+        if task is None:
+            return None
+
+        await self.session.execute(delete(self.model).where(archived))
+        return task
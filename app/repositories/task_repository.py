@@ -1,9 +1,107 @@
-from app.db.models import Task as DBTask
+from datetime import datetime, UTC
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, func, literal, true, false, union_all, ColumnElement, Select
+from sqlalchemy.orm import aliased, with_expression
+
+from app.db.models import Task as DBTask, TaskArchive as DBTaskArchive
 from app.repositories.base_repository import SQLAlchemyRepository
 
 
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 class TaskRepository(SQLAlchemyRepository[DBTask]):
     """
     Repository class for Task database operations.
     """
     model = DBTask
+    _load_options: Sequence[Any] = ()
+
+    def including_archived(self) -> "TaskRepository":
+        """
+        A read-only view of this repository over hot and archived tasks together.
+        Tasks load as usual with `is_archived` set; filters are applied on top of a
+        UNION ALL that PostgreSQL pushes down into both tables.
+        """
+        names = [column.name for column in DBTask.__table__.columns]
+        tiers = union_all(
+            select(*(DBTask.__table__.c[name] for name in names), false().label("is_archived")),
+            select(*(DBTaskArchive.__table__.c[name] for name in names), true().label("is_archived"))
+        ).subquery("task_tiers")
+
+        view = TaskRepository(self.session)
+        view.model = aliased(DBTask, tiers, name="task_tiers")
+        view._load_options = (with_expression(view.model.is_archived, tiers.c.is_archived),)
+        return view
+
+    def _select(self, *args: Any, **kwargs: Any) -> Select:
+        return super()._select(*args, **kwargs).options(*self._load_options)
+
+    @property
+    def supports_trigram_search(self) -> bool:
+        """Whether title search can use the pg_trgm index."""
+        return self.dialect_name == "postgresql"
+
+    def deadline_criteria(
+            self,
+            due_after: datetime | None = None,
+            due_before: datetime | None = None,
+            overdue: bool = False
+    ) -> List[ColumnElement[bool]]:
+        """
+        Build WHERE criteria for deadline windows.
+        Overdue means a deadline in the past on a task that is not completed; combined with
+        an `is_completed = false` filter, these criteria are served by `ix_tasks_user_open_deadline`.
+        """
+        criteria = []
+        if due_after is not None:
+            criteria.append(self.model.deadline >= due_after)
+        if due_before is not None:
+            criteria.append(self.model.deadline < due_before)
+        if overdue:
+            criteria.append(self.model.deadline < datetime.now(UTC))
+            criteria.append(self.model.is_completed == False)  # noqa: E712
+        return criteria
+
+    async def find_owner_id(self, task_id: int) -> Optional[int]:
+        """
+        Owner of a task looked up by id alone. This cannot be pruned and probes every partition,
+        so it is only meant for telling "not found" from "not yours" after a scoped lookup missed.
+        """
+        stmt = select(self.model.user_id).where(self.model.id == task_id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def find_titles(self, user_id: int) -> List[Tuple[int, str]]:
+        """Return (id, title) pairs of all tasks owned by a user."""
+        stmt = select(self.model.id, self.model.title).where(self.model.user_id == user_id)
+        result = await self.session.execute(stmt)
+        return [(row.id, row.title) for row in result]
+
+    async def search_titles(self, user_id: int, query: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """
+        Return (id, title) pairs of a user's tasks matching `query`.
+        On PostgreSQL this is a typo-tolerant trigram word-similarity search served by
+        `ix_tasks_title_trgm`; elsewhere it degrades to a case-insensitive prefix match.
+        """
+        pattern = f"{_escape_like(query)}%"
+        stmt = select(self.model.id, self.model.title).where(self.model.user_id == user_id)
+
+        if self.supports_trigram_search:
+            stmt = (
+                stmt.where(
+                    self.model.title.ilike(pattern, escape="\\")
+                    | literal(query).op("<%")(self.model.title)
+                )
+                .order_by(func.word_similarity(query, self.model.title).desc(), self.model.id)
+            )
+        else:
+            stmt = (
+                stmt.where(func.lower(self.model.title).like(pattern.lower(), escape="\\"))
+                .order_by(self.model.title, self.model.id)
+            )
+
+        result = await self.session.execute(stmt.limit(limit))
+        return [(row.id, row.title) for row in result]
@@ -1,3 +1,5 @@
+from typing import Any, Dict
+
 from app.db.models import User as DBUser
 from app.repositories.base_repository import SQLAlchemyRepository
 
@@ -7,3 +9,7 @@ class UserRepository(SQLAlchemyRepository[DBUser]):
     Repository class for User database operations.
     """
     model = DBUser
+
+    async def replicate(self, data: Dict[str, Any]) -> None:
+        """Insert or overwrite the copy of a directory row, keyed by its id, so replicating again is harmless."""
+        await self.session.merge(self.model(**data))
@@ -0,0 +1,46 @@
+"""
+Moves old completed tasks into the `tasks_archive` table.
+
+    python -m app.scripts.archive_tasks --older-than-days 90 --batch-size 1000
+
+Each batch is its own short transaction, so the job can run alongside live traffic
+and be interrupted at any point. Schedule it periodically (e.g. nightly).
+"""
+import argparse
+import asyncio
+import logging
+from datetime import timedelta
+
+from app.core.config import settings
+from app.core.logger import setup_logging
+from app.db.database import engine, shard_engines
+from app.services import TaskService
+from app.utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger("app")
+
+
+async def run(args: argparse.Namespace):
+    try:
+        await TaskService(UnitOfWork()).archive_completed_tasks(
+            timedelta(days=args.older_than_days),
+            batch_size=args.batch_size,
+            max_batches=args.max_batches
+        )
+    finally:
+        for shard_engine in (engine, *shard_engines):
+            await shard_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive completed tasks.")
+    parser.add_argument("--older-than-days", type=int, default=settings.TASK_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-batches", type=int, default=None)
+
+    setup_logging()
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Online move of `tasks` to the hash-partitioned layout on PostgreSQL.
+
+Run after `alembic upgrade head` has created `tasks_partitioned`:
+
+    python -m app.scripts.partition_tasks backfill --batch-size 5000
+    python -m app.scripts.partition_tasks swap
+
+`backfill` installs a trigger mirroring every write on `tasks` into the partitioned table,
+then copies existing rows in id ranges, each batch in its own short transaction. It can be
+stopped and rerun at any time; rows already copied are skipped. `swap` renames the tables
+in one brief transaction and keeps the old table as `tasks_unpartitioned` until it is
+dropped by hand.
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.logger import setup_logging
+from app.db import partitioning
+from app.db.database import engine
+
+logger = logging.getLogger("app")
+
+
+async def install_mirror_trigger(db: AsyncEngine):
+    async with db.begin() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table "
+                "ORDER BY ordinal_position"
+            ),
+            {"table": partitioning.TASKS_TABLE}
+        )
+        columns = list(result.scalars())
+        for statement in partitioning.mirror_trigger_ddl(columns):
+            await conn.execute(text(statement))
+    logger.info("Mirror trigger installed")
+
+
+async def backfill(db: AsyncEngine, batch_size: int, pause: float = 0.0, start_after: int = 0) -> int:
+    """Copy rows with id in (start_after, max(id)] into the partitioned table. Returns rows copied."""
+    await install_mirror_trigger(db)
+
+    # Rows inserted from here on are copied by the trigger
+    async with db.connect() as conn:
+        max_id = (await conn.execute(text(f"SELECT coalesce(max(id), 0) FROM {partitioning.TASKS_TABLE}"))).scalar_one()
+
+    copied = 0
+    after = start_after
+    while after < max_id:
+        upto = min(after + batch_size, max_id)
+        async with db.begin() as conn:
+            result = await conn.execute(text(partitioning.BACKFILL_BATCH), {"after": after, "upto": upto})
+            copied += result.rowcount
+        logger.info(f"Backfilled tasks up to id {upto} of {max_id} ({copied} rows copied)")
+        after = upto
+        if pause:
+            await asyncio.sleep(pause)
+    return copied
+
+
+async def swap(db: AsyncEngine, lock_timeout: str = "5s"):
+    async with db.begin() as conn:
+        # Give up rather than queue every other query behind the lock
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+        for statement in partitioning.swap_ddl():
+            await conn.execute(text(statement))
+    logger.info(f"Swapped in partitioned tasks table; old table kept as {partitioning.UNPARTITIONED_TABLE}")
+
+
+async def run(args: argparse.Namespace):
+    try:
+        if args.command == "backfill":
+            await backfill(engine, args.batch_size, args.pause, args.start_after)
+        else:
+            await swap(engine, args.lock_timeout)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move tasks to the hash-partitioned table online.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = commands.add_parser("backfill", help="mirror writes and copy existing rows in batches")
+    backfill_parser.add_argument("--batch-size", type=int, default=5000)
+    backfill_parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    backfill_parser.add_argument("--start-after", type=int, default=0, help="resume after this task id")
+
+    swap_parser = commands.add_parser("swap", help="replace tasks with the partitioned table")
+    swap_parser.add_argument("--lock-timeout", default="5s")
+
+    setup_logging()
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
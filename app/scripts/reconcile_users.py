@@ -0,0 +1,91 @@
+"""
+Repairs the copies of directory users kept on the other shards.
+
+    python -m app.scripts.reconcile_users
+
+Registration copies a user's row to its shard after committing it to the directory on shard 0,
+and deletion removes the copy afterwards. When that second step fails, this copies users missing
+from the shard they are routed to and removes copies, with their projects and tasks, of users
+no longer in the directory. Copies of users routed elsewhere are left to `reshard_user purge`.
+"""
+import asyncio
+import logging
+from typing import Dict, Sequence, Set
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.logger import setup_logging
+from app.db.database import async_session_maker, engine, shard_engines, shard_session_makers, shard_map
+from app.db.models import User
+from app.db.sharding import ShardMap
+from app.scripts.reshard_user import SHARDED_MODELS
+from app.services.user_service import user_row
+
+logger = logging.getLogger("app")
+
+
+async def directory_ids(directory, batch_size: int) -> Set[int]:
+    """The ids of every directory user, read in keyset batches so no full rows are loaded."""
+    ids: Set[int] = set()
+    after = 0
+    while True:
+        query = select(User.id).where(User.id > after).order_by(User.id).limit(batch_size)
+        batch = (await directory.execute(query)).scalars().all()
+        ids.update(batch)
+        if len(batch) < batch_size:
+            return ids
+        after = batch[-1]
+
+
+async def reconcile_users(
+        session_makers: Sequence[async_sessionmaker],
+        placement: ShardMap,
+        batch_size: int = 1000
+) -> Dict[str, int]:
+    """Make every shard but the directory hold the users routed to it and none deleted from it. Returns the rows fixed.
+
+    Each shard's ids are read before the directory's, so a user registered in between is never
+    taken for a deleted one; orphans are still re-checked against the directory just before deletion.
+    """
+    fixed = {"copied": 0, "removed": 0}
+    for shard, session_maker in enumerate(session_makers[1:], start=1):
+        async with session_maker() as session, session_makers[0]() as directory:
+            present = set((await session.execute(select(User.id))).scalars())
+            users = await directory_ids(directory, batch_size)
+
+            missing = sorted(user_id for user_id in users - present if placement.shard_for(user_id) == shard)
+            for offset in range(0, len(missing), batch_size):
+                chunk = missing[offset:offset + batch_size]
+                for user in (await directory.execute(select(User).where(User.id.in_(chunk)))).scalars():
+                    await session.merge(User(**user_row(user)))
+                    fixed["copied"] += 1
+
+            orphans = present - users
+            if orphans:
+                orphans -= set((await directory.execute(select(User.id).where(User.id.in_(orphans)))).scalars())
+            for user_id in orphans:
+                for model, owner_column in reversed(SHARDED_MODELS):
+                    await session.execute(delete(model).where(getattr(model, owner_column) == user_id))
+                await session.execute(delete(User).where(User.id == user_id))
+                fixed["removed"] += 1
+            await session.commit()
+    logger.info(f"Reconciled users across {len(session_makers)} shards: {fixed}")
+    return fixed
+
+
+async def run():
+    try:
+        await reconcile_users([async_session_maker, *shard_session_makers], shard_map)
+    finally:
+        for shard_engine in (engine, *shard_engines):
+            await shard_engine.dispose()
+
+
+def main():
+    setup_logging()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
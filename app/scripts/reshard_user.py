@@ -0,0 +1,159 @@
+"""
+Moves one user's projects and tasks between shards.
+
+    python -m app.scripts.reshard_user copy --user-id 42 --to 3
+    # pin the user with SHARD_OVERRIDES='{"42": 3}' and roll it out, then catch up and clean up:
+    python -m app.scripts.reshard_user copy --user-id 42 --from 1 --to 3
+    python -m app.scripts.reshard_user purge --user-id 42 --from 1
+
+`copy` is idempotent: rows already on the target at the same or a newer version are left alone,
+so the second pass only picks up writes made before the override took effect. Deletes made in
+that window are not carried over, so keep it short. The user's outbox events move along, and the
+target's outbox sequence is advanced past them so that event sequence numbers keep growing.
+
+`init-sequences` interleaves the id sequences of every shard (see SHARD_ID_STRIDE) so that
+moved rows never collide with local ids. It skips sequences already interleaved, and the image's
+entrypoint runs it on every start when shards are configured.
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, Sequence
+
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.logger import setup_logging
+from app.db.database import async_session_maker, engine, shard_engines, shard_session_makers, shard_map
+from app.db.models import User, Project, Task, TaskArchive, OutboxEvent
+from app.db.sharding import SEQUENCED_TABLES, advance_sequence_sql, id_sequence_ddl
+
+logger = logging.getLogger("app")
+
+# In foreign key order, with the column naming the owner
+SHARDED_MODELS = ((Project, "owner_id"), (Task, "user_id"), (TaskArchive, "user_id"), (OutboxEvent, "user_id"))
+# A task lives in exactly one tier
+OTHER_TIER = {Task: TaskArchive, TaskArchive: Task}
+
+
+def _row(obj) -> Dict[str, Any]:
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+
+async def copy_user(
+        source: async_sessionmaker,
+        target: async_sessionmaker,
+        user_id: int,
+        target_shard: int | None = None,
+        stride: int = settings.SHARD_ID_STRIDE
+) -> Dict[str, int]:
+    """
+    Copy a user's rows from `source` to `target`, shard `target_shard` on PostgreSQL.
+    Returns the number of rows written per table.
+    """
+    copied: Dict[str, int] = {}
+    async with source() as src, target() as dst:
+        user = await src.get(User, user_id)
+        if user is None:
+            raise ValueError(f"User {user_id} not found on the source shard")
+        await dst.merge(User(**_row(user)))
+
+        for model, owner_column in SHARDED_MODELS:
+            copied[model.__tablename__] = 0
+            rows = await src.execute(select(model).where(getattr(model, owner_column) == user_id))
+            for obj in rows.scalars():
+                data = _row(obj)
+                other_tier = OTHER_TIER.get(model)
+                existing = await dst.get(model, data["id"])
+                if existing is None and other_tier is not None:
+                    existing = await dst.get(other_tier, data["id"])
+                # Outbox events never change once written
+                if existing is not None and ("version" not in data or existing.version >= data["version"]):
+                    continue
+
+                if other_tier is not None:
+                    await dst.execute(delete(other_tier).where(other_tier.id == data["id"]))
+                await dst.merge(model(**data))
+                copied[model.__tablename__] += 1
+
+        last_event = await src.scalar(select(func.max(OutboxEvent.id)).where(OutboxEvent.user_id == user_id))
+        if last_event is not None and target_shard is not None and dst.bind.dialect.name == "postgresql":
+            await dst.execute(text(advance_sequence_sql(OutboxEvent.__tablename__, target_shard, stride, last_event)))
+        await dst.commit()
+    logger.info(f"Copied user {user_id}: {copied}")
+    return copied
+
+
+async def purge_user(session_maker: async_sessionmaker, user_id: int, drop_user: bool) -> None:
+    """Delete a user's projects and tasks from a shard, and its user row too when it is not the directory."""
+    async with session_maker() as session:
+        for model, owner_column in reversed(SHARDED_MODELS):
+            await session.execute(delete(model).where(getattr(model, owner_column) == user_id))
+        if drop_user:
+            await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+    logger.info(f"Purged user {user_id}")
+
+
+async def init_sequences(engines: Sequence, stride: int) -> None:
+    if len(engines) == 1:
+        logger.info("Only one shard, id sequences left as they are")
+        return
+    for shard, shard_engine in enumerate(engines):
+        async with shard_engine.begin() as conn:
+            for table in SEQUENCED_TABLES:
+                increment = await conn.scalar(
+                    text("SELECT increment_by FROM pg_sequences WHERE sequencename = :name"),
+                    {"name": f"{table}_id_seq"}
+                )
+                if increment == stride:
+                    continue
+                for statement in id_sequence_ddl(shard, stride, [table]):
+                    await conn.execute(text(statement))
+                logger.info(f"Interleaved the {table} id sequence of shard {shard} with stride {stride}")
+
+
+async def run(args: argparse.Namespace):
+    session_makers = [async_session_maker, *shard_session_makers]
+    engines = [engine, *shard_engines]
+    try:
+        if args.command == "init-sequences":
+            await init_sequences(engines, settings.SHARD_ID_STRIDE)
+            return
+
+        source = args.source if args.source is not None else shard_map.shard_for(args.user_id)
+        if args.command == "copy":
+            if source == args.target:
+                raise SystemExit("Source and target shard are the same")
+            await copy_user(session_makers[source], session_makers[args.target], args.user_id, args.target)
+        else:
+            if shard_map.shard_for(args.user_id) == source:
+                raise SystemExit(f"User {args.user_id} is still routed to shard {source}; deploy the override first")
+            await purge_user(session_makers[source], args.user_id, drop_user=source != 0)
+    finally:
+        for shard_engine in engines:
+            await shard_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move a user's data between shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    copy_parser = commands.add_parser("copy", help="copy a user's rows to another shard")
+    copy_parser.add_argument("--user-id", type=int, required=True)
+    copy_parser.add_argument("--from", dest="source", type=int, help="defaults to the shard the user is routed to")
+    copy_parser.add_argument("--to", dest="target", type=int, required=True)
+
+    purge_parser = commands.add_parser("purge", help="delete a user's rows from the shard it was moved off")
+    purge_parser.add_argument("--user-id", type=int, required=True)
+    purge_parser.add_argument("--from", dest="source", type=int, required=True)
+
+    commands.add_parser("init-sequences", help="interleave id sequences across shards")
+
+    setup_logging()
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import logging
-from typing import Dict
+from typing import Any, Dict
 
 from app.api.schemas.user import UserCreate, UserResponse, UserLogin
-from app.core.security import get_password_hash, verify_password, create_jwt_token
-from app.exceptions import UserAlreadyExistsError, InvalidCredentialsError
+from app.core.security import verify_password, create_jwt_token
+from app.exceptions import InvalidCredentialsError
+from app.services.user_service import add_user, replicate_user, user_row
+from app.utils.retry import retryable
 from app.utils.unitofwork import UnitOfWork
 
 logger = logging.getLogger("app")
@@ -14,29 +16,26 @@ class AuthService:
         self.uow = uow
 
     async def register(self, user: UserCreate) -> UserResponse:
-        async with self.uow:
-            if await self.uow.user.find_one(username=user.username):
-                raise UserAlreadyExistsError(user.username)
-
-            user_dict = user.model_dump()
-            hashed_password = get_password_hash(user_dict.pop("password"))
-            user_dict["hashed_password"] = hashed_password
-
-            user_db = await self.uow.user.add(user_dict)
-            user_response = UserResponse.model_validate(user_db)
-            await self.uow.commit()
-
-            logger.info(f"New user registered: {user.username}")
-            return user_response
+        user_response, row = await add_user(self.uow, user)
+        await replicate_user(self.uow, row)
+        logger.info(f"New user registered: {user.username}")
+        return user_response
 
     async def login(self, user: UserLogin) -> Dict[str, str]:
+        row = await self._authenticate(user)
+        # Repairs a copy that failed to replicate at registration
+        await replicate_user(self.uow, row)
+
+        logger.info(f"User logged in: {user.username}")
+        return {
+            "access_token": create_jwt_token({"sub": user.username}),
+            "token_type": "bearer"
+        }
+
+    @retryable
+    async def _authenticate(self, user: UserLogin) -> Dict[str, Any]:
         async with self.uow:
             user_db = await self.uow.user.find_one(username=user.username)
             if not user_db or not verify_password(user.password, user_db.hashed_password):
                 raise InvalidCredentialsError()
-
-            logger.info(f"User logged in: {user.username}")
-            return {
-                "access_token": create_jwt_token({"sub": user.username}),
-                "token_type": "bearer"
-            }
+            return user_row(user_db)
@@ -1,37 +1,95 @@
 import logging
-from typing import List
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
 
+from app.api.schemas.pagination import Page
 from app.api.schemas.project import ProjectCreate, ProjectResponse, ProjectUpdate
 from app.api.schemas.task import TaskResponse, PriorityLevel
-from app.exceptions import ProjectNotFoundError, PermissionDeniedError
+from app.core.config import settings
+from app.core.events import OutboxRelay
+from app.exceptions import ProjectNotFoundError, PermissionDeniedError, ProjectVersionConflictError
+from app.repositories import TaskRepository
+from app.utils.retry import retryable
 from app.utils.unitofwork import UnitOfWork
 
 logger = logging.getLogger("app")
 
 
 class ProjectService:
-    def __init__(self, uow: UnitOfWork):
+    def __init__(self, uow: UnitOfWork, events: OutboxRelay | None = None):
         self.uow = uow
+        self.events = events
 
+    async def _record_event(self, event_type: str, project: ProjectResponse):
+        """Add an event to the outbox; it is sent only if the current transaction commits."""
+        await self.uow.outbox.record(event_type, project.owner_id, project.model_dump_json())
+
+    def _wake_relay(self):
+        if self.events is not None:
+            self.events.wake()
+
+    @retryable
     async def create_project(self, user_id: int, project: ProjectCreate) -> ProjectResponse:
-        async with self.uow:
+        async with self.uow(user_id):
             project_data = project.model_dump()
             project_data["owner_id"] = user_id
 
             project_db = await self.uow.project.add(project_data)
             project_response = ProjectResponse.model_validate(project_db)
+            await self._record_event("project_created", project_response)
             await self.uow.commit()
+            self._wake_relay()
 
             logger.info(f"Created project {project_db.id} by user {user_id}")
             return project_response
 
-    async def get_projects(self, user_id: int, skip: int = 0, limit: int | None = None) -> List[ProjectResponse]:
-        async with self.uow:
+    @retryable
+    async def get_projects(
+            self,
+            user_id: int,
+            skip: int = 0,
+            limit: int | None = None,
+            unchanged: Callable[[Tuple[Any, ...]], bool] | None = None
+    ) -> List[ProjectResponse] | None:
+        """
+        The user's projects. `unchanged` is called with a fingerprint of them before any row loads;
+        when it returns True, None is returned instead of the projects.
+        """
+        async with self.uow(user_id):
+            if unchanged is not None and unchanged(await self.uow.project.fingerprint(owner_id=user_id)):
+                return None
             projects = await self.uow.project.find_all(skip, limit, owner_id=user_id)
             return [ProjectResponse.model_validate(p) for p in projects]
 
+    @retryable
+    async def get_projects_page(
+            self,
+            user_id: int,
+            skip: int = 0,
+            limit: int | None = None,
+            estimate_total: bool = False,
+            unchanged: Callable[[Tuple[Any, ...]], bool] | None = None
+    ) -> Page[ProjectResponse] | None:
+        """
+        A page of projects with their total; `estimate_total` lets a large total be a planner estimate.
+        `unchanged` works as in `get_projects`.
+        """
+        async with self.uow(user_id):
+            if unchanged is not None and unchanged(await self.uow.project.fingerprint(owner_id=user_id)):
+                return None
+            threshold = settings.COUNT_ESTIMATE_THRESHOLD if estimate_total else None
+            projects, total, estimated = await self.uow.project.find_page(
+                skip, limit, estimate_threshold=threshold, owner_id=user_id
+            )
+            return Page(
+                items=[ProjectResponse.model_validate(p) for p in projects],
+                total=total,
+                total_is_estimate=estimated
+            )
+
+    @retryable
     async def get_project(self, user_id: int, project_id: int) -> ProjectResponse:
-        async with self.uow:
+        async with self.uow(user_id):
             project = await self.uow.project.find_one(id=project_id)
             if not project:
                 raise ProjectNotFoundError(project_id)
@@ -39,69 +97,172 @@ class ProjectService:
                 raise PermissionDeniedError("You do not own this project.")
             return ProjectResponse.model_validate(project)
 
+    def _tasks(self, include_archived: bool) -> TaskRepository:
+        return self.uow.task.including_archived() if include_archived else self.uow.task
+
+    @staticmethod
+    def _project_task_query(
+            tasks: TaskRepository,
+            user_id: int,
+            project_id: int,
+            completed: bool | None,
+            priority: PriorityLevel | None,
+            due_after: datetime | None,
+            due_before: datetime | None,
+            overdue: bool,
+            sort_by: str,
+            sort_order: str
+    ) -> Dict[str, Any]:
+        filters: Dict[str, Any] = {"user_id": user_id, "project_id": project_id}
+        if completed is not None:
+            filters["is_completed"] = completed
+        if priority is not None:
+            filters["priority"] = priority
+
+        valid_sort_columns = {
+            "created_at", "deadline", "priority",
+            "updated_at", "title"
+        }
+        valid_sort_orders = {"desc", "asc"}
+        sort_column = sort_by if sort_by in valid_sort_columns else "created_at"
+        sort_order = sort_order if sort_order in valid_sort_orders else "desc"
+
+        criteria = tasks.deadline_criteria(due_after, due_before, overdue)
+        return {"order_by": {sort_column: sort_order}, "where": criteria, **filters}
+
+    @retryable
     async def get_project_tasks(
             self,
             user_id: int,
             project_id: int,
             completed: bool | None = None,
             priority: PriorityLevel | None = None,
+            due_after: datetime | None = None,
+            due_before: datetime | None = None,
+            overdue: bool = False,
             sort_by: str = "created_at",
             sort_order: str = "desc",
             skip: int = 0,
-            limit: int | None = None
-    ) -> List[TaskResponse]:
-        async with self.uow:
+            limit: int | None = None,
+            include_archived: bool = False,
+            unchanged: Callable[[Tuple[Any, ...]], bool] | None = None
+    ) -> List[TaskResponse] | None:
+        """
+        A project's tasks. `unchanged` is called with a fingerprint of the matching set before any
+        task loads; when it returns True, None is returned instead of the tasks.
+        """
+        async with self.uow(user_id):
             project = await self.uow.project.find_one(id=project_id)
             if not project:
                 raise ProjectNotFoundError(project_id)
             if project.owner_id != user_id:
                 raise PermissionDeniedError("You do not own this project.")
 
-            filters = {"project_id": project_id}
-            if completed is not None:
-                filters["is_completed"] = completed
-            if priority is not None:
-                filters["priority"] = priority
-
-            valid_sort_columns = {
-                "created_at", "deadline", "priority",
-                "updated_at", "title"
-            }
-            valid_sort_orders = {"desc", "asc"}
-            sort_column = sort_by if sort_by in valid_sort_columns else "created_at"
-            sort_order = sort_order if sort_order in valid_sort_orders else "desc"
-
-            tasks = await self.uow.task.find_all(skip=skip, limit=limit, order_by={sort_column: sort_order}, **filters)
+            repository = self._tasks(include_archived)
+            query = self._project_task_query(
+                repository, user_id, project_id, completed, priority, due_after, due_before, overdue,
+                sort_by, sort_order
+            )
+            if unchanged is not None and unchanged(await repository.fingerprint(**query)):
+                return None
+            tasks = await repository.find_all(skip=skip, limit=limit, **query)
             return [TaskResponse.model_validate(task) for task in tasks]
 
-    async def update_project(self, user_id: int, project_id: int, project: ProjectUpdate) -> ProjectResponse:
-        async with self.uow:
+    @retryable
+    async def get_project_tasks_page(
+            self,
+            user_id: int,
+            project_id: int,
+            completed: bool | None = None,
+            priority: PriorityLevel | None = None,
+            due_after: datetime | None = None,
+            due_before: datetime | None = None,
+            overdue: bool = False,
+            sort_by: str = "created_at",
+            sort_order: str = "desc",
+            skip: int = 0,
+            limit: int | None = None,
+            include_archived: bool = False,
+            estimate_total: bool = False,
+            unchanged: Callable[[Tuple[Any, ...]], bool] | None = None
+    ) -> Page[TaskResponse] | None:
+        """
+        A page of a project's tasks with their total; `estimate_total` lets a large total be a planner estimate.
+        `unchanged` works as in `get_project_tasks`.
+        """
+        async with self.uow(user_id):
+            project = await self.uow.project.find_one(id=project_id)
+            if not project:
+                raise ProjectNotFoundError(project_id)
+            if project.owner_id != user_id:
+                raise PermissionDeniedError("You do not own this project.")
+
+            repository = self._tasks(include_archived)
+            query = self._project_task_query(
+                repository, user_id, project_id, completed, priority, due_after, due_before, overdue,
+                sort_by, sort_order
+            )
+            if unchanged is not None and unchanged(await repository.fingerprint(**query)):
+                return None
+            threshold = settings.COUNT_ESTIMATE_THRESHOLD if estimate_total else None
+            tasks, total, estimated = await repository.find_page(
+                skip=skip, limit=limit, estimate_threshold=threshold, **query
+            )
+            return Page(
+                items=[TaskResponse.model_validate(task) for task in tasks],
+                total=total,
+                total_is_estimate=estimated
+            )
+
+    @retryable
+    async def update_project(
+            self,
+            user_id: int,
+            project_id: int,
+            project: ProjectUpdate,
+            expected_version: int | None = None
+    ) -> ProjectResponse:
+        async with self.uow(user_id):
             project_db = await self.uow.project.find_one(id=project_id)
             if not project_db:
                 raise ProjectNotFoundError(project_id)
             if project_db.owner_id != user_id:
                 raise PermissionDeniedError("You do not own this project.")
+            if expected_version is not None and project_db.version != expected_version:
+                raise ProjectVersionConflictError(project_id)
 
             update_data = project.model_dump()
-            project_updated = await self.uow.project.update(update_data, id=project_id)
+            # Only If-Match guards the write: every field is replaced and the whole project is sent,
+            # so without one the last writer simply wins
+            project_updated = await self.uow.project.update_versioned(update_data, expected_version, id=project_id)
             if not project_updated:
-                raise ProjectNotFoundError(project_id)
+                if expected_version is None:
+                    raise ProjectNotFoundError(project_id)
+                raise ProjectVersionConflictError(project_id)
             project_response = ProjectResponse.model_validate(project_updated)
+            await self._record_event("project_updated", project_response)
             await self.uow.commit()
+            self._wake_relay()
 
             logger.info(f"Updated project {project_id} by user {user_id}")
             return project_response
 
-    async def delete_project(self, user_id: int, project_id: int) -> None:
-        async with self.uow:
+    @retryable
+    async def delete_project(self, user_id: int, project_id: int, expected_version: int | None = None) -> None:
+        async with self.uow(user_id):
             project = await self.uow.project.find_one(id=project_id)
             if not project:
                 raise ProjectNotFoundError(project_id)
             if project.owner_id != user_id:
                 raise PermissionDeniedError("You do not own this project.")
 
-            deleted = await self.uow.project.delete(id=project_id)
-            if not deleted:
-                raise ProjectNotFoundError(project_id)
+            if expected_version is None:
+                deleted = await self.uow.project.delete(id=project_id)
+                if not deleted:
+                    raise ProjectNotFoundError(project_id)
+            else:
+                deleted = await self.uow.project.delete(id=project_id, version=expected_version)
+                if not deleted:
+                    raise ProjectVersionConflictError(project_id)
             await self.uow.commit()
             logger.info(f"Deleted project {project_id} by user {user_id}")
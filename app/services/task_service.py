@@ -1,19 +1,63 @@
+import json
 import logging
-from typing import List
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.api.schemas.task import TaskCreate, TaskResponse, TaskUpdate
-from app.exceptions import ProjectNotFoundError, PermissionDeniedError, TaskNotFoundError
+from app.api.schemas.pagination import Page
+from app.api.schemas.task import TaskCreate, TaskResponse, TaskUpdate, TaskTitleSuggestion
+from app.core.config import settings
+from app.core.events import OutboxRelay
+from app.exceptions import (
+    ProjectNotFoundError,
+    PermissionDeniedError,
+    TaskNotFoundError,
+    TaskUpdateConflictError,
+    TaskVersionConflictError
+)
+from app.repositories import TaskRepository
+from app.utils.retry import retryable
+from app.utils.title_index import TitleIndex
 from app.utils.unitofwork import UnitOfWork
 
 logger = logging.getLogger("app")
 
 
 class TaskService:
-    def __init__(self, uow: UnitOfWork):
+    # Times an update without If-Match re-reads the task after losing to a concurrent writer
+    UPDATE_ATTEMPTS = 3
+
+    def __init__(
+            self,
+            uow: UnitOfWork,
+            title_index: Optional[TitleIndex] = None,
+            events: Optional[OutboxRelay] = None
+    ):
         self.uow = uow
+        self.title_index = title_index
+        self.events = events
+
+    async def _record_event(self, event_type: str, task: TaskResponse, data: Dict[str, Any] | None = None):
+        """
+        Add an event to the outbox; it is sent only if the current transaction commits.
+        `data` replaces the full task as the payload, e.g. with a delta.
+        """
+        payload = task.model_dump_json() if data is None else json.dumps(data)
+        await self.uow.outbox.record(event_type, task.user_id, payload, project_id=task.project_id)
+
+    @staticmethod
+    def _delta(before: Dict[str, Any], after: TaskResponse) -> Dict[str, Any]:
+        """The fields of `after` that differ from `before` (a JSON dump), plus the id and version."""
+        delta = {field: value for field, value in after.model_dump(mode="json").items() if before.get(field) != value}
+        delta.update(id=after.id, version=after.version)
+        return delta
+
+    def _wake_relay(self):
+        if self.events is not None:
+            self.events.wake()
 
+    @retryable
     async def create_task(self, user_id: int, task: TaskCreate) -> TaskResponse:
-        async with self.uow:
+        async with self.uow(user_id):
             task_data = task.model_dump()
 
             if task.project_id is not None:
@@ -27,61 +71,234 @@ class TaskService:
 
             task_db = await self.uow.task.add(task_data)
             task_response = TaskResponse.model_validate(task_db)
+            await self._record_event("task_created", task_response)
             await self.uow.commit()
+            self._wake_relay()
+
+            if self.title_index is not None:
+                self.title_index.add(user_id, task_response.id, task_response.title)
 
             logger.info(f"Created task {task_db.id} by user {user_id}")
             return task_response
 
-    async def get_tasks(self, user_id: int, skip: int = 0, limit: int | None = None) -> List[TaskResponse]:
-        async with self.uow:
-            tasks = await self.uow.task.find_all(skip, limit, user_id=user_id)
+    def _tasks(self, include_archived: bool) -> TaskRepository:
+        return self.uow.task.including_archived() if include_archived else self.uow.task
+
+    @staticmethod
+    def _task_query(
+            tasks: TaskRepository,
+            user_id: int,
+            completed: bool | None,
+            due_after: datetime | None,
+            due_before: datetime | None,
+            overdue: bool
+    ) -> Dict[str, Any]:
+        filters: Dict[str, Any] = {"user_id": user_id}
+        if completed is not None:
+            filters["is_completed"] = completed
+
+        criteria = tasks.deadline_criteria(due_after, due_before, overdue)
+        # Without an explicit order, rows would come back in whatever order the partitions are scanned;
+        # deadlines can be shared or NULL, so the id breaks ties and keeps skip/limit windows stable
+        order_by = {"deadline": "asc", "id": "asc"} if criteria else {"id": "asc"}
+        return {"order_by": order_by, "where": criteria, **filters}
+
+    @retryable
+    async def get_tasks(
+            self,
+            user_id: int,
+            skip: int = 0,
+            limit: int | None = None,
+            completed: bool | None = None,
+            due_after: datetime | None = None,
+            due_before: datetime | None = None,
+            overdue: bool = False,
+            include_archived: bool = False,
+            unchanged: Callable[[Tuple[Any, ...]], bool] | None = None
+    ) -> List[TaskResponse] | None:
+        """
+        Tasks matching the filters. `unchanged` is called with a fingerprint of the matching set
+        before any row loads; when it returns True, None is returned instead of the tasks.
+        """
+        async with self.uow(user_id):
+            repository = self._tasks(include_archived)
+            query = self._task_query(repository, user_id, completed, due_after, due_before, overdue)
+            if unchanged is not None and unchanged(await repository.fingerprint(**query)):
+                return None
+            tasks = await repository.find_all(skip, limit, **query)
             return [TaskResponse.model_validate(task) for task in tasks]
 
+    @retryable
+    async def get_tasks_page(
+            self,
+            user_id: int,
+            skip: int = 0,
+            limit: int | None = None,
+            completed: bool | None = None,
+            due_after: datetime | None = None,
+            due_before: datetime | None = None,
+            overdue: bool = False,
+            include_archived: bool = False,
+            estimate_total: bool = False,
+            unchanged: Callable[[Tuple[Any, ...]], bool] | None = None
+    ) -> Page[TaskResponse] | None:
+        """
+        A page of tasks with their total; `estimate_total` lets a large total be a planner estimate.
+        `unchanged` works as in `get_tasks`.
+        """
+        async with self.uow(user_id):
+            repository = self._tasks(include_archived)
+            query = self._task_query(repository, user_id, completed, due_after, due_before, overdue)
+            if unchanged is not None and unchanged(await repository.fingerprint(**query)):
+                return None
+            threshold = settings.COUNT_ESTIMATE_THRESHOLD if estimate_total else None
+            tasks, total, estimated = await repository.find_page(
+                skip, limit, estimate_threshold=threshold, **query
+            )
+            return Page(
+                items=[TaskResponse.model_validate(task) for task in tasks],
+                total=total,
+                total_is_estimate=estimated
+            )
+
+    @retryable
+    async def autocomplete_titles(self, user_id: int, query: str, limit: int = 10) -> List[TaskTitleSuggestion]:
+        async with self.uow(user_id):
+            if self.title_index is None or self.uow.task.supports_trigram_search:
+                matches = await self.uow.task.search_titles(user_id, query, limit)
+            else:
+                if not self.title_index.is_loaded(user_id):
+                    self.title_index.load(user_id, await self.uow.task.find_titles(user_id))
+                matches = self.title_index.search(user_id, query, limit)
+            return [TaskTitleSuggestion(id=task_id, title=title) for task_id, title in matches]
+
+    async def _get_owned_task(self, user_id: int, task_id: int):
+        # Scoped to the owner so the lookup prunes to one partition; only a miss pays for the global probe
+        task = await self.uow.task.find_one(id=task_id, user_id=user_id)
+        if task:
+            return task
+        if await self.uow.task.find_owner_id(task_id) is None:
+            raise TaskNotFoundError(task_id)
+        raise PermissionDeniedError("You do not own this task.")
+
+    @retryable
     async def get_task(self, user_id: int, task_id: int) -> TaskResponse:
-        async with self.uow:
-            task = await self.uow.task.find_one(id=task_id)
-            if not task:
-                raise TaskNotFoundError(task_id)
-            if task.user_id != user_id:
-                raise PermissionDeniedError("You do not own this task.")
+        async with self.uow(user_id):
+            task = await self._get_owned_task(user_id, task_id)
             return TaskResponse.model_validate(task)
 
-    async def update_task(self, user_id: int, task_id: int, task: TaskUpdate) -> TaskResponse:
-        async with self.uow:
-            task_db = await self.uow.task.find_one(id=task_id)
-            if not task_db:
-                raise TaskNotFoundError(task_id)
-            if task_db.user_id != user_id:
-                raise PermissionDeniedError("You do not own this task.")
+    @retryable
+    async def update_task(
+            self,
+            user_id: int,
+            task_id: int,
+            task: TaskUpdate,
+            expected_version: int | None = None
+    ) -> TaskResponse:
+        for _ in range(self.UPDATE_ATTEMPTS):
+            async with self.uow(user_id):
+                task_db = await self._get_owned_task(user_id, task_id)
+                if expected_version is not None and task_db.version != expected_version:
+                    raise TaskVersionConflictError(task_id)
+                before = TaskResponse.model_validate(task_db).model_dump(mode="json")
 
-            update_data = task.model_dump(exclude_unset=True)
+                update_data = task.model_dump(exclude_unset=True)
 
-            if task.project_id is not None:
-                project = await self.uow.project.find_one(id=task.project_id)
-                if not project:
-                    raise ProjectNotFoundError(task.project_id)
-                if project.owner_id != user_id:
-                    raise PermissionDeniedError("You do not own this project.")
+                if task.project_id is not None:
+                    project = await self.uow.project.find_one(id=task.project_id)
+                    if not project:
+                        raise ProjectNotFoundError(task.project_id)
+                    if project.owner_id != user_id:
+                        raise PermissionDeniedError("You do not own this project.")
 
-            task_updated = await self.uow.task.update(update_data, id=task_id)
-            if not task_updated:
-                raise TaskNotFoundError(task_id)
-            task_response = TaskResponse.model_validate(task_updated)
-            await self.uow.commit()
+                # Guarded on the version read above, so the delta below is against what was overwritten
+                task_updated = await self.uow.task.update_versioned(
+                    update_data, task_db.version, id=task_id, user_id=user_id
+                )
+                if not task_updated:
+                    if expected_version is not None:
+                        raise TaskVersionConflictError(task_id)
+                    # Without If-Match there is no precondition to fail; read the task again
+                    continue
+                task_response = TaskResponse.model_validate(task_updated)
+                # Clients apply updates onto the task they hold, so only the changes are sent
+                await self._record_event("task_updated", task_response, self._delta(before, task_response))
+                await self.uow.commit()
+                self._wake_relay()
 
-            logger.info(f"Updated task {task_id} by user {user_id}")
-            return task_response
+                if self.title_index is not None and "title" in update_data:
+                    self.title_index.add(user_id, task_response.id, task_response.title)
+
+                logger.info(f"Updated task {task_id} by user {user_id}")
+                return task_response
+        raise TaskUpdateConflictError(task_id)
 
-    async def delete_task(self, user_id: int, task_id: int) -> None:
-        async with self.uow:
-            task = await self.uow.task.find_one(id=task_id)
-            if not task:
-                raise TaskNotFoundError(task_id)
-            if task.user_id != user_id:
-                raise PermissionDeniedError("You do not own this task.")
-
-            deleted = await self.uow.task.delete(id=task_id)
-            if not deleted:
-                raise TaskNotFoundError(task_id)
+    @retryable
+    async def delete_task(self, user_id: int, task_id: int, expected_version: int | None = None) -> None:
+        async with self.uow(user_id):
+            await self._get_owned_task(user_id, task_id)
+
+            if expected_version is None:
+                deleted = await self.uow.task.delete(id=task_id, user_id=user_id)
+                if not deleted:
+                    raise TaskNotFoundError(task_id)
+            else:
+                deleted = await self.uow.task.delete(id=task_id, user_id=user_id, version=expected_version)
+                if not deleted:
+                    raise TaskVersionConflictError(task_id)
             await self.uow.commit()
+
+            if self.title_index is not None:
+                self.title_index.remove(user_id, task_id)
             logger.info(f"Deleted task {task_id} by user {user_id}")
+
+    @retryable
+    async def restore_task(self, user_id: int, task_id: int) -> TaskResponse:
+        """Move an archived task back into the hot table. Restoring a task that is not archived is a no-op."""
+        async with self.uow(user_id):
+            task = await self.uow.task_archive.restore(user_id, task_id)
+            if task is None:
+                task = await self._get_owned_task(user_id, task_id)
+                return TaskResponse.model_validate(task)
+
+            task_response = TaskResponse.model_validate(task)
+            await self._record_event("task_updated", task_response)
+            await self.uow.commit()
+            self._wake_relay()
+
+            if self.title_index is not None:
+                self.title_index.add(user_id, task_response.id, task_response.title)
+
+            logger.info(f"Restored task {task_id} by user {user_id}")
+            return task_response
+
+    async def archive_completed_tasks(
+            self,
+            older_than: timedelta,
+            batch_size: int = 1000,
+            max_batches: int | None = None
+    ) -> int:
+        """
+        Move tasks completed and untouched for longer than `older_than` into the archive on every shard,
+        `batch_size` rows per transaction and at most `max_batches` per shard. Returns the number of tasks archived.
+        """
+        cutoff = datetime.now(UTC) - older_than
+        archived = 0
+        for shard in range(self.uow.shard_count):
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                async with self.uow.on_shard(shard):
+                    moved = await self.uow.task_archive.archive_completed(cutoff, batch_size)
+                    await self.uow.commit()
+
+                if self.title_index is not None:
+                    for task_id, user_id in moved:
+                        self.title_index.remove(user_id, task_id)
+
+                archived += len(moved)
+                batches += 1
+                if len(moved) < batch_size:
+                    break
+
+        logger.info(f"Archived {archived} completed tasks older than {cutoff.isoformat()}")
+        return archived
@@ -1,39 +1,102 @@
 import logging
-from typing import List
+from typing import Any, Dict, List, Tuple
 
 from app.api.schemas.user import UserCreate, UserResponse
 from app.core.security import get_password_hash
-from app.exceptions import UserNotFoundError, UserAlreadyExistsError
+from app.exceptions import UserNotFoundError, UserAlreadyExistsError, DatabaseUnavailableError
+from app.utils.retry import retryable
 from app.utils.unitofwork import UnitOfWork
 
 logger = logging.getLogger("app")
 
 
-class UserService:
-    def __init__(self, uow: UnitOfWork):
-        self.uow = uow
+def user_row(user) -> Dict[str, Any]:
+    """The columns of a directory row, as replicated to other shards."""
+    return {column.key: getattr(user, column.key) for column in user.__table__.columns}
 
-    async def create_user(self, user: UserCreate) -> UserResponse:
-        async with self.uow:
-            if await self.uow.user.find_one(username=user.username):
+
+async def add_user(uow: UnitOfWork, user: UserCreate) -> Tuple[UserResponse, Dict[str, Any]]:
+    """Add a user to the directory on shard 0. Returns it along with its row for `replicate_user`."""
+    async def add() -> Tuple[UserResponse, Dict[str, Any]]:
+        async with uow:
+            if await uow.user.find_one(username=user.username):
                 raise UserAlreadyExistsError(user.username)
 
             user_dict = user.model_dump()
             hashed_password = get_password_hash(user_dict.pop("password"))
             user_dict["hashed_password"] = hashed_password
 
-            user_db = await self.uow.user.add(user_dict)
+            user_db = await uow.user.add(user_dict)
             user_response = UserResponse.model_validate(user_db)
-            await self.uow.commit()
+            row = user_row(user_db)
+            await uow.commit()
+            return user_response, row
+
+    return await uow.run_retryable(add)
+
+
+async def replicate_user(uow: UnitOfWork, row: Dict[str, Any]) -> bool:
+    """
+    Copy a user row from the directory on shard 0 to the shard holding the user's tasks and projects.
+    Idempotent and retried on transient errors. The directory row is already committed, so a copy that
+    still fails is logged and left for the user's next login or `app.scripts.reconcile_users` to make;
+    returns whether it was made.
+    """
+    user_id = row["id"]
+    if uow.shard_map.shard_for(user_id) == 0:
+        return True
+
+    async def replicate():
+        async with uow(user_id):
+            await uow.user.replicate(row)
+            await uow.commit()
+
+    try:
+        await uow.run_retryable(replicate)
+    except DatabaseUnavailableError:
+        logger.exception(f"Failed to replicate user {user_id} to its shard")
+        return False
+    return True
 
-            logger.info(f"Created user {user_db.id}")
-            return user_response
 
+async def remove_replica(uow: UnitOfWork, user_id: int) -> bool:
+    """
+    Delete a user's copy, and with it its tasks and projects, from the shard holding them.
+    Like `replicate_user`, a failure is logged and left for `app.scripts.reconcile_users`.
+    """
+    if uow.shard_map.shard_for(user_id) == 0:
+        return True
+
+    async def remove():
+        async with uow(user_id):
+            await uow.user.delete(id=user_id)
+            await uow.commit()
+
+    try:
+        await uow.run_retryable(remove)
+    except DatabaseUnavailableError:
+        logger.exception(f"Failed to remove user {user_id} from its shard")
+        return False
+    return True
+
+
+class UserService:
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+
+    async def create_user(self, user: UserCreate) -> UserResponse:
+        user_response, row = await add_user(self.uow, user)
+        await replicate_user(self.uow, row)
+        logger.info(f"Created user {user_response.id}")
+        return user_response
+
+    @retryable
     async def get_users(self, skip: int = 0, limit: int | None = None) -> List[UserResponse]:
         async with self.uow:
             users = await self.uow.user.find_all(skip, limit)
             return [UserResponse.model_validate(user) for user in users]
 
+    @retryable
     async def get_user_by_id(self, user_id: int) -> UserResponse:
         async with self.uow:
             user = await self.uow.user.find_one(id=user_id)
@@ -41,6 +104,7 @@ class UserService:
                 raise UserNotFoundError(user_id)
             return UserResponse.model_validate(user)
 
+    @retryable
     async def get_user_by_username(self, username: str) -> UserResponse:
         async with self.uow:
             user = await self.uow.user.find_one(username=username)
@@ -49,6 +113,12 @@ class UserService:
             return UserResponse.model_validate(user)
 
     async def delete_user(self, user_id: int) -> None:
+        await self._delete_from_directory(user_id)
+        await remove_replica(self.uow, user_id)
+        logger.info(f"Deleted user {user_id}")
+
+    @retryable
+    async def _delete_from_directory(self, user_id: int) -> None:
         async with self.uow:
             user = await self.uow.user.find_one(id=user_id)
             if not user:
@@ -58,4 +128,3 @@ class UserService:
             if not deleted:
                 raise UserNotFoundError(user_id)
             await self.uow.commit()
-            logger.info(f"Deleted user {user_id}")
@@ -0,0 +1,22 @@
+import time
+
+
+class TokenBucket:
+    """Allows bursts of up to `burst` calls, refilled at `rate` calls per second."""
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self, now: float | None = None) -> bool:
+        """Spend a token if one is available."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
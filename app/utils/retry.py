@@ -0,0 +1,80 @@
+import functools
+import random
+from typing import Any, Awaitable, Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# serialization_failure and deadlock_detected: the server has already rolled the transaction back
+ROLLED_BACK_SQLSTATES = frozenset({"40001", "40P01"})
+# Lost or refused connections, e.g. while a replica is promoted during failover
+CONNECTION_SQLSTATES = frozenset({"08000", "08001", "08003", "08004", "08006", "57P01", "57P02", "57P03"})
+
+
+def sqlstate(exc: BaseException | None) -> str | None:
+    return getattr(getattr(exc, "orig", None), "sqlstate", None)
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a database error is likely to go away if the transaction is simply run again."""
+    if not isinstance(exc, DBAPIError):
+        return False
+    return exc.connection_invalidated or sqlstate(exc) in ROLLED_BACK_SQLSTATES | CONNECTION_SQLSTATES
+
+
+class RetryBudget:
+    """
+    Process-wide token bucket limiting retries, as in gRPC retry throttling.
+    Every failed attempt withdraws a token and every success deposits `token_ratio`;
+    retries stop while the bucket is at most half full, so a database outage is not
+    multiplied by the number of attempts.
+    """
+    def __init__(self, max_tokens: float = 100.0, token_ratio: float = 0.1):
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self.tokens = max_tokens
+
+    def record_failure(self):
+        self.tokens = max(0.0, self.tokens - 1)
+
+    def record_success(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.token_ratio)
+
+    def can_retry(self) -> bool:
+        return self.tokens > self.max_tokens / 2
+
+
+class RetryPolicy:
+    """How often and how long to wait between attempts of a retryable unit of work."""
+    def __init__(
+            self,
+            attempts: int = settings.DB_RETRY_ATTEMPTS,
+            base_delay: float = settings.DB_RETRY_BASE_DELAY_MS / 1000,
+            max_delay: float = settings.DB_RETRY_MAX_DELAY_MS / 1000,
+            budget: RetryBudget | None = None
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+
+    def backoff(self, retry: int) -> float:
+        """Delay before retry number `retry` (1-based): exponential with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+default_retry_policy = RetryPolicy()
+
+
+def retryable(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Run a service method as a retryable unit of work on the service's `uow`.
+    The whole method is re-run, so it must open its own `async with self.uow` blocks.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args: Any, **kwargs: Any) -> T:
+        return await self.uow.run_retryable(functools.partial(method, self, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,140 @@
+import logging
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger("app")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def _word_keys(title: str) -> List[str]:
+    """Return one key per word start, so "milk" matches "Buy milk"."""
+    words = _normalize(title).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _typo_variants(query: str) -> List[str]:
+    """Single deletions and adjacent transpositions of the query."""
+    variants = []
+    for i in range(len(query)):
+        variants.append(query[:i] + query[i + 1:])
+    for i in range(len(query) - 1):
+        variants.append(query[:i] + query[i + 1] + query[i] + query[i + 2:])
+    return [v for v in dict.fromkeys(variants) if v and v != query]
+
+
+class _UserTitles:
+    __slots__ = ("titles", "keys", "loaded_at")
+
+    def __init__(self):
+        self.titles: Dict[int, str] = {}
+        self.keys: List[Tuple[str, int]] = []
+        self.loaded_at = time.monotonic()
+
+
+class TitleIndex:
+    """
+    Per-user in-memory prefix index over task titles.
+    Used for autocomplete on backends without trigram support. Lookups are
+    a binary search over sorted word keys, so their cost grows with the number
+    of matches returned rather than with the number of tasks a user owns.
+    Only this process's writes are applied; a user's index is rebuilt once it is
+    older than `max_age` seconds, which bounds how stale other writers leave it.
+    """
+    def __init__(self, max_users: int = 1024, max_age: float = 60.0):
+        self.max_users = max_users
+        self.max_age = max_age
+        self._users: "OrderedDict[int, _UserTitles]" = OrderedDict()
+
+    def _entry(self, user_id: int) -> _UserTitles | None:
+        entry = self._users.get(user_id)
+        if entry is not None and time.monotonic() - entry.loaded_at > self.max_age:
+            del self._users[user_id]
+            return None
+        return entry
+
+    def is_loaded(self, user_id: int) -> bool:
+        return self._entry(user_id) is not None
+
+    def load(self, user_id: int, rows: Iterable[Tuple[int, str]]):
+        """Build the index for a user from (task_id, title) rows."""
+        entry = _UserTitles()
+        for task_id, title in rows:
+            entry.titles[task_id] = title
+            entry.keys.extend((key, task_id) for key in _word_keys(title))
+        entry.keys.sort()
+
+        self._users[user_id] = entry
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        logger.debug("Title index loaded", extra={"user_id": user_id, "titles": len(entry.titles)})
+
+    def add(self, user_id: int, task_id: int, title: str):
+        """Index a new title. No-op for users whose index is not loaded."""
+        entry = self._entry(user_id)
+        if entry is None:
+            return
+        self._remove(entry, task_id)
+        entry.titles[task_id] = title
+        for key in _word_keys(title):
+            insort(entry.keys, (key, task_id))
+
+    def remove(self, user_id: int, task_id: int):
+        """Drop a title from the index. No-op for users whose index is not loaded."""
+        entry = self._entry(user_id)
+        if entry is not None:
+            self._remove(entry, task_id)
+
+    def invalidate(self, user_id: int):
+        """Forget a user's index; it is rebuilt on the next lookup."""
+        self._users.pop(user_id, None)
+
+    def search(self, user_id: int, query: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """
+        Return up to `limit` (task_id, title) pairs whose title has a word starting with `query`.
+        Falls back to one-edit variants of the query when nothing matches exactly.
+        """
+        entry = self._entry(user_id)
+        if entry is None:
+            return []
+        self._users.move_to_end(user_id)
+
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+
+        matches = self._scan(entry, prefix, limit, {})
+        if not matches and len(prefix) >= 3:
+            for variant in _typo_variants(prefix):
+                self._scan(entry, variant, limit, matches)
+                if len(matches) >= limit:
+                    break
+
+        return [(task_id, entry.titles[task_id]) for task_id in matches]
+
+    @staticmethod
+    def _scan(entry: _UserTitles, prefix: str, limit: int, matches: Dict[int, None]) -> Dict[int, None]:
+        keys = entry.keys
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and len(matches) < limit:
+            key, task_id = keys[i]
+            if not key.startswith(prefix):
+                break
+            matches.setdefault(task_id, None)
+            i += 1
+        return matches
+
+    @staticmethod
+    def _remove(entry: _UserTitles, task_id: int):
+        title = entry.titles.pop(task_id, None)
+        if title is None:
+            return
+        for key in _word_keys(title):
+            i = bisect_left(entry.keys, (key, task_id))
+            if i < len(entry.keys) and entry.keys[i] == (key, task_id):
+                del entry.keys[i]
@@ -1,11 +1,29 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Sequence, TypeVar
 
-from app.db.database import async_session_maker
-from app.repositories import TaskRepository, ProjectRepository, UserRepository
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.deadlines import remaining_time
+from app.db.database import async_session_maker, shard_session_makers, shard_map as default_shard_map
+from app.db.sharding import ShardMap
+from app.exceptions import DeadlineExceededError, DatabaseUnavailableError
+from app.repositories import TaskRepository, TaskArchiveRepository, ProjectRepository, UserRepository, OutboxRepository
+from app.utils.retry import ROLLED_BACK_SQLSTATES, RetryPolicy, default_retry_policy, is_transient, sqlstate
 
 logger = logging.getLogger("app")
 
+T = TypeVar("T")
+
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+def _is_statement_timeout(exc: BaseException | None) -> bool:
+    return isinstance(exc, DBAPIError) and sqlstate(exc) == QUERY_CANCELED_SQLSTATE
+
 
 class IUnitOfWork(ABC):
     @abstractmethod
@@ -25,28 +43,162 @@ class IUnitOfWork(ABC):
         ...
 
 
+class _ShardScope:
+    """What `async with` enters for UnitOfWork(user_id) and on_shard: the unit of work, opened on `shard`."""
+    __slots__ = ("uow", "shard")
+
+    def __init__(self, uow: "UnitOfWork", shard: int):
+        self.uow = uow
+        self.shard = shard
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return await self.uow._open(self.shard)
+
+    async def __aexit__(self, exc_type=None, exc=None, tb=None):
+        await self.uow.__aexit__(exc_type, exc, tb)
+
+
 class UnitOfWork(IUnitOfWork):
-    def __init__(self):
-        self.session_factory = async_session_maker
+    """
+    Wraps one session per `async with` block.
+    `async with uow` opens a session on shard 0, which holds the user directory;
+    `async with uow(user_id)` opens one on the shard holding that user's tasks and projects.
+    The shard is carried by the `async with` target rather than stored on the unit of work, and
+    only one block may be open at a time: concurrent tasks each need their own instance.
+    If the current request has a deadline, it is enforced as a transaction-local
+    `statement_timeout` on PostgreSQL and as asyncio cancellation on other backends.
+    Either way an overrun surfaces as DeadlineExceededError once the session is closed.
+    """
+    def __init__(
+            self,
+            session_factories: Sequence[async_sessionmaker] | None = None,
+            shard_map: ShardMap | None = None
+    ):
+        if session_factories is None:
+            session_factories = [async_session_maker, *shard_session_makers]
+        self.session_factories = list(session_factories)
+        self.shard_map = shard_map or default_shard_map
+        if self.shard_map.shard_count != len(self.session_factories):
+            raise ValueError("The shard map and the session factories disagree on the number of shards")
+        self.session = None
+        self.retry_policy: RetryPolicy = default_retry_policy
+        self._timeout = None
+        self._committing = False
+        self._committed = False
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.session_factories)
+
+    def __call__(self, user_id: int) -> _ShardScope:
+        """`async with` target opening the shard holding `user_id`'s data."""
+        return self.on_shard(self.shard_map.shard_for(user_id))
+
+    def on_shard(self, shard: int) -> _ShardScope:
+        """`async with` target opening shard `shard`."""
+        return _ShardScope(self, shard)
 
     async def __aenter__(self):
-        self.session = self.session_factory()
+        return await self._open(0)
+
+    async def _open(self, shard: int) -> "UnitOfWork":
+        if self.session is not None:
+            raise RuntimeError("UnitOfWork is already open; concurrent tasks need their own instance")
+        timeout = remaining_time()
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceededError()
+
+        self.session = self.session_factories[shard]()
         self.user = UserRepository(self.session)
         self.task = TaskRepository(self.session)
+        self.task_archive = TaskArchiveRepository(self.session)
         self.project = ProjectRepository(self.session)
+        self.outbox = OutboxRepository(self.session)
+
+        if timeout is not None:
+            if self.task.dialect_name == "postgresql":
+                event.listen(self.session.sync_session, "after_begin", self._set_statement_timeout)
+            else:
+                self._timeout = asyncio.timeout(timeout)
+                await self._timeout.__aenter__()
+
         logger.debug("UoW session started")
         return self
 
-    async def __aexit__(self, *args):
-        await self.rollback()
-        await self.session.close()
-        self.session = None
-        logger.debug("UoW session closed")
+    async def __aexit__(self, exc_type=None, exc=None, tb=None):
+        timed_out = False
+        if self._timeout is not None:
+            try:
+                await self._timeout.__aexit__(exc_type, exc, tb)
+            except TimeoutError:
+                timed_out = True
+            finally:
+                self._timeout = None
+
+        try:
+            await self.rollback()
+        finally:
+            await self.session.close()
+            self.session = None
+            logger.debug("UoW session closed")
+
+        if timed_out or _is_statement_timeout(exc):
+            raise DeadlineExceededError() from exc
 
     async def commit(self):
+        self._committing = True
         await self.session.commit()
+        self._committing = False
+        self._committed = True
         logger.debug("UoW committed")
 
+    async def run_retryable(self, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `work`, which opens its own `async with` blocks, re-running it on transient database errors
+        with jittered exponential backoff. A run is only repeated when nothing it did can have been
+        committed: no commit had started, or the failed commit was rolled back by the server.
+        Raises DatabaseUnavailableError once attempts, the retry budget or the request deadline run out.
+        """
+        policy = self.retry_policy
+        retry = 0
+        while True:
+            self._committing = self._committed = False
+            try:
+                result = await work()
+            except Exception as exc:
+                if not self._safe_to_retry(exc):
+                    raise
+                policy.budget.record_failure()
+
+                retry += 1
+                delay = policy.backoff(retry)
+                remaining = remaining_time()
+                if retry >= policy.attempts or not policy.budget.can_retry() or (
+                        remaining is not None and remaining <= delay):
+                    raise DatabaseUnavailableError() from exc
+
+                logger.warning(f"Retrying unit of work after transient database error ({retry}/{policy.attempts - 1})")
+                await asyncio.sleep(delay)
+            else:
+                policy.budget.record_success()
+                return result
+
+    def _safe_to_retry(self, exc: Exception) -> bool:
+        if not is_transient(exc) or self._committed:
+            return False
+        return not self._committing or sqlstate(exc) in ROLLED_BACK_SQLSTATES
+
     async def rollback(self):
         await self.session.rollback()
         logger.debug("UoW rolled back")
+
+    @staticmethod
+    def _set_statement_timeout(_session, _transaction, connection):
+        timeout = remaining_time()
+        if timeout is None:
+            return
+        timeout_ms = max(1, int(timeout * 1000))
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": str(timeout_ms)}
+        )
@@ -0,0 +1,94 @@
+"""
+Per-request overhead of the request logging middleware.
+
+Drives a minimal app through raw ASGI calls, so no server or network is involved, with no
+middleware, with the former `call_next` http middleware and with RequestLoggingMiddleware.
+Logging is left at WARNING so the log line itself is not measured.
+
+    python -m benchmarks.middleware_overhead [requests]
+"""
+import asyncio
+import sys
+import time
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+from app.core.middleware import RequestLoggingMiddleware, logger
+
+
+async def call_next_middleware(request: Request, call_next):
+    """The middleware this benchmark compares against, as it was before it became pure ASGI."""
+    start_time = time.time()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+    elapsed = time.time() - start_time
+    route = request.scope.get("route")
+    labels = (request.method, getattr(route, "path", None) or "unmatched", str(response.status_code))
+    HTTP_REQUESTS.labels(*labels).inc()
+    HTTP_REQUEST_DURATION.labels(*labels).observe(elapsed)
+    logger.info({
+        "method": request.method,
+        "path": request.url.path,
+        "status_code": response.status_code,
+        "process_time": f"{round(elapsed, 4)}s",
+        "client": request.client.host,
+    })
+    return response
+
+
+def make_app(middleware: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/tasks/{task_id}")
+    async def get_task(task_id: int):
+        return {"id": task_id, "title": "Benchmark"}
+
+    if middleware == "call_next":
+        app.add_middleware(BaseHTTPMiddleware, dispatch=call_next_middleware)
+    elif middleware == "asgi":
+        app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def run(app: FastAPI, requests: int) -> float:
+    """Mean nanoseconds per request."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(_message):
+        pass
+
+    def scope(task_id: int):
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": f"/tasks/{task_id}", "raw_path": f"/tasks/{task_id}".encode(),
+            "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80), "app": app,
+        }
+
+    for task_id in range(min(requests, 1_000)):
+        await app(scope(task_id), receive, send)
+    start = time.perf_counter_ns()
+    for task_id in range(requests):
+        await app(scope(task_id), receive, send)
+    return (time.perf_counter_ns() - start) / requests
+
+
+async def main(requests: int, rounds: int = 5):
+    """Variants run in turns, best round kept, so that warm-up and noise hit them alike."""
+    apps = {middleware: make_app(middleware) for middleware in ("none", "call_next", "asgi")}
+    best = {middleware: float("inf") for middleware in apps}
+    for _ in range(rounds):
+        for middleware, app in apps.items():
+            best[middleware] = min(best[middleware], await run(app, requests))
+    for middleware, mean in best.items():
+        print(f"{middleware:>10}: {mean / 1000:8.1f} us/request, overhead {(mean - best['none']) / 1000:6.1f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000))
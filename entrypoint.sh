@@ -3,6 +3,12 @@
 # Run migrations
 echo "Running migrations..."
 alembic upgrade head
+# Interleave the id sequences of the shards, if any; sequences already interleaved are left alone
+python -m app.scripts.reshard_user init-sequences
+
+# Workers share their metrics through this directory; snapshots of a previous run are stale
+export METRICS_DIR="${METRICS_DIR:-/tmp/metrics}"
+mkdir -p "$METRICS_DIR" && rm -f "$METRICS_DIR"/*.json
 
 # Start the FastAPI app with Gunicorn and Uvicorn workers
 echo "Starting FastAPI app with Gunicorn..."
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from fastapi import status
+
+from app.api.dependencies.dependencies import get_connection_manager
+from app.core.config import settings
+from app.main import app
+
+
+@pytest.fixture
+def event_stream_client(test_client, outbox_relay, monkeypatch):
+    # Streams end on their own quickly, so the whole response can be read
+    monkeypatch.setattr(settings, "SSE_STREAM_LIFETIME_S", 0.2)
+    app.dependency_overrides[get_connection_manager] = lambda: outbox_relay.manager
+    return test_client
+
+
+@pytest.mark.asyncio
+async def test_event_stream_requires_a_token(event_stream_client):
+    response = await event_stream_client.get("/events/stream")
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_event_stream_resumes_after_last_event_id(event_stream_client, auth_headers, outbox_relay):
+    for title in ("Seen", "Missed"):
+        await event_stream_client.post("/tasks/", json={"title": title}, headers=auth_headers)
+    assert await outbox_relay.relay() == 2
+    first_seq = 1
+
+    response = await event_stream_client.get(
+        "/events/stream", headers={**auth_headers, "Last-Event-ID": str(first_seq)}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = [frame for frame in response.text.split("\n\n") if frame]
+    assert len(frames) == 1
+    event_id, data = frames[0].split("\n")
+    assert event_id == f"id: {first_seq + 1}"
+    event = json.loads(data.removeprefix("data: "))
+    assert event["event"] == "task_created"
+    assert event["data"]["title"] == "Missed"
+
+
+@pytest.mark.asyncio
+async def test_event_stream_asks_to_resync_when_events_are_gone(event_stream_client, auth_headers):
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+
+    response = await event_stream_client.get(f"/events/stream?token={token}", headers={"Last-Event-ID": "42"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.text.strip().removeprefix("data: "))["event"] == "resync_required"
+
+
+@pytest.mark.asyncio
+async def test_event_stream_is_refused_beyond_capacity(event_stream_client, auth_headers, outbox_relay, monkeypatch):
+    monkeypatch.setattr(outbox_relay.manager, "max_connections", 0)
+
+    response = await event_stream_client.get("/events/stream", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,38 @@
+import pytest
+from fastapi import status
+
+from app.core.config import settings
+
+
+@pytest.fixture
+def metrics_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scraper-token")
+    return {"Authorization": "Bearer scraper-token"}
+
+
+@pytest.mark.asyncio
+async def test_metrics_label_requests_by_route_template(test_client, auth_headers, metrics_token):
+    created = await test_client.post("/tasks/", json={"title": "Measured"}, headers=auth_headers)
+    await test_client.get(f"/tasks/{created.json()['id']}", headers=auth_headers)
+
+    response = await test_client.get("/metrics", headers=metrics_token)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert any(line.startswith('http_requests_total{method="GET",route="/tasks/{task_id}",status="200"}') for line in lines)
+    assert not any("/tasks/" + str(created.json()["id"]) in line for line in lines)
+    assert any(line.startswith('http_request_duration_seconds_bucket{method="POST",route="/tasks/"') for line in lines)
+    assert "http_requests_in_flight 1" in lines
+    assert any(line.startswith("ws_connections ") for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_metrics_require_the_metrics_token(test_client, auth_headers, metrics_token):
+    assert (await test_client.get("/metrics")).status_code == status.HTTP_401_UNAUTHORIZED
+    assert (await test_client.get("/metrics", headers=auth_headers)).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_disabled_without_a_token(test_client):
+    assert (await test_client.get("/metrics")).status_code == status.HTTP_404_NOT_FOUND
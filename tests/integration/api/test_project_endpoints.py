@@ -156,3 +156,69 @@ async def test_delete_project(test_client, auth_headers, test_project):
         headers=auth_headers
     )
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_project_tasks_overdue(test_client, auth_headers, test_project, tasks_with_deadlines):
+    response = await test_client.get(
+        f"/projects/{test_project.id}/tasks?overdue=true",
+        headers=auth_headers
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [t["title"] for t in response.json()] == ["Overdue"]
+
+
+@pytest.mark.asyncio
+async def test_get_project_tasks_with_total(test_client, auth_headers, test_project_with_tasks):
+    response = await test_client.get(
+        f"/projects/{test_project_with_tasks.id}/tasks?limit=1&with_total=true",
+        headers=auth_headers
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 1
+    assert response.headers["X-Total-Count"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_get_project_conditional_get(test_client, auth_headers, test_project):
+    first = await test_client.get(f"/projects/{test_project.id}", headers=auth_headers)
+    etag = first.headers["ETag"]
+
+    cached = await test_client.get(f"/projects/{test_project.id}", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+
+    await test_client.put(f"/projects/{test_project.id}", json={"name": "Renamed"}, headers=auth_headers)
+
+    changed = await test_client.get(f"/projects/{test_project.id}", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_get_project_tasks_conditional_get(test_client, auth_headers, test_project_with_tasks):
+    url = f"/projects/{test_project_with_tasks.id}/tasks"
+    first = await test_client.get(url, headers=auth_headers)
+
+    cached = await test_client.get(url, headers={**auth_headers, "If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+
+    await test_client.post(
+        "/tasks/",
+        json={"title": "One more", "project_id": test_project_with_tasks.id},
+        headers=auth_headers
+    )
+
+    changed = await test_client.get(url, headers={**auth_headers, "If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == status.HTTP_200_OK
+    assert len(changed.json()) == 4
+
+
+@pytest.mark.asyncio
+async def test_update_project_if_match_stale(test_client, auth_headers, test_project):
+    response = await test_client.put(
+        f"/projects/{test_project.id}",
+        json={"name": "Renamed"},
+        headers={**auth_headers, "If-Match": '"7"'}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
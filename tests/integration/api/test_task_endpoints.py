@@ -1,6 +1,14 @@
+from datetime import timedelta
+from unittest.mock import AsyncMock, call, patch
+
 import pytest
 from fastapi import status
 
+from app.api.dependencies.dependencies import get_task_service
+from app.core.config import settings
+from app.exceptions import DeadlineExceededError, DatabaseUnavailableError
+from app.main import app
+
 
 @pytest.mark.asyncio
 async def test_create_task_success(test_client, auth_headers, test_project):
@@ -88,6 +96,22 @@ async def test_get_tasks_pagination(test_client, auth_headers, multiple_test_tas
     assert len(response.json()) == 5
 
 
+@pytest.mark.asyncio
+async def test_autocomplete_tasks(test_client, auth_headers, test_tasks):
+    await test_client.post("/tasks/", json={"title": "Buy milk"}, headers=auth_headers)
+
+    response = await test_client.get("/tasks/autocomplete?q=mil", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [s["title"] for s in response.json()] == ["Buy milk"]
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_tasks_requires_query(test_client, auth_headers):
+    response = await test_client.get("/tasks/autocomplete", headers=auth_headers)
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_task(test_client, auth_headers, test_task):
     response = await test_client.get(
@@ -161,3 +185,185 @@ async def test_delete_task(test_client, auth_headers, test_task):
         headers=auth_headers
     )
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_overdue(test_client, auth_headers, tasks_with_deadlines):
+    response = await test_client.get("/tasks/?overdue=true", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [t["title"] for t in response.json()] == ["Overdue"]
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_due_before(test_client, auth_headers, tasks_with_deadlines):
+    due_before = tasks_with_deadlines[3].deadline.isoformat()
+    response = await test_client.get(
+        "/tasks/",
+        params={"due_before": due_before, "completed": "false"},
+        headers=auth_headers
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [t["title"] for t in response.json()] == ["Overdue", "Due soon"]
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_with_total(test_client, auth_headers, multiple_test_tasks):
+    response = await test_client.get("/tasks/?limit=3&with_total=true", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 3
+    assert response.headers["X-Total-Count"] == str(len(multiple_test_tasks))
+    assert response.headers["X-Total-Count-Estimated"] == "false"
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_total_is_opt_in(test_client, auth_headers, test_tasks):
+    response = await test_client.get("/tasks/", headers=auth_headers)
+    assert "X-Total-Count" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_request_timeout_header_lowers_route_deadline(test_client, auth_headers):
+    with patch("app.api.dependencies.dependencies.set_deadline") as mock_set_deadline:
+        await test_client.get("/tasks/", headers={**auth_headers, "X-Request-Timeout": "250"})
+        assert mock_set_deadline.call_args_list[-1] == call(0.25)
+
+        await test_client.get("/tasks/", headers={**auth_headers, "X-Request-Timeout": "600000"})
+        assert mock_set_deadline.call_args_list[-1] == call(settings.LIST_REQUEST_TIMEOUT_MS / 1000)
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded_returns_504(test_client, auth_headers):
+    slow_service = AsyncMock()
+    slow_service.get_tasks.side_effect = DeadlineExceededError()
+    app.dependency_overrides[get_task_service] = lambda: slow_service
+
+    response = await test_client.get("/tasks/", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_conditional_get(test_client, auth_headers, test_tasks):
+    first = await test_client.get("/tasks/", headers=auth_headers)
+    etag = first.headers["ETag"]
+
+    cached = await test_client.get("/tasks/", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.content == b""
+
+    await test_client.post("/tasks/", json={"title": "Another"}, headers=auth_headers)
+
+    changed = await test_client.get("/tasks/", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_etag_depends_on_query(test_client, auth_headers, test_tasks):
+    first = await test_client.get("/tasks/?limit=1", headers=auth_headers)
+    second = await test_client.get("/tasks/?limit=2", headers=auth_headers)
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+
+@pytest.mark.asyncio
+async def test_get_task_conditional_get(test_client, auth_headers, test_task):
+    first = await test_client.get(f"/tasks/{test_task.id}", headers=auth_headers)
+    etag = first.headers["ETag"]
+
+    cached = await test_client.get(f"/tasks/{test_task.id}", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+
+    await test_client.put(f"/tasks/{test_task.id}", json={"is_completed": True}, headers=auth_headers)
+
+    changed = await test_client.get(f"/tasks/{test_task.id}", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_update_task_if_match(test_client, auth_headers, test_task):
+    etag = (await test_client.get(f"/tasks/{test_task.id}", headers=auth_headers)).headers["ETag"]
+
+    first = await test_client.put(
+        f"/tasks/{test_task.id}", json={"title": "Phone"}, headers={**auth_headers, "If-Match": etag}
+    )
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["ETag"] != etag
+
+    stale = await test_client.put(
+        f"/tasks/{test_task.id}", json={"title": "Laptop"}, headers={**auth_headers, "If-Match": etag}
+    )
+    assert stale.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+@pytest.mark.asyncio
+async def test_delete_task_if_match_stale(test_client, auth_headers, test_task):
+    await test_client.put(f"/tasks/{test_task.id}", json={"title": "Edited"}, headers=auth_headers)
+
+    response = await test_client.delete(f"/tasks/{test_task.id}", headers={**auth_headers, "If-Match": '"1"'})
+
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_include_archived_and_restore(test_client, auth_headers, task_service, old_completed_tasks):
+    await task_service.archive_completed_tasks(timedelta(days=settings.TASK_ARCHIVE_AFTER_DAYS))
+    archived_id = old_completed_tasks[0].id
+
+    hot = await test_client.get("/tasks/", headers=auth_headers)
+    assert archived_id not in [t["id"] for t in hot.json()]
+
+    everything = await test_client.get("/tasks/?include_archived=true", headers=auth_headers)
+    assert {t["id"]: t["is_archived"] for t in everything.json()}[archived_id] is True
+
+    response = await test_client.post(f"/tasks/{archived_id}/restore", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["is_archived"] is False
+
+    hot = await test_client.get("/tasks/", headers=auth_headers)
+    assert archived_id in [t["id"] for t in hot.json()]
+
+
+@pytest.mark.asyncio
+async def test_restore_missing_task(test_client, auth_headers):
+    response = await test_client.post("/tasks/9999/restore", headers=auth_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_database_unavailable_returns_503(test_client, auth_headers):
+    failing_service = AsyncMock()
+    failing_service.get_tasks.side_effect = DatabaseUnavailableError()
+    app.dependency_overrides[get_task_service] = lambda: failing_service
+
+    response = await test_client.get("/tasks/", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_task_events_reach_only_the_owner(test_client, auth_headers, test_user, outbox_relay):
+    manager = outbox_relay.manager
+    owner_socket, other_socket = AsyncMock(), AsyncMock()
+    manager.register(owner_socket, test_user.id)
+    manager.register(other_socket, test_user.id + 1)
+
+    response = await test_client.post("/tasks/", json={"title": "Private"}, headers=auth_headers)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert await outbox_relay.relay() == 1
+    await manager.flush(timeout=1)
+    owner_socket.send_text.assert_awaited_once()
+    other_socket.send_text.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_estimated_total_below_threshold(test_client, auth_headers, multiple_test_tasks):
+    response = await test_client.get("/tasks/?limit=3&with_total=true&estimate_total=true", headers=auth_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Total-Count"] == str(len(multiple_test_tasks))
+    assert response.headers["X-Total-Count-Estimated"] == "false"
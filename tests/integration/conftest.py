@@ -6,10 +6,14 @@ from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 from app.main import app
-from app.api.dependencies.dependencies import get_uow
+from app.api.dependencies.dependencies import get_uow, get_title_index, get_outbox_relay
+from app.core.events import OutboxRelay
 from app.core.security import get_password_hash
+from app.core.websockets import ConnectionManager
 from app.db.models import Base
+from app.db.sharding import ModuloShardMap
 from app.services import AuthService, UserService, TaskService, ProjectService
+from app.utils.title_index import TitleIndex
 from app.utils.unitofwork import UnitOfWork
 
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -34,8 +38,7 @@ async def uow_test():
         await conn.run_sync(Base.metadata.create_all)
     async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
-    uow = UnitOfWork()
-    uow.session_factory = async_session_maker
+    uow = UnitOfWork([async_session_maker], ModuloShardMap(1))
 
     return uow
 
@@ -56,10 +59,29 @@ async def task_service(uow_test):
 async def project_service(uow_test):
     return ProjectService(uow_test)
 
+@pytest.fixture
+def title_index():
+    return TitleIndex()
+
+@pytest.fixture
+async def indexed_task_service(uow_test, title_index):
+    return TaskService(uow_test, title_index)
+
+# Outbox relay that only runs when a test calls relay()
+@pytest.fixture
+async def outbox_relay(uow_test):
+    relay = OutboxRelay(ConnectionManager(), lambda: UnitOfWork(uow_test.session_factories, uow_test.shard_map))
+    yield relay
+    await relay.manager.close()
+
 # Test client for endpoints
 @pytest.fixture
-async def test_client(uow_test):
-    app.dependency_overrides = {get_uow: lambda: uow_test}
+async def test_client(uow_test, title_index, outbox_relay):
+    app.dependency_overrides = {
+        get_uow: lambda: uow_test,
+        get_title_index: lambda: title_index,
+        get_outbox_relay: lambda: outbox_relay
+    }
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
         yield client
 
@@ -225,3 +247,55 @@ async def multiple_test_tasks(uow_test, test_user):
             await uow_test.commit()
             tasks.append(task)
     return tasks
+
+@pytest.fixture
+async def tasks_with_deadlines(uow_test, test_user, test_project):
+    now = datetime.now(UTC)
+    task_specs = [
+        {"title": "Overdue", "deadline": now - timedelta(days=2), "is_completed": False},
+        {"title": "Done late", "deadline": now - timedelta(days=1), "is_completed": True},
+        {"title": "Due soon", "deadline": now + timedelta(days=3), "is_completed": False},
+        {"title": "Due later", "deadline": now + timedelta(days=30), "is_completed": False},
+        {"title": "No deadline", "deadline": None, "is_completed": False},
+    ]
+
+    tasks = []
+    for spec in task_specs:
+        async with uow_test:
+            task = await uow_test.task.add({"user_id": test_user.id, "project_id": test_project.id, **spec})
+            await uow_test.commit()
+            tasks.append(task)
+    return tasks
+
+@pytest.fixture
+async def old_completed_tasks(uow_test, test_user):
+    long_ago = datetime.now(UTC) - timedelta(days=200)
+    task_specs = [
+        {"title": "Old done A", "is_completed": True, "created_at": long_ago},
+        {"title": "Old done B", "is_completed": True, "created_at": long_ago},
+        {"title": "Old open", "is_completed": False, "created_at": long_ago},
+        {"title": "Recent done", "is_completed": True},
+    ]
+
+    tasks = []
+    for spec in task_specs:
+        async with uow_test:
+            task = await uow_test.task.add({"user_id": test_user.id, **spec})
+            await uow_test.commit()
+            tasks.append(task)
+    return tasks
+
+# Two SQLite files standing in for two database shards
+@pytest.fixture
+async def shard_session_makers(tmp_path):
+    makers = []
+    for shard in range(2):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'shard{shard}.db'}", echo=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        makers.append(async_sessionmaker(engine, expire_on_commit=False))
+    return makers
+
+@pytest.fixture
+def sharded_uow(shard_session_makers):
+    return UnitOfWork(shard_session_makers, ModuloShardMap(2))
@@ -0,0 +1,52 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.repositories.outbox_repository import CLAIM_LOCK_SPACE, OutboxRepository
+
+
+@pytest.mark.asyncio
+async def test_claim_pending_returns_oldest_undelivered_events(db_session):
+    repo = OutboxRepository(db_session)
+    for n in range(3):
+        await repo.record("task_created", user_id=n % 2 + 1, payload=f'{{"n": {n}}}')
+    await db_session.flush()
+    first, *_ = await repo.claim_pending(10)
+    await repo.mark_delivered([first.id])
+
+    events = await repo.claim_pending(10)
+
+    assert [event.payload for event in events] == ['{"n": 1}', '{"n": 2}']
+
+
+@pytest.mark.asyncio
+async def test_claim_pending_locks_users_on_postgres():
+    session = MagicMock()
+    session.bind.dialect.name = "postgresql"
+    locked = MagicMock()
+    locked.scalars.return_value.all.return_value = [7]
+    session.execute = AsyncMock(side_effect=[locked, MagicMock()])
+
+    await OutboxRepository(session).claim_pending(50)
+
+    lock, claim = (
+        str(call.args[0].compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        for call in session.execute.await_args_list
+    )
+    assert f"pg_try_advisory_xact_lock({CLAIM_LOCK_SPACE}, anon_1.user_id)" in lock
+    assert "GROUP BY outbox.user_id" in lock
+    assert "outbox.user_id IN (7)" in claim
+    assert "FOR UPDATE" not in claim
+
+
+@pytest.mark.asyncio
+async def test_claim_pending_skips_query_when_every_user_is_claimed_elsewhere():
+    session = MagicMock()
+    session.bind.dialect.name = "postgresql"
+    locked = MagicMock()
+    locked.scalars.return_value.all.return_value = []
+    session.execute = AsyncMock(return_value=locked)
+
+    assert await OutboxRepository(session).claim_pending(50) == []
+    session.execute.assert_awaited_once()
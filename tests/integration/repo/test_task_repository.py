@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, UTC
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from sqlalchemy.exc import IntegrityError
@@ -37,7 +38,7 @@ async def test_add_and_find_task(db_session):
     assert task.title == "Task 1"
     assert task.user_id == user.id
 
-    found = await task_repo.find_one(id=task.id)
+    found = await task_repo.find_one(id=task.id, user_id=user.id)
     assert found is not None
     assert found.title == "Task 1"
 
@@ -61,7 +62,8 @@ async def test_update_task_status_and_priority(db_session):
 
     updated = await task_repo.update(
         {"is_completed": True, "priority": PriorityLevel.high},
-        id=task.id
+        id=task.id,
+        user_id=user.id
     )
 
     assert updated is not None
@@ -84,10 +86,10 @@ async def test_delete_task(db_session):
         "user_id": user.id
     })
 
-    deleted = await task_repo.delete(id=task.id)
+    deleted = await task_repo.delete(id=task.id, user_id=user.id)
     assert deleted is True
 
-    should_be_none = await task_repo.find_one(id=task.id)
+    should_be_none = await task_repo.find_one(id=task.id, user_id=user.id)
     assert should_be_none is None
 
 
@@ -129,7 +131,7 @@ async def test_add_task_without_user_fails(db_session):
 async def test_update_nonexistent_task_returns_none(db_session):
     task_repo = TaskRepository(db_session)
 
-    result = await task_repo.update({"title": "Won't Work"}, id=99999)
+    result = await task_repo.update({"title": "Won't Work"}, id=99999, user_id=1)
     assert result is None
 
 
@@ -137,5 +139,149 @@ async def test_update_nonexistent_task_returns_none(db_session):
 async def test_delete_nonexistent_task_returns_false(db_session):
     task_repo = TaskRepository(db_session)
 
-    result = await task_repo.delete(id=98765)
+    result = await task_repo.delete(id=98765, user_id=1)
     assert result is False
+
+
+@pytest.mark.asyncio
+async def test_find_all_by_deadline_window(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "deadliner", "hashed_password": "pass"})
+    now = datetime.now(UTC)
+    await task_repo.add({"title": "Past", "deadline": now - timedelta(days=1), "user_id": user.id})
+    await task_repo.add({"title": "Soon", "deadline": now + timedelta(days=1), "user_id": user.id})
+    await task_repo.add({"title": "Later", "deadline": now + timedelta(days=10), "user_id": user.id})
+
+    criteria = task_repo.deadline_criteria(due_after=now, due_before=now + timedelta(days=7))
+    tasks = await task_repo.find_all(where=criteria, user_id=user.id)
+
+    assert [t.title for t in tasks] == ["Soon"]
+
+
+@pytest.mark.asyncio
+async def test_find_all_overdue_excludes_completed(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "latecomer", "hashed_password": "pass"})
+    now = datetime.now(UTC)
+    await task_repo.add({"title": "Late", "deadline": now - timedelta(days=1), "user_id": user.id})
+    await task_repo.add({
+        "title": "Late but done", "deadline": now - timedelta(days=1), "is_completed": True, "user_id": user.id
+    })
+
+    tasks = await task_repo.find_all(where=task_repo.deadline_criteria(overdue=True), user_id=user.id)
+
+    assert [t.title for t in tasks] == ["Late"]
+
+
+@pytest.mark.asyncio
+async def test_find_page_returns_window_total(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "pager", "hashed_password": "pass"})
+    for i in range(5):
+        await task_repo.add({"title": f"Task {i}", "user_id": user.id})
+
+    tasks, total, estimated = await task_repo.find_page(skip=2, limit=2, order_by={"title": "asc"}, user_id=user.id)
+
+    assert [t.title for t in tasks] == ["Task 2", "Task 3"]
+    assert total == 5
+    assert estimated is False
+
+
+@pytest.mark.asyncio
+async def test_find_page_only_plans_when_an_estimate_is_accepted():
+    session = MagicMock()
+    session.bind.dialect.name = "postgresql"
+    session.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    task_repo = TaskRepository(session)
+
+    with patch.object(TaskRepository, "estimate_count", AsyncMock(return_value=50_000)) as estimate_count:
+        assert await task_repo.find_page(limit=10, user_id=1) == ([], 0, False)
+        estimate_count.assert_not_awaited()
+
+        _, total, estimated = await task_repo.find_page(limit=10, estimate_threshold=10_000, user_id=1)
+        assert (total, estimated) == (50_000, True)
+
+
+@pytest.mark.asyncio
+async def test_find_page_past_last_page_still_counts(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "overpager", "hashed_password": "pass"})
+    for i in range(3):
+        await task_repo.add({"title": f"Task {i}", "user_id": user.id})
+
+    tasks, total, _ = await task_repo.find_page(skip=10, limit=5, user_id=user.id)
+
+    assert tasks == []
+    assert total == 3
+
+
+@pytest.mark.asyncio
+async def test_update_versioned_bumps_version(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "versioner", "hashed_password": "pass"})
+    task = await task_repo.add({"title": "Versioned", "user_id": user.id})
+    assert task.version == 1
+
+    updated = await task_repo.update_versioned({"title": "Renamed"}, 1, id=task.id, user_id=user.id)
+
+    assert updated.title == "Renamed"
+    assert updated.version == 2
+
+
+@pytest.mark.asyncio
+async def test_update_versioned_rejects_stale_version(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "staleuser", "hashed_password": "pass"})
+    task = await task_repo.add({"title": "Original", "user_id": user.id})
+    await task_repo.update_versioned({"title": "First writer"}, 1, id=task.id, user_id=user.id)
+
+    result = await task_repo.update_versioned({"title": "Second writer"}, 1, id=task.id, user_id=user.id)
+
+    assert result is None
+    assert (await task_repo.find_one(id=task.id, user_id=user.id)).title == "First writer"
+
+
+@pytest.mark.asyncio
+async def test_update_versioned_without_version_always_applies(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "lastwriter", "hashed_password": "pass"})
+    task = await task_repo.add({"title": "Original", "user_id": user.id})
+    await task_repo.update_versioned({"title": "First writer"}, 1, id=task.id, user_id=user.id)
+
+    result = await task_repo.update_versioned({"title": "Second writer"}, None, id=task.id, user_id=user.id)
+
+    assert result.title == "Second writer"
+    assert result.version == 3
+
+
+@pytest.mark.asyncio
+async def test_queries_require_partition_key(db_session):
+    user_repo = UserRepository(db_session)
+    task_repo = TaskRepository(db_session)
+
+    user = await user_repo.add({"username": "unscoped", "hashed_password": "pass"})
+    task = await task_repo.add({"title": "Scoped", "user_id": user.id})
+
+    with pytest.raises(ValueError):
+        await task_repo.find_one(id=task.id)
+    with pytest.raises(ValueError):
+        await task_repo.find_all()
+    with pytest.raises(ValueError):
+        await task_repo.delete(id=task.id)
+
+    assert await task_repo.find_owner_id(task.id) == user.id
+    assert await task_repo.find_owner_id(task.id + 1) is None
@@ -0,0 +1,116 @@
+import json
+from datetime import datetime, timedelta, UTC
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.api.schemas.project import ProjectCreate
+from app.api.schemas.task import TaskCreate
+from app.core.events import OutboxRelay
+from app.core.websockets import ConnectionManager
+from app.services import ProjectService, TaskService
+from app.utils.unitofwork import UnitOfWork
+
+
+@pytest.fixture
+def manager():
+    manager = MagicMock(spec=ConnectionManager)
+    manager.send_personal_message = AsyncMock()
+    return manager
+
+
+@pytest.fixture
+def relay(uow_test, manager):
+    return OutboxRelay(manager, lambda: UnitOfWork(uow_test.session_factories, uow_test.shard_map), batch_size=2)
+
+
+async def pending_payloads(uow: UnitOfWork):
+    async with uow:
+        return [json.loads(event.payload) for event in await uow.outbox.claim_pending(100)]
+
+
+@pytest.mark.asyncio
+async def test_relay_delivers_committed_events_once_in_order(uow_test, test_user, relay, manager):
+    project = await ProjectService(uow_test).create_project(test_user.id, ProjectCreate(name="Outbox"))
+    for n in range(3):
+        await TaskService(uow_test).create_task(test_user.id, TaskCreate(title=f"Task {n}", project_id=project.id))
+
+    assert await relay.relay() == 4
+    assert await relay.relay() == 0
+
+    sent = [call.args for call in manager.send_personal_message.await_args_list]
+    assert [message["event"] for message, _ in sent] == ["project_created"] + ["task_created"] * 3
+    assert [message["data"]["title"] for message, _ in sent[1:]] == ["Task 0", "Task 1", "Task 2"]
+    assert all(user_id == test_user.id for _, user_id in sent)
+    assert manager.send_personal_message.await_args_list[1].kwargs == {"project_id": project.id}
+    assert await pending_payloads(uow_test) == []
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_leaves_events_pending(uow_test, test_user, relay, manager):
+    await TaskService(uow_test).create_task(test_user.id, TaskCreate(title="Retry me"))
+    manager.send_personal_message.side_effect = [RuntimeError("backplane down"), None]
+
+    with pytest.raises(RuntimeError):
+        await relay.relay()
+    assert len(await pending_payloads(uow_test)) == 1
+
+    assert await relay.relay() == 1
+    assert await pending_payloads(uow_test) == []
+
+
+@pytest.mark.asyncio
+async def test_compact_removes_only_old_delivered_events(uow_test, test_user, relay):
+    async with uow_test:
+        await uow_test.outbox.record("task_created", test_user.id, json.dumps({"id": 1}))
+        await uow_test.commit()
+    await relay.relay()
+    async with uow_test:
+        await uow_test.outbox.record("task_created", test_user.id, json.dumps({"id": 2}))
+        await uow_test.commit()
+
+    assert await relay.compact(datetime.now(UTC) - timedelta(hours=1)) == 0
+    assert await relay.compact(datetime.now(UTC) + timedelta(hours=1)) == 1
+    assert await pending_payloads(uow_test) == [{"id": 2}]
+
+
+@pytest.mark.asyncio
+async def test_event_looks_up_one_of_the_users_events(uow_test, test_user, relay, manager):
+    task = await TaskService(uow_test).create_task(test_user.id, TaskCreate(title="Large"))
+    await relay.relay()
+    seq = manager.send_personal_message.await_args.args[0]["seq"]
+
+    assert manager.fetch_event == relay.event
+    assert (await relay.event(test_user.id, seq))["data"]["id"] == task.id
+    assert await relay.event(test_user.id + 1, seq) is None
+
+
+@pytest.mark.asyncio
+async def test_missed_events_since_last_seq(uow_test, test_user, other_user, relay):
+    service = TaskService(uow_test)
+    await service.create_task(test_user.id, TaskCreate(title="Seen"))
+    await TaskService(uow_test).create_task(other_user.id, TaskCreate(title="Someone else's"))
+    await service.create_task(test_user.id, TaskCreate(title="Missed"))
+    await relay.relay()
+    async with uow_test:
+        (seen,) = await uow_test.outbox.since(test_user.id, 0, 1)
+        last_seq = seen.id
+
+    missed = await relay.missed_events(test_user.id, last_seq)
+
+    assert [(message["event"], message["data"]["title"]) for message in missed] == [("task_created", "Missed")]
+    assert missed[0]["seq"] > last_seq
+
+
+@pytest.mark.asyncio
+async def test_missed_events_requires_resync_when_gap_is_too_big(uow_test, test_user, relay):
+    for n in range(3):
+        await TaskService(uow_test).create_task(test_user.id, TaskCreate(title=f"Task {n}"))
+    async with uow_test:
+        first = (await uow_test.outbox.since(test_user.id, 0, 1))[0].id
+
+    assert len(await relay.missed_events(test_user.id, first, limit=2)) == 2
+    assert await relay.missed_events(test_user.id, first, limit=1) is None
+    # The last event seen was compacted away, or belongs to another user
+    assert await relay.missed_events(test_user.id, 0) is None
+    assert await relay.missed_events(test_user.id + 1, first) is None
@@ -2,7 +2,7 @@ import pytest
 
 from app.api.schemas.project import ProjectCreate, ProjectUpdate
 from app.api.schemas.task import PriorityLevel
-from app.exceptions import ProjectNotFoundError, PermissionDeniedError
+from app.exceptions import ProjectNotFoundError, PermissionDeniedError, ProjectVersionConflictError
 
 
 @pytest.mark.asyncio
@@ -158,3 +158,30 @@ async def test_delete_project_unauthorized(project_service, other_user, test_pro
     # Test permission check
     with pytest.raises(PermissionDeniedError):
         await project_service.delete_project(other_user.id, test_project.id)
+
+
+@pytest.mark.asyncio
+async def test_get_project_tasks_overdue(project_service, test_user, test_project, tasks_with_deadlines):
+    tasks = await project_service.get_project_tasks(test_user.id, test_project.id, overdue=True)
+    assert [t.title for t in tasks] == ["Overdue"]
+
+
+@pytest.mark.asyncio
+async def test_get_projects_page(project_service, test_user, multiple_test_projects):
+    page = await project_service.get_projects_page(test_user.id, skip=0, limit=3)
+
+    assert len(page.items) == 3
+    assert page.total == len(multiple_test_projects)
+
+
+@pytest.mark.asyncio
+async def test_update_project_stale_version_conflict(project_service, test_user, test_project):
+    updated = await project_service.update_project(
+        test_user.id, test_project.id, ProjectUpdate(name="First"), expected_version=1
+    )
+    assert updated.version == 2
+
+    with pytest.raises(ProjectVersionConflictError):
+        await project_service.update_project(
+            test_user.id, test_project.id, ProjectUpdate(name="Second"), expected_version=1
+        )
@@ -0,0 +1,89 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.api.rpc import METHODS, RPC_VERSION, RpcContext, RpcRunner, handle_rpc
+
+
+def call(method: str, request_id: int = 1, **params):
+    return {"v": RPC_VERSION, "id": request_id, "method": method, "params": params}
+
+
+@pytest.mark.asyncio
+async def test_rpc_dispatches_to_services_as_the_connected_user(task_service, project_service, test_user, other_user):
+    ctx = RpcContext(test_user.id, task_service, project_service)
+
+    created = await handle_rpc(ctx, call("tasks.create", 1, task={"title": "Over the socket"}))
+    assert created["id"] == 1
+    assert created["result"]["title"] == "Over the socket"
+    assert created["result"]["user_id"] == test_user.id
+
+    task_id = created["result"]["id"]
+    updated = await handle_rpc(ctx, call("tasks.update", 2, task_id=task_id, changes={"is_completed": True}))
+    assert updated["result"]["is_completed"] is True
+
+    listed = await handle_rpc(ctx, call("tasks.list", 3))
+    assert [task["id"] for task in listed["result"]] == [task_id]
+
+    # Another user's connection cannot reach the task
+    other_ctx = RpcContext(other_user.id, task_service, project_service)
+    response = await handle_rpc(other_ctx, call("tasks.get", 4, task_id=task_id))
+    assert response["error"]["code"] == 403
+
+
+@pytest.mark.asyncio
+async def test_rpc_errors_mirror_http_statuses(task_service, project_service, test_user):
+    ctx = RpcContext(test_user.id, task_service, project_service)
+    task = (await handle_rpc(ctx, call("tasks.create", task={"title": "Versioned"})))["result"]
+
+    stale = await handle_rpc(ctx, call(
+        "tasks.update", task_id=task["id"], changes={"title": "Stale"}, expected_version=task["version"] + 1
+    ))
+    assert stale["error"]["code"] == 412
+
+    assert (await handle_rpc(ctx, call("tasks.get", task_id="abc")))["error"]["code"] == 422
+    assert (await handle_rpc(ctx, call("tasks.get", unexpected=1)))["error"]["code"] == 422
+    assert (await handle_rpc(ctx, call("tasks.drop")))["error"]["code"] == 404
+    assert (await handle_rpc(ctx, {**call("tasks.list"), "v": 99}))["error"]["code"] == 400
+
+
+@pytest.mark.asyncio
+async def test_runner_runs_calls_concurrently_up_to_its_limit():
+    release = asyncio.Event()
+    replies = []
+
+    async def slow(ctx):
+        await release.wait()
+        return "done"
+
+    with patch.dict(METHODS, {"test.slow": slow}):
+        runner = RpcRunner(lambda: None, replies.append, limit=2)
+        runner.submit(call("test.slow", 1))
+        runner.submit(call("test.slow", 2))
+        runner.submit(call("test.slow", 3))
+        await asyncio.sleep(0)
+
+        assert runner.in_flight == 2
+        assert replies == [{"v": RPC_VERSION, "id": 3, "error": {"code": 429, "message": "Too many calls in progress"}}]
+
+        release.set()
+        await asyncio.sleep(0.01)
+
+    assert [(reply["id"], reply.get("result")) for reply in replies[1:]] == [(1, "done"), (2, "done")]
+    assert runner.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_runner_close_cancels_running_calls():
+    async def stuck(ctx):
+        await asyncio.Event().wait()
+
+    with patch.dict(METHODS, {"test.stuck": stuck}):
+        runner = RpcRunner(lambda: None, MagicMock(), limit=2)
+        runner.submit(call("test.stuck"))
+        await asyncio.sleep(0)
+        await runner.close()
+
+    assert runner.in_flight == 0
+    runner.reply.assert_not_called()
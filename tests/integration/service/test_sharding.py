@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.api.schemas.project import ProjectCreate
+from app.api.schemas.task import TaskCreate
+from app.api.schemas.user import UserCreate, UserLogin
+from app.db.models import Task, User
+from app.db.sharding import ModuloShardMap
+from app.exceptions import DatabaseUnavailableError
+from app.repositories.user_repository import UserRepository
+from app.scripts.reconcile_users import reconcile_users
+from app.scripts.reshard_user import copy_user, purge_user
+from app.services import AuthService, TaskService, ProjectService
+from app.utils.unitofwork import UnitOfWork
+
+
+async def _task_titles(session_maker, user_id):
+    async with session_maker() as session:
+        result = await session.execute(select(Task.title).where(Task.user_id == user_id))
+        return sorted(result.scalars())
+
+
+@pytest.fixture
+async def sharded_users(sharded_uow):
+    auth_service = AuthService(sharded_uow)
+    # Ids 1 and 2, routed to shards 1 and 0 by the modulo map
+    return [
+        await auth_service.register(UserCreate(username=name, password="password"))
+        for name in ("odd_user", "even_user")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_data_lands_on_owner_shard(sharded_uow, shard_session_makers, sharded_users):
+    odd, even = sharded_users
+    task_service = TaskService(sharded_uow)
+    project_service = ProjectService(sharded_uow)
+
+    project = await project_service.create_project(odd.id, ProjectCreate(name="Odd project"))
+    await task_service.create_task(odd.id, TaskCreate(title="Odd task", project_id=project.id))
+    await task_service.create_task(even.id, TaskCreate(title="Even task"))
+
+    assert await _task_titles(shard_session_makers[1], odd.id) == ["Odd task"]
+    assert await _task_titles(shard_session_makers[0], even.id) == ["Even task"]
+    assert await _task_titles(shard_session_makers[0], odd.id) == []
+    assert [t.title for t in await task_service.get_tasks(odd.id)] == ["Odd task"]
+
+    # The directory on shard 0 knows every user; other shards only their own
+    async with shard_session_makers[1]() as session:
+        assert list((await session.execute(select(User.id))).scalars()) == [odd.id]
+
+
+@pytest.mark.asyncio
+async def test_reshard_user(sharded_uow, shard_session_makers, sharded_users):
+    odd, _ = sharded_users
+    task_service = TaskService(sharded_uow)
+    await task_service.create_task(odd.id, TaskCreate(title="Moving"))
+
+    copied = await copy_user(shard_session_makers[1], shard_session_makers[0], odd.id)
+    assert copied["tasks"] == 1
+    assert copied["outbox"] == 1
+    assert (await copy_user(shard_session_makers[1], shard_session_makers[0], odd.id))["tasks"] == 0
+
+    await purge_user(shard_session_makers[1], odd.id, drop_user=True)
+    assert await _task_titles(shard_session_makers[1], odd.id) == []
+
+    moved_uow = UnitOfWork(shard_session_makers, ModuloShardMap(2, {odd.id: 0}))
+    assert [t.title for t in await TaskService(moved_uow).get_tasks(odd.id)] == ["Moving"]
+
+
+async def _user_ids(session_maker):
+    async with session_maker() as session:
+        return sorted((await session.execute(select(User.id))).scalars())
+
+
+@pytest.mark.asyncio
+async def test_failed_replication_is_repaired_on_login(sharded_uow, shard_session_makers):
+    auth_service = AuthService(sharded_uow)
+    with patch.object(UserRepository, "replicate", side_effect=DatabaseUnavailableError()):
+        user = await auth_service.register(UserCreate(username="odd_user", password="password"))
+    assert await _user_ids(shard_session_makers[1]) == []
+
+    await auth_service.login(UserLogin(username="odd_user", password="password"))
+    await auth_service.login(UserLogin(username="odd_user", password="password"))
+
+    assert await _user_ids(shard_session_makers[1]) == [user.id]
+
+
+@pytest.mark.asyncio
+async def test_reconcile_users_copies_missing_and_removes_deleted_users(sharded_uow, shard_session_makers):
+    auth_service = AuthService(sharded_uow)
+    with patch.object(UserRepository, "replicate", side_effect=DatabaseUnavailableError()):
+        missing = await auth_service.register(UserCreate(username="missing", password="password"))
+    await auth_service.register(UserCreate(username="even_user", password="password"))
+    deleted = await auth_service.register(UserCreate(username="deleted", password="password"))
+    await TaskService(sharded_uow).create_task(deleted.id, TaskCreate(title="Orphaned"))
+    async with shard_session_makers[0]() as session:
+        await session.execute(delete(User).where(User.id == deleted.id))
+        await session.commit()
+
+    fixed = await reconcile_users(shard_session_makers, sharded_uow.shard_map, batch_size=1)
+
+    assert fixed == {"copied": 1, "removed": 1}
+    assert await _user_ids(shard_session_makers[1]) == [missing.id]
+    assert await _task_titles(shard_session_makers[1], deleted.id) == []
@@ -1,9 +1,17 @@
+import json
+from datetime import datetime, timedelta, UTC
+from unittest.mock import MagicMock, patch
+
 import pytest
 
 from app.api.schemas.task import TaskCreate, TaskUpdate
 from app.exceptions import (ProjectNotFoundError,
                             PermissionDeniedError,
-                            TaskNotFoundError)
+                            TaskNotFoundError,
+                            TaskUpdateConflictError,
+                            TaskVersionConflictError)
+from app.repositories import TaskRepository
+from app.services import TaskService
 
 
 @pytest.mark.asyncio
@@ -22,7 +30,7 @@ async def test_create_task_success(task_service, test_user, uow_test):
 
     # Verify DB state
     async with uow_test:
-        db_task = await uow_test.task.find_one(id=created_task.id)
+        db_task = await uow_test.task.find_one(id=created_task.id, user_id=test_user.id)
         assert db_task is not None
         assert db_task.user_id == test_user.id
 
@@ -86,6 +94,19 @@ async def test_get_tasks_pagination(task_service, test_user, multiple_test_tasks
     assert {t.id for t in page1}.isdisjoint({t.id for t in page2})
 
 
+@pytest.mark.asyncio
+async def test_get_tasks_skips_loading_when_unchanged(task_service, test_user, test_tasks):
+    # The validator sees a fingerprint of the matching set before any row loads
+    fingerprints = []
+
+    assert await task_service.get_tasks(test_user.id, unchanged=lambda fp: fingerprints.append(fp) or True) is None
+    tasks = await task_service.get_tasks(test_user.id, unchanged=lambda fp: fingerprints.append(fp) or False)
+
+    assert len(tasks) == len(test_tasks)
+    assert fingerprints[0] == fingerprints[1]
+    assert fingerprints[0][0] == len(test_tasks)
+
+
 @pytest.mark.asyncio
 async def test_get_task_success(task_service, test_user, test_task):
     # Test successful task retrieval
@@ -156,7 +177,7 @@ async def test_delete_task_success(task_service, test_user, test_task, uow_test)
 
     # Verify deletion
     async with uow_test:
-        assert await uow_test.task.find_one(id=task_id) is None
+        assert await uow_test.task.find_one(id=task_id, user_id=test_user.id) is None
 
 
 @pytest.mark.asyncio
@@ -171,3 +192,191 @@ async def test_delete_task_unauthorized(task_service, other_user, test_task):
     # Test permission check
     with pytest.raises(PermissionDeniedError):
         await task_service.delete_task(other_user.id, test_task.id)
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_titles_prefix(task_service, test_user, test_tasks):
+    suggestions = await task_service.autocomplete_titles(test_user.id, "task", limit=2)
+
+    assert [s.title for s in suggestions] == ["Task 0", "Task 1"]
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_titles_only_own_tasks(task_service, other_user, test_tasks):
+    suggestions = await task_service.autocomplete_titles(other_user.id, "task")
+    assert suggestions == []
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_index_follows_writes(indexed_task_service, title_index, test_user, test_task):
+    suggestions = await indexed_task_service.autocomplete_titles(test_user.id, "test")
+    assert [s.id for s in suggestions] == [test_task.id]
+    assert title_index.is_loaded(test_user.id)
+
+    created = await indexed_task_service.create_task(test_user.id, TaskCreate(title="Write report"))
+    await indexed_task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Renamed"))
+
+    assert [s.id for s in await indexed_task_service.autocomplete_titles(test_user.id, "rep")] == [created.id]
+    assert await indexed_task_service.autocomplete_titles(test_user.id, "test") == []
+
+    await indexed_task_service.delete_task(test_user.id, created.id)
+    assert await indexed_task_service.autocomplete_titles(test_user.id, "write") == []
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_overdue(task_service, test_user, tasks_with_deadlines):
+    tasks = await task_service.get_tasks(test_user.id, overdue=True)
+    assert [t.title for t in tasks] == ["Overdue"]
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_due_window_ordered_by_deadline(task_service, test_user, tasks_with_deadlines):
+    now = datetime.now(UTC)
+    tasks = await task_service.get_tasks(
+        test_user.id,
+        completed=False,
+        due_after=now - timedelta(days=7),
+        due_before=now + timedelta(days=7)
+    )
+    assert [t.title for t in tasks] == ["Overdue", "Due soon"]
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_due_window_pages_through_shared_deadlines(task_service, test_user):
+    deadline = datetime.now(UTC) + timedelta(days=1)
+    created = [
+        await task_service.create_task(test_user.id, TaskCreate(title=f"Shared {n}", deadline=deadline))
+        for n in range(4)
+    ]
+
+    window = dict(due_before=deadline + timedelta(days=1), limit=2)
+    first = await task_service.get_tasks(test_user.id, skip=0, **window)
+    second = await task_service.get_tasks(test_user.id, skip=2, **window)
+
+    assert [t.id for t in first + second] == [t.id for t in created]
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_page(task_service, test_user, multiple_test_tasks):
+    page = await task_service.get_tasks_page(test_user.id, skip=0, limit=4)
+
+    assert len(page.items) == 4
+    assert page.total == len(multiple_test_tasks)
+    assert page.total_is_estimate is False
+
+
+@pytest.mark.asyncio
+async def test_update_task_increments_version(task_service, test_user, test_task):
+    updated = await task_service.update_task(test_user.id, test_task.id, TaskUpdate(is_completed=True))
+    assert updated.version == test_task.version + 1
+
+
+@pytest.mark.asyncio
+async def test_update_task_stale_version_conflict(task_service, test_user, test_task):
+    await task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Device A"), expected_version=1)
+
+    with pytest.raises(TaskVersionConflictError):
+        await task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Device B"), expected_version=1)
+
+    task = await task_service.get_task(test_user.id, test_task.id)
+    assert task.title == "Device A"
+
+
+def losing_races(times: int):
+    """Patch for TaskRepository.update_versioned that reports a concurrent writer `times` times first."""
+    update_versioned = TaskRepository.update_versioned
+    lost = []
+
+    async def update(self, data, version, **filter_by):
+        if len(lost) < times:
+            lost.append(version)
+            return None
+        return await update_versioned(self, data, version, **filter_by)
+    return patch.object(TaskRepository, "update_versioned", update)
+
+
+@pytest.mark.asyncio
+async def test_update_task_without_if_match_retries_lost_race(task_service, test_user, test_task):
+    with losing_races(1):
+        updated = await task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Retried"))
+
+    assert updated.title == "Retried"
+
+
+@pytest.mark.asyncio
+async def test_update_task_with_if_match_does_not_retry(task_service, test_user, test_task):
+    with losing_races(1), pytest.raises(TaskVersionConflictError):
+        await task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Stale"), expected_version=1)
+
+
+@pytest.mark.asyncio
+async def test_update_task_gives_up_after_losing_every_attempt(task_service, test_user, test_task):
+    with losing_races(TaskService.UPDATE_ATTEMPTS), pytest.raises(TaskUpdateConflictError):
+        await task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Contended"))
+
+
+@pytest.mark.asyncio
+async def test_delete_task_stale_version_conflict(task_service, test_user, test_task):
+    await task_service.update_task(test_user.id, test_task.id, TaskUpdate(title="Edited"))
+
+    with pytest.raises(TaskVersionConflictError):
+        await task_service.delete_task(test_user.id, test_task.id, expected_version=1)
+
+
+@pytest.mark.asyncio
+async def test_archive_completed_tasks(task_service, test_user, old_completed_tasks):
+    archived = await task_service.archive_completed_tasks(timedelta(days=90), batch_size=1)
+    assert archived == 2
+
+    hot = await task_service.get_tasks(test_user.id)
+    assert {t.title for t in hot} == {"Old open", "Recent done"}
+
+    everything = await task_service.get_tasks(test_user.id, include_archived=True)
+    assert {t.title: t.is_archived for t in everything} == {
+        "Old done A": True, "Old done B": True, "Old open": False, "Recent done": False
+    }
+
+
+@pytest.mark.asyncio
+async def test_restore_task(task_service, test_user, old_completed_tasks):
+    await task_service.archive_completed_tasks(timedelta(days=90))
+    archived = old_completed_tasks[0]
+
+    with pytest.raises(TaskNotFoundError):
+        await task_service.get_task(test_user.id, archived.id)
+
+    restored = await task_service.restore_task(test_user.id, archived.id)
+
+    assert restored.id == archived.id
+    assert restored.is_archived is False
+    assert restored.version == archived.version + 2
+    assert (await task_service.get_task(test_user.id, archived.id)).title == "Old done A"
+
+
+@pytest.mark.asyncio
+async def test_restore_task_not_found(task_service, test_user):
+    with pytest.raises(TaskNotFoundError):
+        await task_service.restore_task(test_user.id, 999)
+
+
+@pytest.mark.asyncio
+async def test_events_are_recorded_only_for_committed_changes(uow_test, test_user, test_task):
+    relay = MagicMock()
+    service = TaskService(uow_test, events=relay)
+
+    updated = await service.update_task(test_user.id, test_task.id, TaskUpdate(title="Edited"), expected_version=1)
+    with pytest.raises(TaskVersionConflictError):
+        await service.update_task(test_user.id, test_task.id, TaskUpdate(title="Stale"), expected_version=1)
+
+    async with uow_test:
+        events = [(event.event, event.user_id, event.payload) for event in await uow_test.outbox.claim_pending(10)]
+    assert len(events) == 1
+    assert events[0][:2] == ("task_updated", test_user.id)
+    # Only the changed fields are sent for updates
+    assert json.loads(events[0][2]) == {
+        "id": test_task.id,
+        "version": updated.version,
+        "title": "Edited",
+        "updated_at": updated.model_dump(mode="json")["updated_at"]
+    }
+    relay.wake.assert_called_once()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+from typing import List
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import WebSocket
+
+from app.core.backplane import Backplane, InProcessBackplane, PostgresBackplane, load_backplane
+from app.core.websockets import ConnectionManager
+
+
+class FakeBus:
+    """Stands in for the shared channel that the workers' backplanes talk through."""
+    def __init__(self):
+        self.backplanes: List["FakeBackplane"] = []
+        self.published: List[str] = []
+
+    async def publish(self, payload: str):
+        self.published.append(payload)
+        await asyncio.gather(*(backplane.deliver(payload) for backplane in self.backplanes))
+
+
+class FakeBackplane(Backplane):
+    def __init__(self, bus: FakeBus):
+        super().__init__()
+        self.bus = bus
+        bus.backplanes.append(self)
+
+    async def publish(self, payload: str):
+        await self.bus.publish(payload)
+
+
+def make_socket() -> MagicMock:
+    ws = MagicMock(spec=WebSocket)
+    ws.send_text = AsyncMock()
+    return ws
+
+
+@pytest.fixture
+async def workers():
+    bus = FakeBus()
+    managers = [ConnectionManager(backplane=FakeBackplane(bus)) for _ in range(3)]
+    yield managers
+    for manager in managers:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_event_reaches_sockets_held_by_other_workers(workers):
+    worker_a, worker_b, worker_c = workers
+    on_b, on_c, other_user = make_socket(), make_socket(), make_socket()
+    worker_b.register(on_b, 1)
+    worker_c.register(on_c, 1)
+    worker_c.register(other_user, 2)
+    message = {"event": "task_created", "data": {"id": 5}}
+
+    await worker_a.send_personal_message(message, 1)
+    for worker in workers:
+        await worker.flush(timeout=1)
+
+    on_b.send_text.assert_awaited_once_with(json.dumps(message))
+    on_c.send_text.assert_awaited_once_with(json.dumps(message))
+    other_user.send_text.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_project_subscriptions_apply_on_the_receiving_worker(workers):
+    worker_a, worker_b, _ = workers
+    subscribed = make_socket()
+    worker_b.register(subscribed, 1).subscribe(10)
+
+    await worker_a.send_personal_message({"event": "task_updated"}, 1, project_id=20)
+    await worker_a.send_personal_message({"event": "task_updated"}, 1, project_id=10)
+    await worker_b.flush(timeout=1)
+
+    subscribed.send_text.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_every_worker(workers):
+    sockets = [make_socket() for _ in workers]
+    for user_id, (worker, ws) in enumerate(zip(workers, sockets)):
+        worker.register(ws, user_id)
+
+    await workers[0].broadcast({"event": "maintenance"})
+    for worker in workers:
+        await worker.flush(timeout=1)
+
+    for ws in sockets:
+        ws.send_text.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_oversized_notify_payload_is_refused():
+    backplane = PostgresBackplane(dsn="postgresql://unused")
+    backplane.bind(AsyncMock())
+    payload = json.dumps({"message": "x" * PostgresBackplane.MAX_PAYLOAD})
+
+    with pytest.raises(ValueError):
+        await backplane.publish(payload)
+
+    backplane.deliver.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_oversized_outbox_event_travels_as_a_reference(workers):
+    worker_a, worker_b, worker_c = workers
+    message = {"event": "task_created", "seq": 42, "data": {"description": "x" * 100}}
+    on_b = make_socket()
+    worker_b.register(on_b, 1)
+    for worker in workers:
+        worker.backplane.MAX_PAYLOAD = 100
+        worker.fetch_event = AsyncMock(return_value=message)
+
+    await worker_a.send_personal_message(message, 1)
+    await worker_b.flush(timeout=1)
+
+    assert json.loads(worker_a.backplane.bus.published[0]) == {"user_id": 1, "project_id": None, "seq": 42}
+    on_b.send_text.assert_awaited_once_with(json.dumps(message))
+    worker_b.fetch_event.assert_awaited_once_with(1, 42)
+    worker_c.fetch_event.assert_not_awaited()
+
+
+def test_load_backplane():
+    assert isinstance(load_backplane("app.core.backplane.InProcessBackplane", "postgresql"), InProcessBackplane)
+    assert isinstance(load_backplane("", "postgresql"), PostgresBackplane)
+    assert isinstance(load_backplane("", "sqlite"), InProcessBackplane)
+    with pytest.raises(ValueError):
+        load_backplane("app.core.websockets.ConnectionManager", "postgresql")
@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock
+
+from app.api.etags import ListETag, make_etag, etag_matches, not_modified, version_from_if_match
+
+
+def test_make_etag_is_quoted_and_deterministic():
+    etag = make_etag(1, "/tasks/", (3, 7, None))
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag(1, "/tasks/", (3, 7, None))
+    assert etag != make_etag(1, "/tasks/", (4, 8, None))
+
+
+def test_list_etag_follows_fingerprint_and_if_none_match():
+    request = MagicMock()
+    request.url.path, request.url.query = "/tasks/", "limit=2"
+    fingerprint = (2, 7, 4, None)
+
+    etag = ListETag(1, request, None)
+    assert etag(fingerprint) is False
+    assert ListETag(1, request, etag.etag)(fingerprint) is True
+    assert ListETag(1, request, etag.etag)((3, 8, 5, None)) is False
+    assert ListETag(2, request, etag.etag)(fingerprint) is False
+
+
+def test_etag_matches_single_list_and_wildcard():
+    etag = make_etag("x")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert etag_matches(f"W/{etag}", etag)
+
+
+def test_etag_does_not_match_missing_or_different():
+    etag = make_etag("x")
+
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+    assert not etag_matches(make_etag("y"), etag)
+
+
+def test_not_modified_response():
+    response = not_modified('"abc"')
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"abc"'
+    assert response.body == b""
+
+
+def test_version_from_if_match():
+    assert version_from_if_match(None) is None
+    assert version_from_if_match("*") is None
+    assert version_from_if_match('"3"') == 3
+    assert version_from_if_match('W/"3"') == 0
+    assert version_from_if_match('"not-ours"') == 0
@@ -0,0 +1,80 @@
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+from datetime import datetime, UTC
+from logging.handlers import QueueListener
+
+from app.core.logger import DroppingQueueHandler, JsonFormatter, LOG_RECORDS_DROPPED, setup_logging, shutdown_logging
+
+
+def make_logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger("test_logger")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_full_queue_drops_and_counts_records():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = make_logger(handler)
+    dropped_before = LOG_RECORDS_DROPPED.labels().get()
+
+    for n in range(5):
+        logger.info("record %d", n)
+
+    assert handler.queue.qsize() == 2
+    assert [handler.queue.get_nowait().msg for _ in range(2)] == ["record 0", "record 1"]
+    assert handler.dropped == 3
+    assert LOG_RECORDS_DROPPED.labels().get() == dropped_before + 3
+
+
+def test_records_are_formatted_off_the_calling_thread():
+    formatting_threads = []
+
+    class RecordingFormatter(JsonFormatter):
+        def format(self, record):
+            formatting_threads.append(threading.get_ident())
+            return super().format(record)
+
+    output = io.StringIO()
+    console = logging.StreamHandler(output)
+    console.setFormatter(RecordingFormatter())
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, console)
+    listener.start()
+    logger = make_logger(DroppingQueueHandler(log_queue))
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("failed %s", "here")
+    listener.stop()
+
+    assert formatting_threads and threading.get_ident() not in formatting_threads
+    record = json.loads(output.getvalue())
+    assert record["message"] == "failed here"
+    assert "ZeroDivisionError" in record["exception"]
+
+
+def test_timestamp_is_when_the_record_was_made():
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "message", None, None)
+    record.created = 0
+
+    assert json.loads(JsonFormatter().format(record))["timestamp"] == datetime.fromtimestamp(0, UTC).isoformat()
+
+
+def test_shutdown_writes_out_queued_records(monkeypatch):
+    output = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", output)
+    setup_logging()
+    try:
+        logging.getLogger("app").info("last words")
+        shutdown_logging()
+
+        assert json.loads(output.getvalue().splitlines()[-1])["message"] == "last words"
+    finally:
+        monkeypatch.undo()
+        setup_logging()
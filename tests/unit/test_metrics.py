@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsSnapshots,
+    Registry,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_SIZE,
+    instrument_pools
+)
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter("requests", "Requests served", ("route",)))
+    in_flight = registry.register(Gauge("in_flight", "Requests being served"))
+    requests.labels("/tasks/{task_id}").inc()
+    requests.labels("/tasks/{task_id}").inc(2)
+    requests.labels('say "hi"').inc()
+    in_flight.inc()
+    in_flight.set_function(lambda: 5)
+
+    assert registry.render() == (
+        "# HELP requests Requests served\n"
+        "# TYPE requests counter\n"
+        'requests_total{route="/tasks/{task_id}"} 3\n'
+        'requests_total{route="say \\"hi\\""} 1\n'
+        "# HELP in_flight Requests being served\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 5\n"
+    )
+
+
+def test_histogram_counts_are_cumulative_and_bounds_inclusive():
+    registry = Registry()
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("method",), buckets=(0.1, 1)))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.labels("GET").observe(value)
+
+    lines = registry.render().splitlines()[2:]
+
+    assert lines == [
+        'latency_seconds_bucket{method="GET",le="0.1"} 2',
+        'latency_seconds_bucket{method="GET",le="1"} 3',
+        'latency_seconds_bucket{method="GET",le="+Inf"} 4',
+        'latency_seconds_count{method="GET"} 4',
+        'latency_seconds_sum{method="GET"} 3.65',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_snapshots_render_every_worker_labelled_by_pid(tmp_path):
+    registry = Registry()
+    requests = registry.register(Counter("requests", "Requests served", ("route",)))
+    latency = registry.register(Histogram("latency", "Latency", buckets=(1.0,)))
+    other = MetricsSnapshots(registry, str(tmp_path))
+    other.worker = "101"
+    requests.labels("/tasks/").inc(4)
+    other.write()
+    stale = MetricsSnapshots(registry, str(tmp_path))
+    stale.worker = "102"
+    stale.write()
+    os.utime(stale.path, (time.time() - 60, time.time() - 60))
+
+    requests.labels("/tasks/").inc()
+    latency.observe(0.5)
+    body = await MetricsSnapshots(registry, str(tmp_path)).render()
+
+    pid = os.getpid()
+    assert f'requests_total{{worker="{pid}",route="/tasks/"}} 5' in body
+    assert 'requests_total{worker="101",route="/tasks/"} 4' in body
+    assert f'latency_bucket{{worker="{pid}",le="1"}} 1' in body
+    assert 'worker="102"' not in body
+    assert not stale.path.exists()
+
+
+def test_labels_must_match_label_names():
+    with pytest.raises(ValueError):
+        Counter("requests", "Requests served", ("method", "route")).labels("GET")
+
+
+def test_instrument_pools_reports_queue_pools_only():
+    sqlite = create_async_engine("sqlite+aiosqlite:///:memory:")
+    postgres = create_async_engine("postgresql+asyncpg://u:p@localhost/n", pool_size=3)
+
+    instrument_pools([postgres, sqlite])
+
+    assert DB_POOL_SIZE.labels("0").get() == 3
+    assert DB_POOL_CONNECTIONS.labels("0", "checked_out").get() == 0
+    assert ("1",) not in DB_POOL_SIZE._children
@@ -1,11 +1,12 @@
-from unittest.mock import AsyncMock, patch
+from unittest.mock import patch
 
 import pytest
-from fastapi import FastAPI, Request, HTTPException, status
+from fastapi import FastAPI, HTTPException, WebSocket, status
 from fastapi.testclient import TestClient
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
-from app.core.middleware import log_requests
+from app.core.metrics import HTTP_REQUESTS
+from app.core.middleware import RequestLoggingMiddleware
 
 
 @pytest.fixture
@@ -16,10 +17,32 @@ def test_app():
     async def test_endpoint():
         return {"message": "success"}
 
+    @app.get("/items/{item_id}")
+    async def item_endpoint(item_id: int):
+        return {"id": item_id}
+
     @app.get("/error")
     async def error_endpoint():
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @app.get("/crash")
+    async def crash_endpoint():
+        raise RuntimeError("boom")
+
+    @app.get("/stream")
+    async def stream_endpoint():
+        async def chunks():
+            for chunk in (b"one ", b"two"):
+                yield chunk
+        return StreamingResponse(chunks())
+
+    @app.websocket("/ws")
+    async def websocket_endpoint(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("hello")
+        await websocket.close()
+
+    app.add_middleware(RequestLoggingMiddleware)
     return app
 
 
@@ -32,50 +55,32 @@ def mock_logger():
 @pytest.fixture
 def mock_time():
     with patch("app.core.middleware.time") as mock_time:
-        mock_time.time.side_effect = [100.0, 100.123]  # start time, end time
+        mock_time.perf_counter_ns.side_effect = [100_000_000_000, 100_123_000_000]  # start, end
         yield mock_time
 
 
 @pytest.mark.asyncio
-async def test_middleware_passes_through_response(test_app, mock_logger, mock_time):
+async def test_middleware_passes_through_response(mock_logger, mock_time):
     """Test that middleware doesn't modify the response"""
-    request = Request({
-        "type": "http",
-        "method": "GET",
-        "path": "/test",
-        "headers": [],
-        "client": ("127.0.0.1", 12345)
-    })
-
-    async def call_next(_request):
-        return JSONResponse({"original": "response"})
+    sent = []
 
-    response = await log_requests(request, call_next)
-    assert response.body == b'{"original":"response"}'
+    async def app(scope, receive, send):
+        await JSONResponse({"original": "response"})(scope, receive, send)
 
+    async def send(message):
+        sent.append(message)
 
-@pytest.mark.asyncio
-async def test_middleware_calls_call_next(test_app, mock_logger, mock_time):
-    """Test that middleware properly calls the next handler"""
-    mock_call_next = AsyncMock(return_value=JSONResponse({}))
-    request = Request({
-        "type": "http",
-        "method": "GET",
-        "path": "/test",
-        "headers": [],
-        "client": ("127.0.0.1", 12345)
-    })
-
-    response = await log_requests(request, mock_call_next)
+    await RequestLoggingMiddleware(app)(
+        {"type": "http", "method": "GET", "path": "/test", "headers": []}, None, send
+    )
 
-    mock_call_next.assert_awaited_once_with(request)
-    assert isinstance(response, JSONResponse)
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b'{"original":"response"}'
 
 
 def test_middleware_logs_correct_values(test_app, mock_logger, mock_time):
     """Test that middleware logs the expected values"""
     client = TestClient(test_app)
-    test_app.middleware("http")(log_requests)
 
     _response = client.get("/test")
 
@@ -91,33 +96,71 @@ def test_middleware_logs_correct_values(test_app, mock_logger, mock_time):
     mock_logger.info.assert_called_once_with(expected_log)
 
 
-def test_middleware_handles_missing_client(test_app, mock_logger, mock_time):
+@pytest.mark.asyncio
+async def test_middleware_handles_missing_client(mock_logger, mock_time):
     """Test that middleware handles requests with no client info"""
-    client = TestClient(test_app)
-    test_app.middleware("http")(log_requests)
+    async def app(scope, receive, send):
+        await JSONResponse({})(scope, receive, send)
 
-    # Create request without client headers
-    _response = client.get("/test")
+    async def send(_message):
+        pass
 
-    # Verify log contains testclient (default TestClient host)
-    assert mock_logger.info.call_args[0][0]["client"] == "testclient"
+    await RequestLoggingMiddleware(app)({"type": "http", "method": "GET", "path": "/test", "headers": []}, None, send)
 
+    assert mock_logger.info.call_args[0][0]["client"] is None
 
-@pytest.mark.asyncio
-async def test_middleware_handles_exceptions(test_app, mock_logger, mock_time):
-    """Test that middleware still logs when call_next raises an exception"""
-    client = TestClient(test_app)
-    test_app.middleware("http")(log_requests)
+
+def test_middleware_handles_exceptions(test_app, mock_logger, mock_time):
+    """Test that middleware still logs error responses and unhandled exceptions"""
+    client = TestClient(test_app, raise_server_exceptions=False)
 
     response = client.get("/error")
 
-    expected_log = {
+    assert response.status_code == 500
+    mock_logger.info.assert_called_once_with({
         "method": "GET",
         "path": "/error",
         "status_code": 500,
         "process_time": "0.123s",
         "client": "testclient",
-    }
+    })
+
+    mock_time.perf_counter_ns.side_effect = [0, 1_000_000]
+    response = client.get("/crash")
 
     assert response.status_code == 500
-    mock_logger.info.assert_called_once_with(expected_log)
+    assert mock_logger.info.call_args[0][0]["status_code"] == 500
+
+
+def test_middleware_leaves_streamed_responses_intact(test_app, mock_logger):
+    client = TestClient(test_app)
+
+    response = client.get("/stream")
+
+    assert response.content == b"one two"
+    assert mock_logger.info.call_args[0][0]["status_code"] == 200
+
+
+def test_middleware_logs_websocket_sessions(test_app, mock_logger):
+    client = TestClient(test_app)
+    accepted = HTTP_REQUESTS.labels("GET", "/ws", "101")
+    before = accepted.get()
+
+    with client.websocket_connect("/ws") as websocket:
+        assert websocket.receive_text() == "hello"
+
+    assert accepted.get() == before + 1
+    assert mock_logger.info.call_args[0][0]["status_code"] == 101
+
+
+def test_middleware_counts_requests_by_route_template(test_app, mock_logger):
+    client = TestClient(test_app)
+    requests = HTTP_REQUESTS.labels("GET", "/items/{item_id}", "200")
+    before = requests.get()
+
+    client.get("/items/17")
+    client.get("/items/18")
+    client.get("/missing")
+
+    assert requests.get() == before + 2
+    assert HTTP_REQUESTS.labels("GET", "unmatched", "404").get() >= 1
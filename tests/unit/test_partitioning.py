@@ -0,0 +1,31 @@
+import pytest
+
+from app.db.partitioning import create_partitioned_ddl, mirror_trigger_ddl, swap_ddl, PARTITIONED_TABLE
+
+
+def test_create_partitioned_ddl_partitions():
+    statements = create_partitioned_ddl(4)
+
+    assert "PARTITION BY HASH (user_id)" in statements[0]
+    assert "PRIMARY KEY (id, user_id)" in statements[0]
+    partitions = [s for s in statements if f"PARTITION OF {PARTITIONED_TABLE}" in s]
+    assert len(partitions) == 4
+    assert "MODULUS 4, REMAINDER 3" in partitions[-1]
+
+
+def test_create_partitioned_ddl_requires_partition():
+    with pytest.raises(ValueError):
+        create_partitioned_ddl(0)
+
+
+def test_mirror_trigger_updates_non_key_columns():
+    function = mirror_trigger_ddl(["id", "title", "user_id", "version"])[0]
+
+    assert "DO UPDATE SET title = EXCLUDED.title, version = EXCLUDED.version;" in function
+
+
+def test_swap_renames_indexes_back():
+    statements = swap_ddl()
+
+    assert statements[0].startswith("LOCK TABLE")
+    assert "ALTER INDEX ix_tasks_title_part RENAME TO ix_tasks_title" in statements
@@ -0,0 +1,13 @@
+from app.utils.rate_limit import TokenBucket
+
+
+def test_token_bucket_allows_bursts_then_refills():
+    bucket = TokenBucket(rate=2, burst=3)
+    start = bucket.updated_at
+
+    assert [bucket.take(start) for _ in range(4)] == [True, True, True, False]
+    # Half a second refills one token at 2 per second
+    assert bucket.take(start + 0.5) is True
+    assert bucket.take(start + 0.5) is False
+    # Never more than the burst, however long the bucket was idle
+    assert sum(bucket.take(start + 100) for _ in range(5)) == 3
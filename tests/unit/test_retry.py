@@ -0,0 +1,101 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from app.core.deadlines import clear_deadline
+from app.db.sharding import ModuloShardMap
+from app.exceptions import DatabaseUnavailableError
+from app.utils.retry import RetryBudget, RetryPolicy, is_transient
+from app.utils.unitofwork import UnitOfWork
+
+
+def db_error(code: str | None = None, invalidated: bool = False) -> DBAPIError:
+    orig = Exception("database error")
+    orig.sqlstate = code
+    return DBAPIError("UPDATE tasks", {}, orig, connection_invalidated=invalidated)
+
+
+@pytest.fixture
+def uow():
+    clear_deadline()
+    uow = UnitOfWork([MagicMock(return_value=AsyncMock())], ModuloShardMap(1))
+    uow.retry_policy = RetryPolicy(attempts=3, base_delay=0, max_delay=0, budget=RetryBudget())
+    return uow
+
+
+def test_is_transient():
+    assert is_transient(db_error("40001"))
+    assert is_transient(db_error("40P01"))
+    assert is_transient(db_error(invalidated=True))
+    assert not is_transient(db_error("23505"))
+    assert not is_transient(ValueError())
+
+
+def test_retry_budget_throttles():
+    budget = RetryBudget(max_tokens=4, token_ratio=1)
+    budget.record_failure()
+    assert budget.can_retry()
+    budget.record_failure()
+    assert not budget.can_retry()
+    budget.record_success()
+    assert budget.can_retry()
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(attempts=10, base_delay=0.1, max_delay=0.3)
+    assert all(0 <= policy.backoff(retry) <= 0.3 for retry in range(1, 10))
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_error_before_commit(uow):
+    work = AsyncMock(side_effect=[db_error("40P01"), "done"])
+
+    assert await uow.run_retryable(work) == "done"
+    assert work.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_retries_serialization_failure_at_commit(uow):
+    uow.session = AsyncMock()
+    uow.session.commit.side_effect = [db_error("40001"), None]
+
+    async def work():
+        await uow.commit()
+        return "committed"
+
+    assert await uow.run_retryable(work) == "committed"
+    assert uow.session.commit.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_lost_connection_during_commit(uow):
+    uow.session = AsyncMock()
+    uow.session.commit.side_effect = db_error(invalidated=True)
+    work = AsyncMock(side_effect=uow.commit)
+
+    with pytest.raises(DBAPIError):
+        await uow.run_retryable(work)
+    assert work.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_after_a_commit(uow):
+    uow.session = AsyncMock()
+
+    async def work():
+        await uow.commit()
+        raise db_error("40P01")
+
+    with pytest.raises(DBAPIError):
+        await uow.run_retryable(work)
+    assert uow.session.commit.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_retries_raise_unavailable(uow):
+    work = AsyncMock(side_effect=db_error("40001"))
+
+    with pytest.raises(DatabaseUnavailableError):
+        await uow.run_retryable(work)
+    assert work.await_count == 3
@@ -2,6 +2,7 @@ from datetime import datetime
 
 import pytest
 
+from app.api.schemas.pagination import Page
 from app.api.schemas.project import ProjectBase, ProjectCreate, ProjectUpdate, ProjectResponse
 from app.api.schemas.task import TaskCreate, TaskUpdate, TaskResponse, PriorityLevel
 from app.api.schemas.user import UserBase, UserCreate, UserLogin, UserResponse
@@ -144,3 +145,9 @@ def test_project_response_from_orm():
     response = ProjectResponse.model_validate(orm_data)
     assert response.id == 1
     assert response.owner_id == 1
+
+
+def test_page_defaults_to_exact_total():
+    page = Page[int](items=[1, 2], total=10)
+
+    assert page.total_is_estimate is False
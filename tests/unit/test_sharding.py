@@ -0,0 +1,58 @@
+import pytest
+
+from app.db.sharding import JumpHashShardMap, ModuloShardMap, advance_sequence_sql, load_shard_map, id_sequence_ddl
+
+
+def test_jump_hash_is_stable_and_in_range():
+    shard_map = JumpHashShardMap(8)
+    shards = [shard_map.shard_for(user_id) for user_id in range(1, 1001)]
+
+    assert all(0 <= shard < 8 for shard in shards)
+    assert shards == [JumpHashShardMap(8).shard_for(user_id) for user_id in range(1, 1001)]
+    assert len(set(shards)) == 8
+
+
+def test_jump_hash_growth_only_moves_users_to_new_shard():
+    before, after = JumpHashShardMap(4), JumpHashShardMap(5)
+
+    for user_id in range(1, 1001):
+        if before.shard_for(user_id) != after.shard_for(user_id):
+            assert after.shard_for(user_id) == 4
+
+
+def test_overrides_take_precedence():
+    shard_map = ModuloShardMap(2, {3: 0})
+
+    assert shard_map.shard_for(3) == 0
+    assert shard_map.shard_for(5) == 1
+
+
+def test_override_out_of_range():
+    with pytest.raises(ValueError):
+        ModuloShardMap(2, {3: 2})
+
+
+def test_load_shard_map():
+    shard_map = load_shard_map("app.db.sharding.ModuloShardMap", 3)
+
+    assert isinstance(shard_map, ModuloShardMap)
+    assert shard_map.shard_count == 3
+
+    with pytest.raises(ValueError):
+        load_shard_map("app.db.sharding.id_sequence_ddl", 3)
+
+
+def test_id_sequence_ddl():
+    statements = id_sequence_ddl(2, 64)
+
+    assert "ALTER SEQUENCE tasks_id_seq INCREMENT BY 64" in statements
+    assert "ALTER SEQUENCE outbox_id_seq INCREMENT BY 64" in statements
+    with pytest.raises(ValueError):
+        id_sequence_ddl(64, 64)
+
+
+def test_advance_sequence_sql_moves_past_ids_of_the_shard():
+    statement = advance_sequence_sql("outbox", 3, 64, 130)
+
+    assert statement.startswith("SELECT setval('outbox_id_seq', 195, false)")
+    assert statement.endswith("< 195")
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.core.sse import EventStream
+from app.core.websockets import ConnectionManager
+
+
+async def take(frames, count: int):
+    return [await anext(frames) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_event_stream_receives_the_users_events_as_sse_frames():
+    manager = ConnectionManager(coalesce_window=0)
+    stream = EventStream()
+    manager.register(stream, 1, encoding="sse")
+    frames = stream.frames(lifetime=5)
+
+    event = {"event": "task_created", "seq": 7, "data": {"id": 3, "title": "Streamed"}}
+    await manager.send_personal_message(event, 1)
+    await manager.send_personal_message({"event": "task_created", "seq": 8, "data": {"id": 4}}, 2)
+    manager.reap()
+
+    assert await take(frames, 2) == [f"id: 7\ndata: {json.dumps(event)}\n\n", ": ping\n\n"]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_event_is_encoded_once_per_format():
+    manager = ConnectionManager(coalesce_window=0)
+    streams = [EventStream(), EventStream()]
+    for stream in streams:
+        manager.register(stream, 1, encoding="sse")
+    event = {"event": "task_updated", "seq": 1, "data": {"id": 1}}
+
+    with patch("app.core.websockets.json.dumps", wraps=json.dumps) as dumps:
+        await manager.send_personal_message(event, 1)
+        received = [await anext(stream.frames(lifetime=5)) for stream in streams]
+
+    assert received[0] == received[1]
+    # Once in the backplane envelope, once for both streams
+    assert [call.args[0] for call in dumps.call_args_list].count(event) == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_stalled_stream_is_evicted_and_ended():
+    manager = ConnectionManager(send_timeout=0.01, coalesce_window=0)
+    stream = EventStream()
+    manager.register(stream, 1, encoding="sse")
+
+    # Nobody reads: the first frame fills the hand-over slot, the second times out
+    for seq in (1, 2):
+        await manager.send_personal_message({"event": "task_created", "seq": seq, "data": {"id": seq}}, 1)
+    await asyncio.sleep(0.05)
+
+    assert 1 not in manager.active_connections
+    assert [frame async for frame in stream.frames(lifetime=5)] == []
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_after_its_lifetime():
+    stream = EventStream()
+    assert [frame async for frame in stream.frames(lifetime=0.01)] == []
@@ -0,0 +1,93 @@
+import time
+from unittest.mock import patch
+
+from app.utils.title_index import TitleIndex
+
+
+def make_index(rows, user_id=1):
+    index = TitleIndex()
+    index.load(user_id, rows)
+    return index
+
+
+def test_search_matches_title_prefix():
+    index = make_index([(1, "Buy milk"), (2, "Call mom"), (3, "Buy bread")])
+
+    assert index.search(1, "buy") == [(3, "Buy bread"), (1, "Buy milk")]
+
+
+def test_search_matches_any_word_prefix():
+    index = make_index([(1, "Buy milk"), (2, "Milestone review")])
+
+    result = index.search(1, "mil")
+
+    assert {task_id for task_id, _ in result} == {1, 2}
+
+
+def test_search_is_case_and_whitespace_insensitive():
+    index = make_index([(1, "Write   Quarterly Report")])
+
+    assert index.search(1, "QUARTERLY  rep") == [(1, "Write   Quarterly Report")]
+
+
+def test_search_respects_limit():
+    index = make_index([(i, f"Task {i}") for i in range(20)])
+
+    assert len(index.search(1, "task", limit=5)) == 5
+
+
+def test_search_tolerates_single_typo():
+    index = make_index([(1, "Groceries"), (2, "Gym")])
+
+    assert index.search(1, "grcoer") == [(1, "Groceries")]
+
+
+def test_search_unknown_user_returns_empty():
+    index = TitleIndex()
+
+    assert index.search(42, "anything") == []
+    assert not index.is_loaded(42)
+
+
+def test_add_update_and_remove():
+    index = make_index([(1, "Old title")])
+
+    index.add(1, 2, "New task")
+    assert index.search(1, "new") == [(2, "New task")]
+
+    index.add(1, 1, "Renamed")
+    assert index.search(1, "old") == []
+    assert index.search(1, "ren") == [(1, "Renamed")]
+
+    index.remove(1, 2)
+    assert index.search(1, "new") == []
+
+
+def test_writes_for_unloaded_user_are_ignored():
+    index = TitleIndex()
+
+    index.add(7, 1, "Ignored")
+
+    assert not index.is_loaded(7)
+
+
+def test_least_recently_used_users_are_evicted():
+    index = TitleIndex(max_users=2)
+    index.load(1, [(1, "a")])
+    index.load(2, [(2, "b")])
+    index.search(1, "a")
+
+    index.load(3, [(3, "c")])
+
+    assert index.is_loaded(1)
+    assert not index.is_loaded(2)
+    assert index.is_loaded(3)
+
+
+def test_index_is_rebuilt_once_older_than_max_age():
+    index = TitleIndex(max_age=60)
+    index.load(1, [(1, "Buy milk")])
+
+    with patch("app.utils.title_index.time.monotonic", return_value=time.monotonic() + 61):
+        assert not index.is_loaded(1)
+        assert index.search(1, "milk") == []
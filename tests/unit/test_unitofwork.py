@@ -1,7 +1,12 @@
+import asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
 
 import pytest
+from sqlalchemy.exc import DBAPIError
 
+from app.core.deadlines import set_deadline, clear_deadline
+from app.db.sharding import ModuloShardMap
+from app.exceptions import DeadlineExceededError
 from app.utils.unitofwork import UnitOfWork
 
 
@@ -70,3 +75,106 @@ async def test_uow_exit_on_exception_calls_rollback_and_close():
         mock_session.rollback.assert_awaited()
         mock_session.close.assert_awaited()
         assert uow.session is None
+
+
+@pytest.fixture
+def no_deadline():
+    clear_deadline()
+    yield
+    clear_deadline()
+
+
+@pytest.mark.asyncio
+async def test_uow_enter_after_deadline_raises_without_session(no_deadline):
+    mock_session_factory = MagicMock()
+
+    with patch("app.utils.unitofwork.async_session_maker", mock_session_factory):
+        uow = UnitOfWork()
+        set_deadline(-1)
+
+        with pytest.raises(DeadlineExceededError):
+            async with uow:
+                pass
+
+        mock_session_factory.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_uow_cancels_body_past_deadline_and_releases_session(no_deadline):
+    mock_session = AsyncMock()
+    mock_session.bind.dialect.name = "sqlite"
+    mock_session_factory = MagicMock(return_value=mock_session)
+
+    with patch("app.utils.unitofwork.async_session_maker", mock_session_factory):
+        uow = UnitOfWork()
+        set_deadline(0.01)
+
+        with pytest.raises(DeadlineExceededError):
+            async with uow:
+                await asyncio.sleep(1)
+
+        mock_session.rollback.assert_awaited()
+        mock_session.close.assert_awaited()
+        assert uow.session is None
+
+
+@pytest.mark.asyncio
+async def test_uow_maps_statement_timeout_to_deadline_error(no_deadline):
+    mock_session = AsyncMock()
+    mock_session_factory = MagicMock(return_value=mock_session)
+    orig = Exception("canceling statement due to statement timeout")
+    orig.sqlstate = "57014"
+
+    with patch("app.utils.unitofwork.async_session_maker", mock_session_factory):
+        uow = UnitOfWork()
+
+        with pytest.raises(DeadlineExceededError):
+            async with uow:
+                raise DBAPIError("SELECT 1", {}, orig)
+
+        mock_session.close.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_uow_sets_statement_timeout_on_postgres(no_deadline):
+    mock_session = AsyncMock()
+    mock_session.bind.dialect.name = "postgresql"
+    mock_session_factory = MagicMock(return_value=mock_session)
+
+    with patch("app.utils.unitofwork.async_session_maker", mock_session_factory), \
+            patch("app.utils.unitofwork.event") as mock_event:
+        uow = UnitOfWork()
+        set_deadline(5)
+
+        async with uow:
+            pass
+
+        mock_event.listen.assert_called_once_with(
+            mock_session.sync_session, "after_begin", uow._set_statement_timeout
+        )
+
+    connection = MagicMock()
+    set_deadline(2)
+    uow._set_statement_timeout(None, None, connection)
+    timeout_ms = int(connection.execute.call_args[0][1]["timeout"])
+    assert 1900 < timeout_ms <= 2000
+
+
+@pytest.mark.asyncio
+async def test_uow_routes_to_user_shard():
+    sessions = [AsyncMock(), AsyncMock()]
+    factories = [MagicMock(return_value=session) for session in sessions]
+    uow = UnitOfWork(factories, ModuloShardMap(2))
+
+    async with uow(3):
+        assert uow.session is sessions[1]
+    async with uow:
+        assert uow.session is sessions[0]
+
+    assert factories[1].call_count == 1
+    assert factories[0].call_count == 1
+
+
+def test_uow_rejects_mismatched_shard_map():
+    with pytest.raises(ValueError):
+        UnitOfWork([MagicMock()], ModuloShardMap(2))
@@ -1,11 +1,15 @@
+import asyncio
 import json
-from unittest.mock import AsyncMock, MagicMock
+import time
+import zlib
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import msgpack
 import pytest
 from fastapi import WebSocket
 from pydantic import BaseModel
 
-from app.core.websockets import ConnectionManager
+from app.core.websockets import Connection, ConnectionManager, OverflowPolicy, negotiate_encoding
 
 
 class SampleModel(BaseModel):
@@ -20,78 +24,91 @@ def manager():
 
 @pytest.fixture
 def mock_websocket():
+    return make_socket()
+
+
+def make_socket() -> MagicMock:
     ws = MagicMock(spec=WebSocket)
     ws.send_text = AsyncMock()
+    ws.send_bytes = AsyncMock()
     return ws
 
 
 @pytest.mark.asyncio
 async def test_connect_adds_new_connection(manager, mock_websocket):
-    username = "test_user"
+    user_id = 1
 
-    await manager.connect(mock_websocket, username)
+    connection = await manager.connect(mock_websocket, user_id)
 
-    assert username in manager.active_connections
-    assert mock_websocket in manager.active_connections[username]
+    assert manager.active_connections[user_id] == {mock_websocket: connection}
+    assert connection.user_id == user_id
     mock_websocket.accept.assert_awaited_once()
+    await manager.close()
 
 
 @pytest.mark.asyncio
 async def test_connect_multiple_sockets_same_user(manager, mock_websocket):
-    username = "test_user"
-    ws2 = MagicMock(spec=WebSocket)
-    ws2.send_text = AsyncMock()
+    user_id = 1
 
-    await manager.connect(mock_websocket, username)
-    await manager.connect(ws2, username)
+    await manager.connect(mock_websocket, user_id)
+    await manager.connect(make_socket(), user_id)
 
-    assert len(manager.active_connections[username]) == 2
+    assert len(manager.active_connections[user_id]) == 2
+    await manager.close()
 
 
-def test_disconnect_removes_connection(manager, mock_websocket):
-    username = "test_user"
-    manager.active_connections[username] = [mock_websocket]
+@pytest.mark.asyncio
+async def test_disconnect_removes_connection(manager, mock_websocket):
+    user_id = 1
+    connection = manager.register(mock_websocket, user_id)
 
-    manager.disconnect(mock_websocket, username)
+    manager.disconnect(mock_websocket, user_id)
+    await asyncio.sleep(0)
 
-    assert username not in manager.active_connections
+    assert user_id not in manager.active_connections
+    assert connection.writer.cancelled()
 
 
-def test_disconnect_multiple_connections(manager, mock_websocket):
-    username = "test_user"
-    ws2 = MagicMock(spec=WebSocket)
-    manager.active_connections[username] = [mock_websocket, ws2]
+@pytest.mark.asyncio
+async def test_disconnect_multiple_connections(manager, mock_websocket):
+    user_id = 1
+    ws2 = make_socket()
+    manager.register(mock_websocket, user_id)
+    manager.register(ws2, user_id)
 
-    manager.disconnect(mock_websocket, username)
+    manager.disconnect(mock_websocket, user_id)
 
-    assert username in manager.active_connections
-    assert len(manager.active_connections[username]) == 1
-    assert ws2 in manager.active_connections[username]
+    assert list(manager.active_connections[user_id]) == [ws2]
+    await manager.close()
 
 
 @pytest.mark.asyncio
 async def test_send_personal_message(manager, mock_websocket):
-    username = "test_user"
-    manager.active_connections[username] = [mock_websocket]
+    user_id = 1
+    manager.register(mock_websocket, user_id)
     message = {"event": "test", "data": {"key": "value"}}
 
-    await manager.send_personal_message(message, username)
+    await manager.send_personal_message(message, user_id)
+    await manager.flush(timeout=1)
 
     mock_websocket.send_text.assert_awaited_once_with(json.dumps(message))
+    await manager.close()
 
 
 @pytest.mark.asyncio
 async def test_send_personal_message_multiple_sockets(manager, mock_websocket):
-    username = "test_user"
-    ws2 = MagicMock(spec=WebSocket)
-    ws2.send_text = AsyncMock()
-    manager.active_connections[username] = [mock_websocket, ws2]
+    user_id = 1
+    ws2 = make_socket()
+    manager.register(mock_websocket, user_id)
+    manager.register(ws2, user_id)
     message = {"event": "test", "data": {"key": "value"}}
 
-    await manager.send_personal_message(message, username)
+    await manager.send_personal_message(message, user_id)
+    await manager.flush(timeout=1)
 
     mock_websocket.send_text.assert_awaited_once_with(json.dumps(message))
     ws2.send_text.assert_awaited_once_with(json.dumps(message))
+    await manager.close()
 
 
 @pytest.mark.asyncio
@@ -99,23 +116,22 @@ async def test_send_personal_message_no_user(manager, mock_websocket):
     message = {"event": "test", "data": {"key": "value"}}
 
     # Should not raise any exception
-    await manager.send_personal_message(message, "nonexistent_user")
+    await manager.send_personal_message(message, 999)
 
 
 @pytest.mark.asyncio
 async def test_broadcast(manager, mock_websocket):
-    ws2 = MagicMock(spec=WebSocket)
-    ws2.send_text = AsyncMock()
-    manager.active_connections = {
-        "user1": [mock_websocket],
-        "user2": [ws2]
-    }
+    ws2 = make_socket()
+    manager.register(mock_websocket, 1)
+    manager.register(ws2, 2)
     message = {"event": "broadcast", "data": {"key": "value"}}
 
     await manager.broadcast(message)
+    await manager.flush(timeout=1)
 
     mock_websocket.send_text.assert_awaited_once_with(json.dumps(message))
     ws2.send_text.assert_awaited_once_with(json.dumps(message))
+    await manager.close()
 
 
 def test_prepare_message(manager):
@@ -128,3 +144,284 @@ def test_prepare_message(manager):
         "event": event_type,
         "data": {"field1": "test", "field2": 42}
     }
+
+
+@pytest.mark.asyncio
+async def test_send_personal_message_respects_project_subscriptions(manager, mock_websocket):
+    ws2 = make_socket()
+    manager.register(mock_websocket, 1).subscribe(10)
+    manager.register(ws2, 1)
+    message = {"event": "task_updated", "data": {"project_id": 20}}
+
+    await manager.send_personal_message(message, 1, project_id=20)
+    await manager.flush(timeout=1)
+
+    mock_websocket.send_text.assert_not_awaited()
+    ws2.send_text.assert_awaited_once_with(json.dumps(message))
+
+    await manager.send_personal_message(message, 1, project_id=10)
+    await manager.send_personal_message(message, 1)
+    await manager.flush(timeout=1)
+
+    assert mock_websocket.send_text.await_count == 2
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_widens_events_again(manager, mock_websocket):
+    connection = manager.register(mock_websocket, 1)
+    connection.subscribe(10)
+    connection.subscribe(11)
+
+    connection.unsubscribe(10)
+    assert connection.projects == {11}
+    assert not connection.wants(10)
+
+    connection.unsubscribe(11)
+    assert connection.wants(10)
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_stalled_socket_is_evicted_without_delaying_others(mock_websocket):
+    manager = ConnectionManager(send_timeout=0.05)
+    stalled = MagicMock(spec=WebSocket)
+
+    async def stall(_):
+        await asyncio.sleep(10)
+
+    stalled.send_text = AsyncMock(side_effect=stall)
+    manager.register(stalled, 1)
+    manager.register(mock_websocket, 1)
+
+    await asyncio.wait_for(manager.send_personal_message({"event": "test"}, 1), timeout=0.01)
+    await manager.flush(timeout=1)
+
+    mock_websocket.send_text.assert_awaited_once()
+    assert list(manager.active_connections[1]) == [mock_websocket]
+    assert manager.failed_sends == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_closed_socket_is_evicted_on_broadcast(manager, mock_websocket):
+    closed = MagicMock(spec=WebSocket)
+    closed.send_text = AsyncMock(side_effect=RuntimeError("Cannot call send once a close message has been sent"))
+    manager.register(closed, 1)
+    manager.register(mock_websocket, 2)
+
+    await manager.broadcast({"event": "test"})
+    await manager.flush(timeout=1)
+    await asyncio.sleep(0)
+
+    assert 1 not in manager.active_connections
+    closed.close.assert_awaited_once()
+    mock_websocket.send_text.assert_awaited_once()
+    assert manager.failed_sends == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_oldest(mock_websocket):
+    manager = ConnectionManager(queue_size=2, overflow_policy=OverflowPolicy.DROP_OLDEST, coalesce_window=0)
+    connection = Connection(mock_websocket, 1)
+    manager.active_connections[1] = {mock_websocket: connection}
+
+    for n in range(3):
+        await manager.send_personal_message({"event": "test", "data": {"n": n}}, 1)
+
+    assert [m.message["data"]["n"] for m in connection.pending.values()] == [1, 2]
+    assert manager.dropped_messages == 1
+
+
+@pytest.mark.asyncio
+async def test_coalesce_replaces_queued_event_for_the_same_entity(mock_websocket):
+    manager = ConnectionManager(queue_size=2, overflow_policy=OverflowPolicy.COALESCE, coalesce_window=0)
+    connection = Connection(mock_websocket, 1)
+    manager.active_connections[1] = {mock_websocket: connection}
+
+    await manager.send_personal_message({"event": "task_updated", "data": {"id": 1, "title": "a"}}, 1)
+    await manager.send_personal_message({"event": "task_updated", "data": {"id": 2, "title": "b"}}, 1)
+    await manager.send_personal_message({"event": "task_updated", "data": {"id": 1, "title": "c"}}, 1)
+
+    assert [m.message["data"]["title"] for m in connection.pending.values()] == ["b", "c"]
+    assert manager.coalesced_messages == 1
+
+
+@pytest.mark.asyncio
+async def test_coalesced_event_is_sent_after_events_queued_before_it(mock_websocket):
+    manager = ConnectionManager(coalesce_window=0.02)
+    manager.register(mock_websocket, 1)
+
+    await manager.send_personal_message({"event": "task_updated", "seq": 1, "data": {"id": 1, "title": "a"}}, 1)
+    await manager.send_personal_message({"event": "task_created", "seq": 2, "data": {"id": 2}}, 1)
+    await manager.send_personal_message({"event": "task_updated", "seq": 3, "data": {"id": 1, "version": 2}}, 1)
+    await manager.flush(timeout=1)
+
+    frames = [json.loads(call.args[0]) for call in mock_websocket.send_text.await_args_list]
+    assert [frame["seq"] for frame in frames] == [2, 3]
+    assert frames[1]["data"] == {"id": 1, "title": "a", "version": 2}
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_disconnected_when_its_queue_overflows(mock_websocket):
+    manager = ConnectionManager(queue_size=1, overflow_policy=OverflowPolicy.DISCONNECT)
+    connection = Connection(mock_websocket, 1)
+    connection.writer = asyncio.create_task(asyncio.sleep(10))
+    manager.active_connections[1] = {mock_websocket: connection}
+
+    await manager.send_personal_message({"event": "test"}, 1)
+    await manager.send_personal_message({"event": "test"}, 1)
+    await asyncio.sleep(0)
+
+    assert 1 not in manager.active_connections
+    assert connection.writer.cancelled()
+    mock_websocket.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_replay_goes_ahead_of_queued_events_without_duplicates(manager, mock_websocket):
+    connection = manager.register(mock_websocket, 1, start=False)
+    await manager.send_personal_message({"event": "task_updated", "seq": 12, "data": {"id": 2}}, 1)
+    await manager.send_personal_message({"event": "task_created", "seq": 13, "data": {"id": 3}}, 1)
+    mock_websocket.send_text.assert_not_awaited()
+
+    manager.replay(connection, [
+        {"event": "task_created", "seq": 11, "data": {"id": 1}},
+        {"event": "task_updated", "seq": 12, "data": {"id": 2}},
+    ])
+    await manager.flush(timeout=1)
+
+    sent = [json.loads(call.args[0])["seq"] for call in mock_websocket.send_text.await_args_list]
+    assert sent == [11, 12, 13]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_burst_of_deltas_is_merged_into_one_frame(mock_websocket):
+    manager = ConnectionManager(coalesce_window=0.02)
+    manager.register(mock_websocket, 1)
+
+    for seq, data in enumerate([
+        {"id": 7, "version": 2, "title": "a"},
+        {"id": 7, "version": 3, "is_completed": True},
+        {"id": 8, "version": 2},
+    ], start=1):
+        await manager.send_personal_message({"event": "task_updated", "seq": seq, "data": data}, 1)
+    await manager.flush(timeout=1)
+
+    frames = [json.loads(call.args[0]) for call in mock_websocket.send_text.await_args_list]
+    assert frames == [
+        {"event": "task_updated", "seq": 2, "data": {"id": 7, "version": 3, "title": "a", "is_completed": True}},
+        {"event": "task_updated", "seq": 3, "data": {"id": 8, "version": 2}},
+    ]
+    assert manager.coalesced_messages == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_reap_evicts_silent_connections_and_pings_the_rest(mock_websocket):
+    manager = ConnectionManager(heartbeat_interval=10, heartbeat_timeout=5, coalesce_window=0)
+    silent = make_socket()
+    manager.register(silent, 1).last_seen -= 16
+    manager.register(mock_websocket, 1)
+
+    assert manager.reap() == 1
+    await manager.flush(timeout=1)
+    await asyncio.sleep(0)
+
+    assert list(manager.active_connections[1]) == [mock_websocket]
+    assert manager.connection_count == 1
+    silent.close.assert_awaited_once()
+    mock_websocket.send_text.assert_awaited_once_with(json.dumps({"event": "ping"}))
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_reap_evicts_connections_that_only_take_writes(mock_websocket):
+    manager = ConnectionManager(heartbeat_interval=10, heartbeat_timeout=5, coalesce_window=0)
+    connection = manager.register(mock_websocket, 1)
+    connection.last_seen -= 14
+
+    assert manager.reap() == 0
+    await manager.flush(timeout=1)
+    mock_websocket.send_text.assert_awaited_once()
+
+    assert manager.reap(time.monotonic() + 2) == 1
+    assert manager.connection_count == 0
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_reap_keeps_connections_that_answer_pings(mock_websocket):
+    manager = ConnectionManager(heartbeat_interval=10, heartbeat_timeout=5, coalesce_window=0)
+    connection = manager.register(mock_websocket, 1)
+    connection.last_seen -= 14
+
+    assert manager.reap() == 0
+    connection.touch()
+
+    assert manager.reap(time.monotonic() + 2) == 0
+    assert manager.connection_count == 1
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_has_capacity_enforces_worker_and_user_limits():
+    manager = ConnectionManager(max_connections=3, max_connections_per_user=2)
+    sockets = [make_socket() for _ in range(3)]
+    manager.register(sockets[0], 1)
+    manager.register(sockets[1], 1)
+
+    assert manager.has_capacity()
+    assert not manager.has_capacity(1)
+    assert manager.has_capacity(2)
+
+    manager.register(sockets[2], 2)
+    assert not manager.has_capacity()
+    assert not manager.has_capacity(3)
+
+    manager.disconnect(sockets[0], 1)
+    assert manager.has_capacity(1)
+    await manager.close()
+
+
+def test_negotiate_encoding_picks_the_first_supported_subprotocol():
+    assert negotiate_encoding(["cbor", "msgpack+deflate", "json"]) == "msgpack+deflate"
+    assert negotiate_encoding(["cbor"]) is None
+    assert negotiate_encoding([]) is None
+
+
+@pytest.mark.asyncio
+async def test_connect_accepts_the_negotiated_subprotocol(manager, mock_websocket):
+    connection = await manager.connect(mock_websocket, 1, subprotocol="msgpack")
+
+    mock_websocket.accept.assert_awaited_once_with(subprotocol="msgpack")
+    assert connection.encoding == "msgpack"
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_event_is_encoded_once_per_encoding():
+    manager = ConnectionManager(coalesce_window=0)
+    encodings = ["json", "json", "msgpack", "msgpack", "json+deflate", "msgpack+deflate"]
+    sockets = [make_socket() for _ in encodings]
+    for socket, encoding in zip(sockets, encodings):
+        manager.register(socket, 1, encoding=encoding)
+    message = {"event": "task_updated", "seq": 1, "data": {"id": 1, "title": "Compact"}}
+
+    with patch("app.core.websockets.msgpack.packb", wraps=msgpack.packb) as packb:
+        await manager.send_personal_message(message, 1)
+        await manager.flush(timeout=1)
+
+    assert packb.call_count == 1
+    json_frames = [socket.send_text.await_args.args[0] for socket in sockets[:2]]
+    assert json_frames[0] is json_frames[1]
+    assert json.loads(json_frames[0]) == message
+    msgpack_frames = [socket.send_bytes.await_args.args[0] for socket in sockets[2:4]]
+    assert msgpack_frames[0] is msgpack_frames[1]
+    assert msgpack.unpackb(msgpack_frames[0]) == message
+    assert json.loads(zlib.decompress(sockets[4].send_bytes.await_args.args[0])) == message
+    assert msgpack.unpackb(zlib.decompress(sockets[5].send_bytes.await_args.args[0])) == message
+    await manager.close()